@@ -6,7 +6,11 @@ import datetime
 import pandas as pd
 import os
 import json
+import itertools
 from src.io_functions import *
+from src.io_database import run_maintenance
+from src.io_crawler import CRAWL_WORKERS, crawl_projects, get_crawl_rules, get_file_record
+from src.io_classify import get_file_extension
 import requests
 from tqdm.auto import tqdm
 
@@ -34,14 +38,14 @@ def insert_egroupware(verbose=0):
     table_name = 'project_registration'
     check_db_table(db_name, table_name)
 
+    db = get_sync_database(db_name)
     # Loop runs over all projects in eGroupWare
     for c in contents:
         # Take only HBI projects TODO: what about the other projects?
         if c['pm_group'] != "HBI":
             continue
 
-        # Insert every project registration into the database
-        table_name = 'project_registration'
+        # Collect the project registration
         # Split project_name & user from pm_title field
         project_name, user = get_project_user_tuple(c['pm_title'])
         user = user if user else ""
@@ -63,15 +67,14 @@ def insert_egroupware(verbose=0):
         }
         if verbose:
             print(project_registration)
-        insert_dict_to_database(db_name, table_name, project_registration)
 
         #####################################################################
-        # Insert every schedule for each project into the database
-        table_name = 'project_schedule'
+        # Collect every schedule of the project
         # Take it from eGroupWare
         url = f"https://egroupware.lin-magdeburg.de/abrechnung/api/measurements.php?start=NaN&end=NaN&hrstol=48&project={c['pm_id']}"
         response = requests.get(url)
         response = json.loads(response.text)
+        project_schedules = []
         for r in response:
             # Take everything from schedule data that could be used as tag (here: description, name, bemerkung)
             # Take care that it works even if something is empty
@@ -93,9 +96,14 @@ def insert_egroupware(verbose=0):
                 'end_timestamp': r['human_cal_end'],
                 'notes': notes
             }
-            insert_dict_to_database(db_name, table_name, project_schedule)
+            project_schedules.append(project_schedule)
             if verbose:
                 print(project_schedule)
+        # The requests are made first, so the write lock is only held for the inserts of the project
+        with db.transaction():
+            insert_dict_to_database(db_name, 'project_registration', project_registration)
+            for project_schedule in project_schedules:
+                insert_dict_to_database(db_name, 'project_schedule', project_schedule)
 
 #!/usr/bin/env python
 # coding: utf-8
@@ -118,6 +126,7 @@ def insert_rspace_to_db():
     table_name = 'object'
     check_db_table(db_name, table_name)
 
+    db = get_sync_database(db_name)
     for single_doc in rspace_docs['documents']:
         # Add the RSpace document entries into the database
         table_name = 'object'
@@ -138,34 +147,35 @@ def insert_rspace_to_db():
             'notes': notes,
             'source': 'rspace'
         }
-        # If the entry is already in the database, don't insert it again (have to be checked because the ELN ID isn't the unique ID in the database)
-        if check_if_entry_exists(db_name, table_name, object_document):
-            continue
-        insert_dict_to_database(db_name, table_name, object_document)
-
-        #######################################################################
-        # Insert the RSpace tag entries into the database
-        # Get the object_id from the object table and use it to chain the document and the tag
-        object_id = get_object_id_from_specific_id(db_name, table_name, single_doc['globalId'])
-        table_name = 'tag'
-        notes = notes.split(";")
-        for note in notes:
-            trans_note = get_cleaned_tag_string(note)
-            trans_note = convert_abbreviation(trans_note)
-            if trans_note == "":
+        # One transaction per document (with its tags), so the other readouts of main can write in between
+        with db.transaction():
+            # If the entry is already in the database, don't insert it again (have to be checked because the ELN ID isn't the unique ID in the database)
+            if check_if_entry_exists(db_name, table_name, object_document):
                 continue
-            tag = {
-                'object_id': object_id,
-                'tag_name': note,
-                'translated_tag_name': trans_note,
-                'created_timestamp': datetime.datetime.strptime(single_doc['created'], "%Y-%m-%dT%H:%M:%S.%fZ").strftime("%Y-%m-%d %H:%M:%S"),
-                'modified_timestamp': datetime.datetime.strptime(single_doc['lastModified'], "%Y-%m-%dT%H:%M:%S.%fZ").strftime("%Y-%m-%d %H:%M:%S"),
-                'used': 1,
-                'description': get_tag_description(trans_note),
-                'source': 'rspace'
-            }
-            insert_dict_to_database(db_name, table_name, tag)
-    delete_duplicate_tags()
+            object_id = insert_dict_to_database_returning_id(db_name, table_name, object_document)
+
+            #######################################################################
+            # Insert the RSpace tag entries into the database
+            # The object_id returned by the insert chains the document and the tag
+            table_name = 'tag'
+            notes = notes.split(";")
+            for note in notes:
+                trans_note = get_cleaned_tag_string(note)
+                trans_note = convert_abbreviation(trans_note)
+                if trans_note == "":
+                    continue
+                tag = {
+                    'object_id': object_id,
+                    'object_type': "",
+                    'tag_name': note,
+                    'translated_tag_name': trans_note,
+                    'created_timestamp': datetime.datetime.strptime(single_doc['created'], "%Y-%m-%dT%H:%M:%S.%fZ").strftime("%Y-%m-%d %H:%M:%S"),
+                    'modified_timestamp': datetime.datetime.strptime(single_doc['lastModified'], "%Y-%m-%dT%H:%M:%S.%fZ").strftime("%Y-%m-%d %H:%M:%S"),
+                    'used': 1,
+                    'description': get_tag_description(trans_note),
+                    'source': 'rspace'
+                }
+                insert_dict_to_database(db_name, table_name, tag)
 
 def convert_rspace_timestamp(timestamp):
     """
@@ -190,6 +200,7 @@ def process_rspace_documents(documents, db_name, table_name):
     """
     check_db_table(db_name, table_name)
 
+    new_documents = []
     for doc in documents['documents']:
         notes = []
         if doc.get('tags'):
@@ -213,9 +224,14 @@ def process_rspace_documents(documents, db_name, table_name):
 
         if check_if_entry_exists(db_name, table_name, object_document):
             continue
+        new_documents.append((doc, object_document))
 
-        insert_dict_to_database(db_name, table_name, object_document)
-        process_tags(db_name, table_name, doc, object_document)
+    # Insert the new entries in one batch, then stream their tags
+    insert_many_to_database(db_name, table_name,
+                            [object_document for doc, object_document in new_documents])
+    get_sync_database(db_name).load_object_ids('rspace', [doc['globalId'] for doc, object_document in new_documents])
+    insert_many_to_database(db_name, 'tag', itertools.chain.from_iterable(
+        get_rspace_tag_rows(db_name, table_name, doc, object_document) for doc, object_document in new_documents))
 
 
 def process_rspace_folder(folder, db_name, table_name):
@@ -229,6 +245,7 @@ def process_rspace_folder(folder, db_name, table_name):
     """
     check_db_table(db_name, table_name)
 
+    new_documents = []
     for doc in folder['records']:
         notes = []
         if doc.get('tags'):
@@ -252,9 +269,14 @@ def process_rspace_folder(folder, db_name, table_name):
 
         if check_if_entry_exists(db_name, table_name, object_document):
             continue
+        new_documents.append((doc, object_document))
 
-        insert_dict_to_database(db_name, table_name, object_document)
-        process_tags(db_name, table_name, doc, object_document)
+    # Insert the new entries in one batch, then stream their tags
+    insert_many_to_database(db_name, table_name,
+                            [object_document for doc, object_document in new_documents])
+    get_sync_database(db_name).load_object_ids('rspace', [doc['globalId'] for doc, object_document in new_documents])
+    insert_many_to_database(db_name, 'tag', itertools.chain.from_iterable(
+        get_rspace_tag_rows(db_name, table_name, doc, object_document) for doc, object_document in new_documents))
 
 
 def get_rspace_workspace_folders(sampleParameter, elnName='rspace'):
@@ -281,19 +303,21 @@ def get_rspace_workspace_folders(sampleParameter, elnName='rspace'):
         r = r.json()
         return r
 
-def process_tags(db_name, table_name, doc, object_document):
+def get_rspace_tag_rows(db_name, table_name, doc, object_document):
     """
-    Process the tags of an RSpace document and insert them into the database.
+    Yield the tag rows of an RSpace document.
 
     Args:
         db_name (str): The name of the database.
-        table_name (str): The name of the table to insert the tags into.
+        table_name (str): The name of the object table that holds the document.
         doc (dict): The RSpace document.
         object_document (dict): The object document corresponding to the RSpace document.
+
+    Yields:
+        dict: A row for the tag table.
     """
     object_id = get_object_id_from_specific_id(
-        db_name, table_name, doc['globalId'])
-    table_name = 'tag'
+        db_name, table_name, doc['globalId'], source='rspace')
     notes = object_document['notes'].split(";")
 
     for note in notes:
@@ -305,6 +329,7 @@ def process_tags(db_name, table_name, doc, object_document):
 
         tag = {
             'object_id': object_id,
+            'object_type': "",
             'tag_name': note,
             'translated_tag_name': trans_note,
             'created_timestamp': convert_rspace_timestamp(doc['created']),
@@ -314,7 +339,19 @@ def process_tags(db_name, table_name, doc, object_document):
             'source': 'rspace'
         }
 
-        insert_dict_to_database(db_name, table_name, tag)
+        yield tag
+
+def process_tags(db_name, table_name, doc, object_document):
+    """
+    Process the tags of an RSpace document and insert them into the database.
+
+    Args:
+        db_name (str): The name of the database.
+        table_name (str): The name of the object table that holds the document.
+        doc (dict): The RSpace document.
+        object_document (dict): The object document corresponding to the RSpace document.
+    """
+    insert_many_to_database(db_name, 'tag', get_rspace_tag_rows(db_name, table_name, doc, object_document))
 
 #!/usr/bin/env python
 # coding: utf-8
@@ -364,172 +401,59 @@ def auto_insert_omero_to_database():
 
     # Iterate over each project
     for project in projects:
-        # Extract project data
-        project_data = {
-            'object_name': project.simpleMarshal()['name'],
-            'object_type': project.simpleMarshal()['type'],
-            'specific_id': project.simpleMarshal()['id'],
-            'user': project.getOwnerOmeName(),
-            'created_timestamp': convert_omero_timestamp(project.creationEventDate().isoformat()),
-            'modified_timestamp': convert_omero_timestamp(project.updateEventDate().isoformat()),
-            'notes': "",
-            'source': 'omero'
-        }
-        # Insert project data into the database
-        insert_dict_to_database(db_name, object_table_name, project_data)
-
-        # Iterate over each tag in the project and add it to the database
-        for tag_entry in project.listAnnotations():
-            # Extract and process tag data
-            trans_note = get_cleaned_tag_string(tag_entry.getValue())
-            trans_note = convert_abbreviation(trans_note)
-            tag_data = {
-                'object_id': project.simpleMarshal()['id'],
-                'object_type': project.simpleMarshal()['type'],
-                'tag_name': tag_entry.getValue(),
-                'translated_tag_name': trans_note,
-                'created_timestamp': convert_omero_timestamp(tag_entry.creationEventDate().isoformat()),
-                'modified_timestamp': convert_omero_timestamp(tag_entry.creationEventDate().isoformat()),
-                'used': 1,
-                'description': get_tag_description(trans_note),
-                'source': 'omero'
-            }
-            # Insert tag data into the database
-            insert_dict_to_database(db_name, tag_table_name, tag_data)
-
-        # Iterate over each dataset in the project
-        for dataset in project.listChildren():
-            # Extract dataset data
-            dataset_data = {
-                'object_name': dataset.simpleMarshal()['name'],
-                'object_type': dataset.simpleMarshal()['type'],
-                'specific_id': dataset.simpleMarshal()['id'],
-                'user': dataset.getOwnerOmeName(),
-                'created_timestamp': convert_omero_timestamp(dataset.creationEventDate().isoformat()),
-                'modified_timestamp': convert_omero_timestamp(dataset.updateEventDate().isoformat()),
-                'notes': dataset.simpleMarshal()['description'],
-                'source': 'omero'
-            }
-            # Insert dataset data into the database
-            insert_dict_to_database(db_name, object_table_name, dataset_data)
-
-            # Iterate over each tag in the dataset and add it to the database
-            for tag_entry in dataset.listAnnotations():
-                # Extract and process tag data
-                trans_note = get_cleaned_tag_string(tag_entry.getValue())
-                trans_note = convert_abbreviation(trans_note)
-                tag_data = {
-                    'object_id': dataset.simpleMarshal()['id'],
-                    'object_type': dataset.simpleMarshal()['type'],
-                    'tag_name': tag_entry.getValue(),
-                    'translated_tag_name': trans_note,
-                    'created_timestamp': convert_omero_timestamp(tag_entry.creationEventDate().isoformat()),
-                    'modified_timestamp': convert_omero_timestamp(tag_entry.creationEventDate().isoformat()),
-                    'used': 1,
-                    'description': get_tag_description(trans_note),
-                    'source': 'omero'
-                }
-                # Insert tag data into the database
-                insert_dict_to_database(db_name, tag_table_name, tag_data)
-
-            # Iterate over each image in the dataset
-            for image in dataset.listChildren():
-                # Extract image data
-                image_data = {
-                    'object_name': image.simpleMarshal()['name'],
-                    'object_type': image.simpleMarshal()['type'],
-                    'specific_id': image.simpleMarshal()['id'],
-                    'user': image.getOwnerOmeName(),
-                    'created_timestamp': convert_omero_timestamp(image.creationEventDate().isoformat()),
-                    'modified_timestamp': convert_omero_timestamp(image.updateEventDate().isoformat()),
-                    'notes': image.simpleMarshal()['description'],
-                    'source': 'omero'
-                }
-                # Insert image data into the database
-                insert_dict_to_database(db_name, object_table_name, image_data)
-
-                # Iterate over each tag in the image and add it to the database
-                for tag_entry in image.listAnnotations():
-                    # Extract and process tag data
-                    trans_note = get_cleaned_tag_string(tag_entry.getValue())
-                    trans_note = convert_abbreviation(trans_note)
-                    tag_data = {
-                        'object_id': image.simpleMarshal()['id'],
-                        'object_type': image.simpleMarshal()['type'],
-                        'tag_name': tag_entry.getValue(),
-                        'translated_tag_name': trans_note,
-                        'created_timestamp': convert_omero_timestamp(tag_entry.creationEventDate().isoformat()),
-                        'modified_timestamp': convert_omero_timestamp(tag_entry.creationEventDate().isoformat()),
-                        'used': 1,
-                        'description': get_tag_description(trans_note),
-                        'source': 'omero'
-                    }
-                    # Insert tag data into the database
-                    insert_dict_to_database(db_name, tag_table_name, tag_data)
+        # Collect the project, its datasets, images and all of their tags
+        object_rows, tag_rows = get_omero_project_rows(project)
+        # Insert the rows of the whole project tree in batches
+        insert_many_to_database(db_name, object_table_name, object_rows)
+        insert_many_to_database(db_name, tag_table_name, tag_rows)
 
     conn.close()
-    # Remove duplicate objects and tags from the database
-    delete_duplicate_objects()
-    delete_duplicate_tags()
 
 #!/usr/bin/env python
 # coding: utf-8
 ##################################################
 # NETSTORE -> sqldb
 
-def get_netstore_filelist(folder):
+def get_netstore_filelist(folder="/home/omero-import", max_workers=CRAWL_WORKERS, rules=None):
     """
-    Retrieves a list of files from a specified folder and organizes them by project.
+    Crawls a specified folder in parallel and groups its files by project (the first path component below the folder).
 
     Args:
         folder (str): The path to the folder containing the files.
+        max_workers (int): The number of directories listed at the same time.
+        rules (CrawlRules): The include/exclude rules of the crawl (see src.io_crawler.CrawlRules), or None.
 
     Returns:
-        tuple: A tuple containing the list of project names and a dictionary of file lists organized by project.
-    """
-    filelist = get_inputlist(folder)
-    print(filelist[0:5])
-    # filelist = filelist[:10000]
-    # Read the project names from the folder
-    cutfilelist = [x[x.find(folder)+len(folder):] for x in filelist]
-    print("found basefolders: ", cutfilelist[0:5])
-    projectlist = list(set([x.split("/")[1] for x in cutfilelist]))
-    print("found projects: ", projectlist[0:5])
-    # Read project, start, end, tags from folders/files
-    fileDict = {}
-    for project in projectlist:
-        tmp = [x for x in filelist if x.find(project) != -1]
-        fileDict[project] = tmp
-    print(fileDict.keys())
-    return fileDict.keys(), fileDict
+        iterator: An iterator over tuples of the project name and an iterator over the FileRecords of the project
+        (see crawl_projects in src.io_crawler).
+    """
+    return crawl_projects(folder, max_workers, rules=rules)
 
 folder = "/home/omero-import"
-# project_list, file_dict = get_netstore_filelist()
+# for project, files in get_netstore_filelist(folder): ...
 
 def get_file_stats(file_path):
     """
     Retrieves statistics for a given file.
 
     Args:
-        file_path (str): The path to the file.
+        file_path (str or FileRecord): The path to the file or its record from the crawler (which already carries the stats).
 
     Returns:
         dict: A dictionary containing the file statistics.
     """
     # Get file stats
-    file_stats = os.stat(file_path)
+    record = get_file_record(file_path)
+    file_path = record.path
 
     # Extract required stats
     file_name = file_path
-    file_extension = os.path.splitext(os.path.basename(file_path))[1]
-    if file_extension == '.gz':
-        file_extension = "." + \
-            ".".join(os.path.basename(file_path).split(".")[-2:])
-    file_size = file_stats.st_size
+    file_extension = get_file_extension(file_path)
+    file_size = record.size
     created_timestamp = datetime.datetime.fromtimestamp(
-        file_stats.st_ctime).strftime('%Y-%m-%d %H:%M:%S')
+        record.ctime).strftime('%Y-%m-%d %H:%M:%S')
     modified_timestamp = datetime.datetime.fromtimestamp(
-        file_stats.st_mtime).strftime('%Y-%m-%d %H:%M:%S')
+        record.mtime).strftime('%Y-%m-%d %H:%M:%S')
 
     # Return stats as a dictionary
     return {
@@ -551,119 +475,83 @@ def get_current_username():
     import getpass
     return getpass.getuser()
 
-def auto_insert_netstore_to_database():
+def auto_insert_netstore_to_database(full=False, fingerprints=False):
     """
     Automatically inserts Netstore file data into the database.
 
-    This function retrieves a list of files from a specified folder, organizes them by project,
-    and inserts the project and file data into the specified database tables.
+    This function crawls a specified folder incrementally (only the directories that changed since the last run
+    are listed), organizes the added and changed files by project, and inserts the project and file data into
+    the specified database tables. Removed files are deleted from the fs_file table.
+
+    Args:
+        full (bool): If True, every directory is listed (finds files that were rewritten in place). Default is False.
+        fingerprints (bool): If True, store content fingerprints and move the rows of moved files instead of adding them again. Default is False.
 
     Returns:
     None
     """
-    project_list, file_dict = get_netstore_filelist()
     folder = "/home/omero-import"
     db_name = 'sync_database.db'
     check_db_table(db_name, "fs_storage")
     print(get_current_username())
 
-    for proj in project_list:
-        object = {
-            'object_name': proj,
-            'object_type': 'Project',
-            'specific_id': os.path.join(folder, proj),
-            'user': get_current_username(),
-            'created_timestamp': "",
-            'modified_timestamp': "",
-            'notes': "",
-            'source': 'fs_storage'
-        }
+    # Only the directories that changed since the last run are listed (see IncrementalCrawl in src.io_crawler),
+    # junk folders of the rules file (e.g. .git, __pycache__) are pruned before they are listed
+    rules = get_crawl_rules()
+    crawl = IncrementalCrawl(db_name, folder, full=full, rules=rules)
+    insert_crawl_changes(db_name, folder, crawl, source='fs_storage', fingerprints=fingerprints)
+    print("netstore crawl:", dict(crawl.stats))
+    if rules is not None:
+        print("pruned by rule:", dict(rules.counts))
 
-        insert_dict_to_database(db_name, "object", object)
-        object_id = get_object_id_from_netstore_name(db_name, 'object', proj)
-
-        # if object_id > 921: break ##testcase
-
-        tags = []
-        for file in file_dict[proj]:
-            tmp = get_file_stats(file)
-            tmp['object_id'] = object_id
-            insert_dict_to_database(db_name, "fs_storage", tmp)
-
-            # Get the tags and insert them into the taglist
-            l = file[file.find(folder)+len(folder):]
-            sep = r"/|-|_|\.|,"
-            tags += re.split(sep, l)
-            # Try to find the possible relevant tags (TODO: create a dictionary to white/black list tags)
-            tags = get_possible_tags_list(tags)
-            for tag in tags:
-                trans_note = get_cleaned_tag_string(tag)
-                trans_note = convert_abbreviation(trans_note)
-                tag_data = {
-                    'object_id': object_id,
-                    'object_type': "",
-                    'tag_name': tag,
-                    'translated_tag_name': trans_note,
-                    'created_timestamp': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    'modified_timestamp': "",
-                    'used': 1,
-                    'description': get_tag_description(trans_note),
-                    'source': 'fs_storage'
-                }
-                # Insert tag data into the database
-                insert_dict_to_database(db_name, "tag", tag_data)
-                ###############
-                # Get min/max timestamp for files in fs_storage table
-                # (min_timestamp, max_timestamp) = get_project_timestamps_from_fs_storage(db_name, object_id)
-                ###############
-    # Remove duplicate objects and tags from the database
-    delete_duplicate_objects()
-    delete_duplicate_tags()
+def insert_rspace(db_name='sync_database.db', table_name='object'):
+    """
+    Inserts the RSpace documents, workspace folders and samples into the database.
+
+    Args:
+        db_name (str): The name of the database. Default is 'sync_database.db'.
+        table_name (str): The name of the object table. Default is 'object'.
+    """
+    rspace_docs = get_sample_data_from_barcode("")
+    rspace_forms = get_rspace_workspace_folders("")
+    process_rspace_folder(rspace_forms, db_name, table_name)
+    process_rspace_documents(rspace_docs, db_name, table_name)
+    insert_rspace_to_db()
 
 if __name__ == "__main__":
     """
     Main function to execute the data insertion process.
 
-    This function sequentially inserts data from various sources into the database
-    and removes duplicate entries.
+    This function inserts data from the various sources into the database
+    (duplicates are not written, see NATURAL_KEYS in src.io_database).
+    The sources do not depend on each other, so they are read out in parallel; their writes
+    go through the one writer connection of the sync database, one transaction after the other.
 
     Returns:
     None
     """
     import time
-    db_name = 'sync_database.db'
-    table_name = 'object'
-    total_runtime = 0
-    start_time = time.time()
-    insert_egroupware(verbose=0)
-    total_runtime += time.time() - start_time
-    print("egroupware readout done", time.time() - start_time)
-    print("##################################################################################")
-    start_time = time.time()
-    rspace_docs = get_sample_data_from_barcode("")
-    rspace_forms = get_rspace_workspace_folders("")
-    process_rspace_folder(rspace_forms, db_name, table_name)
-    process_rspace_documents(rspace_docs, db_name, table_name)
-    insert_rspace_to_db()
-    total_runtime += time.time() - start_time
-    print("rspace readout done", time.time() - start_time)
-    print("##################################################################################")
-    start_time = time.time()
-    auto_insert_omero_to_database()
-    total_runtime += time.time() - start_time
-    print("omero readout done", time.time() - start_time)
-    print("##################################################################################")
-    start_time = time.time()
-    delete_duplicate_objects()
-    delete_duplicate_tags()
-    delete_duplicate_links()
-    total_runtime += time.time() - start_time
-    print("database duplettes delection done", time.time() - start_time)
-    print("##################################################################################")
-    start_time = time.time()
-    auto_insert_netstore_to_database()
-    total_runtime += time.time() - start_time
-    print("netstore readout done", time.time() - start_time)
+    import concurrent.futures
+
+    def timed_readout(name, function):
+        start_time = time.time()
+        function()
+        print(f"{name} readout done", time.time() - start_time)
+        print("##################################################################################")
+
+    check_db_table('sync_database.db', 'object')
+    total_start_time = time.time()
+    readouts = {'egroupware': lambda: insert_egroupware(verbose=0),
+                'rspace': insert_rspace,
+                'omero': auto_insert_omero_to_database,
+                'netstore': auto_insert_netstore_to_database}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(readouts)) as executor:
+        futures = [executor.submit(timed_readout, name, function) for name, function in readouts.items()]
+        for future in futures:
+            future.result()
+    print("total runtime", time.time() - total_start_time)
+    # incremental vacuum only, a database without auto_vacuum=INCREMENTAL is converted with db_maintenance.py --convert
+    timed_readout('maintenance', lambda: run_maintenance('sync_database.db', convert=False))
     
 """
 #!/usr/bin/env python
@@ -0,0 +1,395 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+This script benchmarks the crawler engines on synthetic directory trees before they are pointed at the NAS.
+A tree with a configurable depth, fan-out, number of files per directory and an instrument-like name layout is
+generated once (and reused while its parameters stay the same). Every engine then lists the tree in a fresh
+child process, so peak RSS and imports are measured per engine.
+For every run one JSON line is written with the files/s, the peak RSS and the syscall counts. Syscalls are counted
+with 'strace -f -c' if strace is installed; otherwise only the read/write syscalls from /proc/<pid>/io are reported.
+With --latency the engines run against a shim that delays every scandir and stat call like a network mount
+whose server handles --capacity operations at the same time, e.g. to check that the autotuned crawler
+(crawl_autotune) finds the concurrency of the server.
+The exit code is 1 if an engine found a different number of files than the tree holds.
+
+Example:
+    python crawl_benchmark.py --tree /tmp/bench_tree --depth 3 --fanout 8 --files 50 --layout slices \\
+        --engines crawl folder_extract_mt --repeat 3 --output results.jsonl
+"""
+
+import argparse
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+# directory and file name templates per layout ({i}: index of the entry, {level}: depth of its directory)
+LAYOUTS = {
+    'generic': ('dir_{i:03d}', ['file_{i:05d}.dat']),
+    # confocal sessions: one folder per day and sample, a .czi per acquisition with an exported metadata file
+    'confocal': ('2019{level:02d}{i:02d}_sample{i:02d}', ['acquisition_{i:04d}.czi', 'acquisition_{i:04d}_meta.xml']),
+    # image stacks exported slice by slice, thousands of small files per folder
+    'slices': ('stack_{i:03d}', ['img_t{level:04d}_z{i:04d}_c1.tif']),
+    # BIDS-like MRI layout with a JSON sidecar per NIfTI volume
+    'mri': ('sub-{i:02d}', ['sub-{i:02d}_run-{level}_T1w.nii.gz', 'sub-{i:02d}_run-{level}_T1w.json']),
+}
+
+# the crawler engines, run in the child process (see get_engine)
+ENGINES = ['os_walk', 'get_inputlist', 'get_file_list', 'crawl', 'crawl_autotune', 'folder_extract_mt',
+           'folder_extract_parallel']
+
+# a row of the 'strace -c' summary: % time, seconds, usecs/call, calls, [errors,] syscall
+STRACE_ROW = re.compile(r'^\s*[\d.]+\s+[\d.]+\s+\d+\s+(\d+)\s+(?:\d+\s+)?(\w+)\s*$')
+
+
+def make_tree(root, depth=3, fanout=8, files_per_dir=50, layout='generic', file_size=0):
+    """
+    Generates a synthetic directory tree (or reuses it if it was generated with the same parameters).
+    Every directory holds files_per_dir files and, above the given depth, fanout subdirectories.
+    The parameters are stored next to the tree ('<root>.json'); only a tree with such a file is regenerated.
+
+    Args:
+        root (str): The root folder of the tree.
+        depth (int): The number of directory levels below the root.
+        fanout (int): The number of subdirectories per directory.
+        files_per_dir (int): The number of files per directory.
+        layout (str): The name layout of the directories and files (see LAYOUTS).
+        file_size (int): The size of every file in bytes (the files are sparse).
+
+    Returns:
+        int: The number of files of the tree.
+    """
+    root = os.path.normpath(root)
+    spec = {'depth': depth, 'fanout': fanout, 'files_per_dir': files_per_dir, 'layout': layout, 'file_size': file_size}
+    spec_file = root + '.json'
+    directories = sum(fanout ** level for level in range(depth + 1))
+    total_files = directories * files_per_dir
+    if os.path.exists(spec_file):
+        with open(spec_file) as f:
+            if json.load(f) == spec and os.path.isdir(root):
+                return total_files
+        shutil.rmtree(root, ignore_errors=True)
+    elif os.path.exists(root):
+        raise FileExistsError(f"{root} exists and was not generated by this benchmark")
+    dir_template, file_templates = LAYOUTS[layout]
+    pending = [(root, 0)]
+    while pending:
+        path, level = pending.pop()
+        os.makedirs(path, exist_ok=True)
+        for i in range(files_per_dir):
+            name = file_templates[i % len(file_templates)].format(i=i // len(file_templates), level=level)
+            with open(os.path.join(path, name), 'wb') as f:
+                if file_size:
+                    f.truncate(file_size)
+        if level < depth:
+            pending.extend((os.path.join(path, dir_template.format(i=i, level=level + 1)), level + 1)
+                           for i in range(fanout))
+    with open(spec_file, 'w') as f:
+        json.dump(spec, f)
+    return total_files
+
+
+class LatencyShim:
+    """
+    Injects artificial latency into os.scandir, os.stat and the stat of directory entries, like a network mount.
+    The server handles capacity operations at the same time; beyond that, the latency of every operation grows
+    with the square of the overload (queueing and retransmits), so more concurrency lowers the throughput again.
+
+    Args:
+        latency (float): The latency of one operation of an idle server in seconds.
+        capacity (int): The number of operations the server handles at the same time without slowing down.
+    """
+
+    def __init__(self, latency, capacity=8):
+        self.latency = latency
+        self.capacity = capacity
+        self.in_flight = 0
+        self.operations = 0
+        self._lock = threading.Lock()
+        self._scandir = os.scandir
+        self._stat = os.stat
+
+    def wait(self):
+        with self._lock:
+            self.in_flight += 1
+            self.operations += 1
+            load = self.in_flight / self.capacity
+        try:
+            time.sleep(self.latency * max(1.0, load) ** 2)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def scandir(self, path='.'):
+        self.wait()
+        return _ShimScandir(self._scandir(path), self)
+
+    def stat(self, path, *args, **kwargs):
+        self.wait()
+        return self._stat(path, *args, **kwargs)
+
+    def __enter__(self):
+        os.scandir, os.stat = self.scandir, self.stat
+        return self
+
+    def __exit__(self, *exc):
+        os.scandir, os.stat = self._scandir, self._stat
+
+
+class _ShimScandir:
+    """
+    The directory iterator of the LatencyShim: the entries are delayed when they are stat'ed.
+    """
+
+    def __init__(self, entries, shim):
+        self._entries = entries
+        self._shim = shim
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._entries.close()
+
+    def __iter__(self):
+        for entry in self._entries:
+            yield _ShimEntry(entry, self._shim)
+
+    def close(self):
+        self._entries.close()
+
+
+class _ShimEntry:
+    """
+    A directory entry of the LatencyShim (the file type comes with the listing, the stat is delayed).
+    """
+
+    def __init__(self, entry, shim):
+        self._entry = entry
+        self._shim = shim
+        self.name = entry.name
+        self.path = entry.path
+
+    def is_dir(self, follow_symlinks=True):
+        return self._entry.is_dir(follow_symlinks=follow_symlinks)
+
+    def is_file(self, follow_symlinks=True):
+        return self._entry.is_file(follow_symlinks=follow_symlinks)
+
+    def is_symlink(self):
+        return self._entry.is_symlink()
+
+    def inode(self):
+        return self._entry.inode()
+
+    def stat(self, follow_symlinks=True):
+        self._shim.wait()
+        return self._entry.stat(follow_symlinks=follow_symlinks)
+
+
+def get_engine(engine):
+    """
+    Imports one crawler engine (in the child process) and returns a function that lists a tree with it.
+    The imports are done before the timing starts; their memory is part of the peak RSS of the engine.
+
+    Args:
+        engine (str): The name of the engine (see ENGINES).
+
+    Returns:
+        Callable[[str, str, int], Union[int, dict]]: The function (tree, workdir, workers) that returns the number of
+        files found (or a dictionary with 'files' and further results); workdir is an empty folder for the outputs
+        of the engine (manifest, database, checkpoint).
+    """
+    if engine == 'os_walk':
+        return lambda tree, workdir, workers: sum(len(files) for _, _, files in os.walk(tree))
+    if engine == 'get_inputlist':
+        from src.io_metadata import get_inputlist
+        return lambda tree, workdir, workers: len(get_inputlist(tree))
+    if engine == 'get_file_list':
+        from src.io_functions import get_file_list
+        return lambda tree, workdir, workers: len(get_file_list(tree, workers))
+    if engine == 'crawl':
+        from src.io_crawler import crawl
+        return lambda tree, workdir, workers: sum(1 for _ in crawl(tree, workers))
+    if engine == 'crawl_autotune':
+        from src.io_crawler import ConcurrencyController, crawl
+
+        def crawl_autotune(tree, workdir, workers):
+            # the worker count is the upper bound of the controller
+            autotune = ConcurrencyController(min_workers=1, max_workers=max(workers, 1), initial=min(workers, 4))
+            return {'files': sum(1 for _ in crawl(tree, autotune=autotune)), 'autotune': autotune.summary()}
+        return crawl_autotune
+    if engine == 'folder_extract_mt':
+        import folder_extract_mt
+        return lambda tree, workdir, workers: folder_extract_mt.main(
+            tree, os.path.join(workdir, 'manifest.txt'), workers)['files']
+    if engine == 'folder_extract_parallel':
+        import folder_extract_parallel
+        return lambda tree, workdir, workers: folder_extract_parallel.main(
+            tree, os.path.join(workdir, 'files.db'), workers)['files']
+    raise ValueError(f"unknown engine: {engine}")
+
+
+def get_io_syscalls():
+    """
+    Returns the read and write syscalls of the current process from /proc/self/io (None where it is not available).
+    """
+    try:
+        with open('/proc/self/io') as f:
+            counters = dict(line.split(': ') for line in f.read().splitlines())
+        return int(counters['syscr']), int(counters['syscw'])
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+
+def child_main(engine, tree, workdir, workers, result_file, latency=0.0, capacity=8):
+    """
+    Times one engine (behind a LatencyShim if latency is set) and writes its result to result_file
+    (stdout is left to the engine).
+    """
+    result = {}
+    try:
+        run = get_engine(engine)
+        shim = LatencyShim(latency, capacity) if latency else None
+        start = time.perf_counter()
+        if shim is not None:
+            with shim:
+                found = run(tree, workdir, workers)
+            result['shim_operations'] = shim.operations
+        else:
+            found = run(tree, workdir, workers)
+        result['seconds'] = time.perf_counter() - start
+        result.update(found if isinstance(found, dict) else {'files': found})
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+    result['read_syscalls'], result['write_syscalls'] = get_io_syscalls()
+    with open(result_file, 'w') as f:
+        json.dump(result, f)
+
+
+def parse_strace_summary(path):
+    """
+    Reads the summary table of 'strace -c' and returns the number of calls per syscall (with 'total').
+    """
+    counts = {}
+    with open(path) as f:
+        for line in f:
+            match = STRACE_ROW.match(line)
+            if match:
+                counts[match.group(2)] = int(match.group(1))
+    return counts
+
+
+def benchmark(engine, tree, expected_files, workers=8, use_strace=True, workdir=None, latency=0.0, capacity=8):
+    """
+    Runs one engine in a child process and measures it.
+
+    Args:
+        engine (str): The name of the engine (see ENGINES).
+        tree (str): The root folder of the tree.
+        expected_files (int): The number of files of the tree.
+        workers (int): The number of directories listed at the same time.
+        use_strace (bool): Count the syscalls with strace (if it is installed). Counting slows the engine down,
+            so the files/s of such runs are only comparable with each other.
+        workdir (str): The folder for the temporary outputs. Default is the system temp folder.
+        latency (float): The latency injected per file system operation (see LatencyShim). Default is 0.0 (none).
+        capacity (int): The number of operations the simulated server handles at the same time. Default is 8.
+
+    Returns:
+        dict: The result with the keys 'engine', 'workers', 'files', 'expected_files', 'ok', 'seconds',
+        'files_per_second', 'peak_rss_mib', 'syscalls' (total), 'syscall_counts', 'read_syscalls',
+        'write_syscalls' and 'error'.
+    """
+    run_dir = tempfile.mkdtemp(prefix=f'crawl_benchmark_{engine}_', dir=workdir)
+    try:
+        result_file = os.path.join(run_dir, 'result.json')
+        command = [sys.executable, os.path.abspath(__file__), '--child', engine, tree, run_dir, str(workers), result_file,
+                   str(latency), str(capacity)]
+        strace_file = None
+        if use_strace and shutil.which('strace'):
+            strace_file = os.path.join(run_dir, 'strace.txt')
+            command = ['strace', '-f', '-c', '-o', strace_file] + command
+        process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                   cwd=os.path.dirname(os.path.abspath(__file__)))
+        stderr = process.stderr.read()
+        # wait4 returns the resource usage of this child (and of its own children, e.g. a process pool)
+        _, status, usage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+        result = {'engine': engine, 'workers': workers, 'files': None, 'expected_files': expected_files,
+                  'seconds': None, 'files_per_second': None,
+                  # ru_maxrss is in KiB on Linux; for several processes it is the peak of the largest one
+                  'peak_rss_mib': round(usage.ru_maxrss / 1024, 1),
+                  'syscalls': None, 'syscall_counts': None, 'read_syscalls': None, 'write_syscalls': None,
+                  'error': None}
+        if os.path.exists(result_file):
+            with open(result_file) as f:
+                result.update(json.load(f))
+        elif process.returncode:
+            lines = stderr.decode(errors='replace').strip().splitlines()
+            result['error'] = lines[-1] if lines else f"exit code {process.returncode}"
+        if strace_file and os.path.exists(strace_file):
+            counts = parse_strace_summary(strace_file)
+            result['syscalls'] = counts.pop('total', sum(counts.values()))
+            result['syscall_counts'] = dict(sorted(counts.items(), key=lambda item: item[1], reverse=True))
+        if result['seconds']:
+            result['files_per_second'] = round(result['files'] / result['seconds'], 1)
+        result['ok'] = result['files'] == expected_files
+        return result
+    finally:
+        shutil.rmtree(run_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == '--child':
+        engine, tree, workdir, workers, result_file, latency, capacity = sys.argv[2:9]
+        child_main(engine, tree, workdir, int(workers), result_file, float(latency), int(capacity))
+        sys.exit(0)
+
+    parser = argparse.ArgumentParser(description='Benchmark the crawler engines on a synthetic directory tree.')
+    parser.add_argument('--tree', type=str, default=os.path.join(tempfile.gettempdir(), 'crawl_benchmark_tree'),
+                        help='Root folder of the synthetic tree')
+    parser.add_argument('--depth', type=int, default=3, help='Number of directory levels below the root')
+    parser.add_argument('--fanout', type=int, default=8, help='Number of subdirectories per directory')
+    parser.add_argument('--files', type=int, default=50, help='Number of files per directory')
+    parser.add_argument('--layout', choices=sorted(LAYOUTS), default='generic', help='Name layout of the tree')
+    parser.add_argument('--file-size', type=int, default=0, help='Size of every (sparse) file in bytes')
+    parser.add_argument('--engines', nargs='+', choices=ENGINES, default=ENGINES, help='Engines to run')
+    parser.add_argument('--workers', type=int, nargs='+', default=[8], help='Worker counts to run every engine with')
+    parser.add_argument('--repeat', type=int, default=1, help='Number of runs per engine and worker count')
+    parser.add_argument('--no-strace', action='store_true', help='Do not count the syscalls with strace')
+    parser.add_argument('--latency', type=float, default=0.0, help='Latency injected per scandir/stat call in seconds')
+    parser.add_argument('--capacity', type=int, default=8, help='Concurrent operations of the simulated server')
+    parser.add_argument('--output', type=str, default=None, help='JSON lines file to append to (default: stdout)')
+    args = parser.parse_args()
+
+    expected_files = make_tree(args.tree, args.depth, args.fanout, args.files, args.layout, args.file_size)
+    tree_spec = {'tree': os.path.abspath(args.tree), 'layout': args.layout, 'depth': args.depth,
+                 'fanout': args.fanout, 'files_per_dir': args.files, 'file_size': args.file_size,
+                 'latency': args.latency, 'capacity': args.capacity}
+    output = open(args.output, 'a') if args.output else sys.stdout
+    ok = True
+    try:
+        for engine in args.engines:
+            for workers in args.workers:
+                for run in range(args.repeat):
+                    result = benchmark(engine, tree_spec['tree'], expected_files, workers, not args.no_strace,
+                                       latency=args.latency, capacity=args.capacity)
+                    result.update(tree_spec, run=run, timestamp=time.strftime('%Y-%m-%d %H:%M:%S'))
+                    output.write(json.dumps(result) + '\n')
+                    output.flush()
+                    ok = ok and result['ok']
+                    print(f"{engine:<24} workers {workers:>3} run {run}: {result['files']} files "
+                          f"{result['files_per_second'] or 0:>12.0f} files/s {result['peak_rss_mib']:>8.1f} MiB "
+                          f"syscalls {result['syscalls'] if result['syscalls'] is not None else '-'}"
+                          + (f" autotune {result['autotune']}" if result.get('autotune') else "")
+                          + (f" ERROR {result['error']}" if result['error'] else ""), file=sys.stderr)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,31 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+This script runs the maintenance of the sync database (run it after every nightly ingest):
+ANALYZE / PRAGMA optimize, an incremental vacuum of up to --pages free pages and a passive WAL checkpoint.
+Afterwards it prints the size, fill and fragmentation of every table and index.
+Use --report to only print the size report.
+A database created before auto_vacuum=INCREMENTAL was the default is only vacuumed after a one-time conversion with
+--convert; the conversion is a full VACUUM that blocks readers and writers while it runs.
+"""
+
+import argparse
+from src.io_database import get_size_report, run_maintenance
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Run the maintenance of the sync database.')
+    parser.add_argument('--db', type=str, default='sync_database.db', help='Name of the sync database')
+    parser.add_argument('--pages', type=int, default=10000, help='Maximum number of free pages to release')
+    parser.add_argument('--batch', type=int, default=500, help='Number of pages released per transaction')
+    parser.add_argument('--report', action='store_true', help='Only print the size report')
+    parser.add_argument('--convert', action='store_true',
+                        help='Convert the database to auto_vacuum=INCREMENTAL with a full (blocking) VACUUM')
+    args = parser.parse_args()
+
+    if args.report:
+        for entry in get_size_report(args.db):
+            print(entry)
+    else:
+        run_maintenance(args.db, vacuum_pages=args.pages, batch_pages=args.batch, convert=args.convert, verbose=1)
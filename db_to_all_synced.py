@@ -9,98 +9,97 @@ import omero.clients
 from omero.gateway import BlitzGateway
 import importlib
 import sqlite3
+import concurrent.futures
 from datetime import timedelta
 
 def create_links():
     """
     Creates links between different data sources in the database.
 
-    This function deletes duplicate objects, tags, and links, and then creates links between
+    This function creates links between
     eGroupWare and Netstore, and between eGroupWare and OMERO based on overlapping data.
 
     Returns:
     None
     """
-    delete_duplicate_objects()
-    delete_duplicate_tags()
-    delete_duplicate_links()
-
     db_name = 'sync_database.db'
     check_db_table(db_name, "link")
-    omero_df = get_dataframe('omero')
-    fs_storage_df = get_dataframe("fs_storage")
-    # link_df = get_dataframe("link")
-    egroupware_df = get_dataframe("egroupware")
-    # Get project name and files from database per object_id
-    # (fs_storage_df['object_id'] restricted to "fs_storage")
-    # netstore_joined_df = get_netstore_data(db_name, 919)
-    netstore_df = get_dataframe('fs_storage')
-    omero_df = get_dataframe('omero')
-
-    # Create the link(s):
-
-    check_db_table(db_name, 'link')
-
-    # Create the links in the database between eGroupWare and Netstore
-    for project_id in egroupware_df['project_id']:
-        # print("project_id", project_id, ": project_name: ", egroupware_df[egroupware_df['project_id'] == project_id]['project_name'].iloc[0])
-        for object_id in netstore_df['object_id']:
-            netstore_joined_df = get_netstore_data(db_name, object_id)
-            egroupware_joined_df = get_egroupware_data(db_name, project_id)
-            overlap_df = get_col_overlap_df(
-                netstore_joined_df.iloc[0:1], egroupware_joined_df.iloc[0:1], 'object_name_x', 'project_name')
-            check = 0
-            for p in list(overlap_df['percentage']):
-                if p >= 0.8:
-                    print(
-                        f"I matched the eGroupWare-Netstore: {list(egroupware_joined_df.iloc[0:1]['project_name'])}-{list(netstore_joined_df.iloc[0:1]['object_name_x'])} = {p}")
-                    # check = 1
-
-                    link = {'src_id': project_id,
-                            'src_table': 'project_registration',
-                            'tar_id': object_id,
-                            'tar_table': 'object',
-                            'tar_source': 'fs_storage',
-                            'overlap_ratio': p,
-                            'manual_validated': 0,
-                            'created_timestamp': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                            'modified_timestamp': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                            'notes': f"{list(egroupware_joined_df.iloc[0:1]['project_name'])[0]}-{list(netstore_joined_df.iloc[0:1]['object_name_x'])[0]} object[source == 'fs_storage'] get_col_overlap_df(netstore_joined_df.iloc[0:1], egroupware_joined_df.iloc[0:1], 'object_name_x', 'project_name')"}
-                    # print(link)
-                    insert_dict_to_database(db_name, 'link', link)
-
-    # Create the links between eGroupWare and OMERO in the database
-    for project_id in egroupware_df['project_id']:
-        # print("project_id", project_id, ": project_name: ", egroupware_df[egroupware_df['project_id'] == project_id]['project_name'].iloc[0])
-        for object_id in omero_df['object_id']:
-            omero_joined_df = omero_df[omero_df['object_id'] == object_id]
-            omero_joined_df = omero_joined_df[omero_joined_df['object_type'] == 'Project']
-            egroupware_joined_df = get_egroupware_data(db_name, project_id)
-            overlap_df = get_col_overlap_df(
-                egroupware_joined_df.iloc[0:1], omero_joined_df.iloc[0:1], 'project_name', 'object_name')
-            check = 0
-            for p in list(overlap_df['percentage']):
-                if p >= 0.8:
-                    print(
-                        f"I matched the eGroupWare-OMERO: {list(egroupware_joined_df.iloc[0:1]['project_name'])}-{list(omero_joined_df.iloc[0:1]['object_name'])} = {p}")
-                    # check = 1
-
-                    link = {'src_id': project_id,
-                            'src_table': 'project_registration',
-                            'tar_id': object_id,
-                            'tar_table': 'object',
-                            'tar_source': 'omero',
-                            'overlap_ratio': p,
-                            'manual_validated': 0,
-                            'created_timestamp': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                            'modified_timestamp': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                            'notes': f"{list(egroupware_joined_df.iloc[0:1]['project_name'])[0]}-{list(omero_joined_df.iloc[0:1]['object_name'])[0]}; object[source == 'omero']; get_col_overlap_df(egroupware_joined_df.iloc[0:1], omero_joined_df.iloc[0:1], 'project_name', 'object_name')"}
-                    # print(link)
-                    insert_dict_to_database(db_name, 'link', link)
-
-    delete_duplicate_objects()
-    delete_duplicate_tags()
-    delete_duplicate_links()
+    # Read everything from one consistent snapshot, the ingest may keep writing meanwhile
+    with get_sync_database(db_name).reader():
+        # link_df = get_dataframe("link")
+        egroupware_df = get_dataframe("egroupware", columns=['project_id'])
+        # Get project name and files from database per object_id
+        # (fs_storage_df['object_id'] restricted to "fs_storage")
+        # netstore_joined_df = get_netstore_data(db_name, 919)
+        netstore_df = get_dataframe('fs_storage', columns=['object_id'])
+        # Only OMERO projects are matched against eGroupWare projects
+        omero_df = get_dataframe('omero', columns=['object_id', 'object_name', 'object_type'],
+                                 filters={'object_type': 'Project'})
+
+        # Create the link(s):
+
+        check_db_table(db_name, 'link')
+
+        # Create the links in the database between eGroupWare and Netstore
+        for project_id in egroupware_df['project_id']:
+            link_rows = []
+            # print("project_id", project_id, ": project_name: ", egroupware_df[egroupware_df['project_id'] == project_id]['project_name'].iloc[0])
+            for object_id in netstore_df['object_id']:
+                netstore_joined_df = get_netstore_data(db_name, object_id)
+                egroupware_joined_df = get_egroupware_data(db_name, project_id)
+                overlap_df = get_col_overlap_df(
+                    netstore_joined_df.iloc[0:1], egroupware_joined_df.iloc[0:1], 'object_name_x', 'project_name')
+                check = 0
+                for p in list(overlap_df['percentage']):
+                    if p >= 0.8:
+                        print(
+                            f"I matched the eGroupWare-Netstore: {list(egroupware_joined_df.iloc[0:1]['project_name'])}-{list(netstore_joined_df.iloc[0:1]['object_name_x'])} = {p}")
+                        # check = 1
+
+                        link = {'src_id': project_id,
+                                'src_table': 'project_registration',
+                                'tar_id': object_id,
+                                'tar_table': 'object',
+                                'tar_source': 'fs_storage',
+                                'overlap_ratio': p,
+                                'manual_validated': 0,
+                                'created_timestamp': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                                'modified_timestamp': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                                'notes': f"{list(egroupware_joined_df.iloc[0:1]['project_name'])[0]}-{list(netstore_joined_df.iloc[0:1]['object_name_x'])[0]} object[source == 'fs_storage'] get_col_overlap_df(netstore_joined_df.iloc[0:1], egroupware_joined_df.iloc[0:1], 'object_name_x', 'project_name')"}
+                        # print(link)
+                        link_rows.append(link)
+            insert_many_to_database(db_name, 'link', link_rows)
+
+        # Create the links between eGroupWare and OMERO in the database
+        for project_id in egroupware_df['project_id']:
+            link_rows = []
+            # print("project_id", project_id, ": project_name: ", egroupware_df[egroupware_df['project_id'] == project_id]['project_name'].iloc[0])
+            for object_id in omero_df['object_id']:
+                omero_joined_df = omero_df[omero_df['object_id'] == object_id]
+                omero_joined_df = omero_joined_df[omero_joined_df['object_type'] == 'Project']
+                egroupware_joined_df = get_egroupware_data(db_name, project_id)
+                overlap_df = get_col_overlap_df(
+                    egroupware_joined_df.iloc[0:1], omero_joined_df.iloc[0:1], 'project_name', 'object_name')
+                check = 0
+                for p in list(overlap_df['percentage']):
+                    if p >= 0.8:
+                        print(
+                            f"I matched the eGroupWare-OMERO: {list(egroupware_joined_df.iloc[0:1]['project_name'])}-{list(omero_joined_df.iloc[0:1]['object_name'])} = {p}")
+                        # check = 1
+
+                        link = {'src_id': project_id,
+                                'src_table': 'project_registration',
+                                'tar_id': object_id,
+                                'tar_table': 'object',
+                                'tar_source': 'omero',
+                                'overlap_ratio': p,
+                                'manual_validated': 0,
+                                'created_timestamp': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                                'modified_timestamp': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                                'notes': f"{list(egroupware_joined_df.iloc[0:1]['project_name'])[0]}-{list(omero_joined_df.iloc[0:1]['object_name'])[0]}; object[source == 'omero']; get_col_overlap_df(egroupware_joined_df.iloc[0:1], omero_joined_df.iloc[0:1], 'project_name', 'object_name')"}
+                        # print(link)
+                        link_rows.append(link)
+            insert_many_to_database(db_name, 'link', link_rows)
 
 def sync_omero():
     """
@@ -116,9 +115,8 @@ def sync_omero():
     db_name = 'sync_database.db'
     docker_vol_path = "/OMERO"
     # netstore_joined_df = get_netstore_data(db_name, 919)
-    netstore_df = get_dataframe('fs_storage')
-    omero_df = get_dataframe('omero')
-    link_df = get_dataframe('link-fs_storage')
+    link_df = get_dataframe('link-fs_storage',
+                            columns=['src_id', 'src_table', 'tar_id', 'tar_table', 'overlap_ratio'])
     conn = BlitzGateway('inplace', 'omero', host='0.0.0.0', port=4064)
     conn.connect()
     # tags = conn.getObjects("TagAnnotation")
@@ -164,9 +162,11 @@ def sync_omero():
             src = f"/fs_storage_omero-import/{fs_storage_project_folder}"
             base_path = f"/home/omero-import/{fs_storage_project_folder}"
 
-            filelist = list(get_dataset_fs_storage_name(
-                db_name, base_path)['object_name'])
-            filelist = sorted(filelist, key=len)
+            filelist = get_dataset_fs_storage_name(
+                db_name, base_path)['object_name']
+            # Only the files Bio-Formats can read are imported, so the dataset folder is taken from them
+            importable = filelist[classify_paths(filelist)['bioformats'].to_numpy()]
+            filelist = sorted(importable if not importable.empty else filelist, key=len)
             fs_storage_dataset_folder = get_remaining_path(
                 filelist[0], base_path).split("/")[0]
             print(
@@ -210,13 +210,11 @@ def sync_omero():
                 db_name, row['tar_id'], df_type='fs_storage')
             possible_tags = list(tag_df['translated_tag_name'])
             # print(possible_tags)
-            tag_descriptions_dict = get_description_dict()
             for p_tag in possible_tags:
                 tag_id = is_string_in_list(p_tag, tag_tuple)
                 try:
                     if not tag_id:
-                        description = get_tag_description(
-                            p_tag, tag_descriptions_dict)
+                        description = get_tag_description(p_tag)
                         tag = create_tag(p_tag, description)
                         create_link(project, tag)
                     else:
@@ -249,9 +247,8 @@ def sync_rspace():
     Returns:
     None
     """
-    netstore_df = get_dataframe('fs_storage')
-    omero_df = get_dataframe('omero')
-    link_df = get_dataframe('link-fs_storage')
+    link_df = get_dataframe('link-fs_storage',
+                            columns=['src_id', 'src_table', 'tar_id', 'tar_table', 'overlap_ratio'])
     conn = BlitzGateway('inplace', 'omero', host='0.0.0.0', port=4064)
     conn.connect()
     # tags = conn.getObjects("TagAnnotation")
@@ -289,7 +286,8 @@ def sync_rspace():
             possible_tags = ",".join(list(tag_df['translated_tag_name']))
 
             header = create_rspace_document_header(
-                egroupware_project_name, fs_storage_project_folder, row['overlap_ratio'])
+                egroupware_project_name, fs_storage_project_folder, row['overlap_ratio'],
+                object_id=row['tar_id'], db_name=db_name)
             files = create_rspace_files_table(
                 header, row['tar_id'], db_name='sync_database.db')
             # If there are no files in the possible document inside the folder, don't create it
@@ -334,7 +332,8 @@ def main():
     Main function to execute the synchronization process.
 
     This function removes the OMERO import file if it exists, creates links between different data sources,
-    and synchronizes the data with OMERO and RSpace.
+    and synchronizes the data with OMERO and RSpace (in parallel).
+    It can run while all_to_db.py is still writing, the reads use the read-only connections of the sync database.
 
     Returns:
     None
@@ -344,8 +343,10 @@ def main():
     else:
         print("OMERO import file already reset")
     create_links()
-    sync_omero()
-    sync_rspace()
+    # OMERO and RSpace only read the links, so they are synchronized at the same time
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        for future in [executor.submit(sync_omero), executor.submit(sync_rspace)]:
+            future.result()
 """
 if __name__ == "__main__":
     db_name = 'sync_database.db'
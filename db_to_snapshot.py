@@ -0,0 +1,24 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+This script exports the sync database to a columnar snapshot (Arrow IPC files in ./data/snapshot).
+Tables that are only appended to (project_registration, project_schedule) are exported incrementally: only the rows
+added since the last export are written, unless --full is given. The upserted tables are always exported completely.
+Analysis code can memory-map the snapshot with src.io_snapshot.load_snapshot / get_snapshot_dataframe
+instead of reading the tables with get_dataframe.
+"""
+
+import argparse
+from src.io_snapshot import SNAPSHOT_FOLDER, SNAPSHOT_TABLES, export_snapshot
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Export the sync database to a columnar snapshot.')
+    parser.add_argument('--db', type=str, default='sync_database.db', help='Name of the sync database')
+    parser.add_argument('--tables', type=str, nargs='+', choices=SNAPSHOT_TABLES, help='Tables to export (default: all)')
+    parser.add_argument('--folder', type=str, default=SNAPSHOT_FOLDER, help='Folder of the snapshot')
+    parser.add_argument('--full', action='store_true', help='Export the tables completely instead of incrementally')
+    args = parser.parse_args()
+
+    export_snapshot(args.db, tables=args.tables, folder=args.folder, full=args.full, verbose=1)
@@ -1,86 +1,43 @@
-import os
-import multiprocessing
-from multiprocessing import Queue
-import time
+import argparse
 
-# Function to list files in a directory
-def list_files(directory, queue):
-    """
-    Walks through the directory and its subdirectories to list all files.
-    Adds each file path to the queue after encoding to handle invalid surrogate characters.
-
-    Args:
-        directory (str): The root directory to start listing files from.
-        queue (Queue): The queue to put the file paths into.
-    """
-    try:
-        for root, dirs, files in os.walk(directory):
-            for file in files:
-                file_path = os.path.join(root, file)
-                # Filter out invalid surrogate characters
-                file_path = file_path.encode('utf-8', 'surrogateescape').decode('utf-8', 'replace')
-                queue.put(file_path)
-    except PermissionError as e:
-        print(f"PermissionError: {e}")
-    except Exception as e:
-        print(f"Error: {e}")
+from src.io_crawler import CRAWL_RULES_FILE, CRAWL_WORKERS, ConcurrencyController, ManifestSink, get_crawl_rules, run_crawl
 
-# Function to write files to the output file
-def write_files(queue, output_file):
-    """
-    Writes file paths from the queue to the output file.
-    Stops writing when a None value is encountered in the queue.
-
-    Args:
-        queue (Queue): The queue to get the file paths from.
-        output_file (str): The file to write the file paths to.
-    """
-    with open(output_file, 'w', encoding='utf-8') as f:
-        while True:
-            file_path = queue.get()
-            if file_path is None:
-                break
-            f.write(file_path + '\n')
 
 # Main function
-def main(root_directory, output_file, num_processes):
+def main(root_directory, output_file, num_processes=CRAWL_WORKERS, resume=False, rules=None, autotune=None):
     """
-    Coordinates the listing and writing of files using multiple processes.
+    Lists all files below the root directory into a text manifest (one path per line).
+    The directories are listed in parallel by a bounded pool of workers (see src.io_crawler.run_crawl).
+    The progress is checkpointed next to the manifest ('<output_file>.checkpoint.db'),
+    so an interrupted run can be continued with resume.
 
     Args:
         root_directory (str): The root directory to start listing files from.
         output_file (str): The file to write the file paths to.
-        num_processes (int): The number of processes to use for listing files.
+        num_processes (int): The number of directories listed at the same time.
+        resume (bool): Continue an interrupted run instead of starting again.
+        rules (CrawlRules): The include/exclude rules of the crawl (see src.io_crawler.CrawlRules), or None.
+        autotune (ConcurrencyController): Adapts the number of directories listed at the same time to the latency
+            of the file system (num_processes is then ignored), or None.
+
+    Returns:
+        dict: The summary of the crawl ('files', 'bytes', 'seconds', 'files_per_second', 'pruned', 'autotune').
     """
-    queue = Queue()
-    directories = [os.path.join(root_directory, d) for d in os.listdir(root_directory) if os.path.isdir(os.path.join(root_directory, d))]
-
-    # Start the writer process
-    writer_process = multiprocessing.Process(target=write_files, args=(queue, output_file))
-    writer_process.start()
-
-    # Start the worker processes
-    processes = []
-    for directory in directories:
-        process = multiprocessing.Process(target=list_files, args=(directory, queue))
-        process.start()
-        processes.append(process)
-
-    # Wait for all worker processes to finish
-    for process in processes:
-        process.join()
-
-    # Signal the writer process to exit
-    queue.put(None)
-    writer_process.join()
+    return run_crawl(root_directory, ManifestSink(output_file, resume=resume), max_workers=num_processes,
+                     checkpoint=output_file + '.checkpoint.db', resume=resume, rules=rules, autotune=autotune, verbose=1)
 
 if __name__ == "__main__":
-    root_directory = '/home/cni/'
-    output_file = '/home/filenames_py.txt'
-    num_processes = 10  # Adjust the number of processes as needed
-
-    start_time = time.time()
-    main(root_directory, output_file, num_processes)
-    end_time = time.time()
-
-    print(f"Runtime: {end_time - start_time:.2f} seconds")
+    parser = argparse.ArgumentParser(description='List all files of a folder into a text manifest.')
+    parser.add_argument('root_directory', nargs='?', default='/home/cni/', help='Root directory to list')
+    parser.add_argument('output_file', nargs='?', default='/home/filenames_py.txt', help='Manifest to write')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Fixed number of directories listed at the same time (default: adapt to the latency)')
+    parser.add_argument('--min-workers', type=int, default=2, help='Lower bound of the adaptive concurrency')
+    parser.add_argument('--max-workers', type=int, default=64, help='Upper bound of the adaptive concurrency')
+    parser.add_argument('--resume', action='store_true', help='Continue an interrupted run')
+    parser.add_argument('--rules', type=str, default=CRAWL_RULES_FILE, help='Include/exclude rules file (if it exists)')
+    args = parser.parse_args()
+
+    autotune = None if args.workers else ConcurrencyController(args.min_workers, args.max_workers)
+    main(args.root_directory, args.output_file, args.workers or CRAWL_WORKERS, args.resume, get_crawl_rules(args.rules),
+         autotune)
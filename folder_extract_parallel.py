@@ -1,108 +1,54 @@
-import os
-import sqlite3
-import concurrent.futures
-import queue
-import time
-import timeit
+import argparse
 
-def get_file_info(file_path):
-    """
-    Function to get file information.
-
-    Args:
-        file_path (str): The path to the file.
-
-    Returns:
-        tuple: A tuple containing the file path, size, creation time, and modification time.
-    """
-    stat = os.stat(file_path)
-    return (
-        file_path,
-        stat.st_size,
-        stat.st_ctime,
-        stat.st_mtime,
-    )
-
-def process_folder(folder_path, file_queue):
-    """
-    Function to process files in a folder and put their information into a queue.
-
-    Args:
-        folder_path (str): The path to the folder to process.
-        file_queue (queue.Queue): The queue to put file information into.
-
-    This function walks through the folder and its subdirectories,
-    gets the information for each file using get_file_info,
-    and puts the information into the queue using a thread pool.
-    """
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        futures = []
-        for root, dirs, files in os.walk(folder_path):
-            futures.extend(executor.submit(file_queue.put, get_file_info(
-                os.path.join(root, f))) for f in files)
-
-        # Wait for all file processing tasks to complete
-        concurrent.futures.wait(futures)
-
-    # Add sentinel value to signal the end of file processing
-    file_queue.put(None)
-
-def save_to_database(file_queue, db_path):
-    """
-    Function to save file information from the queue to a SQLite database.
-
-    Args:
-        file_queue (queue.Queue): The queue to get file information from.
-        db_path (str): The path to the SQLite database file.
-
-    This function creates a SQLite database table if it does not exist,
-    and continuously gets file information from the queue
-    and inserts it into the database until a sentinel value (None) is encountered.
-    """
-    conn = sqlite3.connect(db_path)
-    c = conn.cursor()
-    try:
-        c.execute('''CREATE TABLE "files" (
-        "path"	text,
-        "size"	INTEGER,
-        "created"	TEXT,
-        "modified"	TEXT
-            );''')
-    except:
-        print("table already exists")
-
-    while True:
-        file_info = file_queue.get()
-        if file_info is None:
-            break
-        # print(file_info)
-        c.execute(
-            'INSERT INTO files VALUES (?, ?, ?, ?)', file_info)
+from src.io_crawler import CRAWL_RULES_FILE, CRAWL_WORKERS, ConcurrencyController, FilesTableSink, get_crawl_rules, run_crawl
 
-    conn.commit()
-    conn.close()
 
-def main(folder_path, db_path, worker):
+def main(folder_path, db_path, worker=CRAWL_WORKERS, sink='files', resume=False, rules=None, autotune=None):
     """
-    Main function to coordinate the processing of files and saving to the database using multiple threads.
+    Main function to crawl a folder and save the file information to a SQLite database.
+    The directories are listed in parallel by a bounded pool of workers and the records are written in batches
+    (see src.io_crawler.run_crawl). The progress is checkpointed next to the database
+    ('<db_path>.checkpoint.db'), so an interrupted run can be continued with resume.
 
     Args:
         folder_path (str): The path to the folder to process.
         db_path (str): The path to the SQLite database file.
-        worker (int): The number of worker threads to use.
+        worker (int): The number of directories listed at the same time.
+        sink (str): 'files' writes a plain files table (path, size, created, modified),
+            'fs_storage' writes the fs_file table of the sync database with projects and path tags.
+        resume (bool): Continue an interrupted run instead of starting again.
+        rules (CrawlRules): The include/exclude rules of the crawl (see src.io_crawler.CrawlRules), or None.
+        autotune (ConcurrencyController): Adapts the number of directories listed at the same time to the latency
+            of the file system (worker is then ignored), or None.
 
-    This function sets up a queue and starts a thread pool to process files and save their information to the database.
+    Returns:
+        dict: The summary of the crawl ('files', 'bytes', 'seconds', 'files_per_second', 'pruned', 'autotune').
     """
-    file_queue = queue.Queue()
-    with concurrent.futures.ThreadPoolExecutor(max_workers=worker) as executor:
-        executor.submit(process_folder, folder_path, file_queue)
-        executor.submit(save_to_database, file_queue, db_path)
+    if sink == 'fs_storage':
+        # the fs_storage schema needs the ingest helpers (and their dependencies)
+        from src.io_functions import FsStorageSink
+        crawl_sink = FsStorageSink(db_path, folder_path)
+    else:
+        crawl_sink = FilesTableSink(db_path)
+    return run_crawl(folder_path, crawl_sink, max_workers=worker,
+                     checkpoint=db_path + '.checkpoint.db', resume=resume, rules=rules, autotune=autotune, verbose=1)
 
 if __name__ == '__main__':
-    start_time = time.time()
-    worker = 50
-    main('/home/omero-import/',
-         '/home/RDM_system_connector/data/fs_3tesla_extraction.db', worker)
-    end_time = time.time()
-    runtime = end_time - start_time
-    print(f"worker: {worker} in {runtime}")
+    parser = argparse.ArgumentParser(description='Save the file information of a folder to a SQLite database.')
+    parser.add_argument('folder_path', nargs='?', default='/home/omero-import/', help='Folder to process')
+    parser.add_argument('db_path', nargs='?', default='/home/RDM_system_connector/data/fs_3tesla_extraction.db',
+                        help='SQLite database to write to')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Fixed number of directories listed at the same time (default: adapt to the latency)')
+    parser.add_argument('--min-workers', type=int, default=2, help='Lower bound of the adaptive concurrency')
+    parser.add_argument('--max-workers', type=int, default=64, help='Upper bound of the adaptive concurrency')
+    parser.add_argument('--sink', choices=['files', 'fs_storage'], default='files', help='Table layout to write')
+    parser.add_argument('--resume', action='store_true', help='Continue an interrupted run')
+    parser.add_argument('--rules', type=str, default=CRAWL_RULES_FILE, help='Include/exclude rules file (if it exists)')
+    args = parser.parse_args()
+
+    autotune = None if args.workers else ConcurrencyController(args.min_workers, args.max_workers)
+    summary = main(args.folder_path, args.db_path, args.workers or CRAWL_WORKERS, args.sink, args.resume,
+                   get_crawl_rules(args.rules), autotune)
+    workers = args.workers or f"{args.min_workers}-{args.max_workers} (last {summary['autotune']['limit']})"
+    print(f"worker: {workers} in {summary['seconds']:.2f} seconds ({summary['files_per_second']:.0f} files/s)")
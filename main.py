@@ -8,8 +8,7 @@ It performs the following steps:
 1. Loads all projects from eGroupware and inserts them into the database.
 2. Retrieves sample data and workspace folders from RSpace, processes them, and inserts them into the database.
 3. Automatically inserts data from OMERO into the database.
-4. Deletes duplicate objects, tags, and links from the database.
-5. Automatically inserts data from Netstore into the database.
+4. Automatically inserts data from Netstore into the database.
 
 The script measures and prints the runtime for each step.
 """
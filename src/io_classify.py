@@ -0,0 +1,135 @@
+# Standard library imports
+import os
+import re
+from typing import Dict, Iterable, Union
+
+# Third-party library imports
+import numpy as np
+import pandas as pd
+
+# suffixes of compressed files, they are kept together with the extension in front of them (e.g. '.csv.gz')
+COMPRESSION_EXTENSIONS = ('gz', 'xz', 'bz2', 'zst')
+
+# extensions made of several parts that name one format
+COMPOUND_EXTENSIONS = ('.ome.tif', '.ome.tiff', '.ome.btf', '.ome.tf2', '.ome.tf8', '.ome.zarr', '.ome.xml',
+                       '.nii.gz', '.tar.gz', '.tar.xz', '.tar.bz2', '.tar.zst')
+
+# the extension of a file name: a compound extension, a compressed extension or the last suffix;
+# like os.path.splitext a leading dot (hidden file) is part of the name, not the extension
+EXTENSION_PATTERN = re.compile(
+    r'(?<=.)('
+    + '|'.join(re.escape(extension) for extension in COMPOUND_EXTENSIONS)
+    + r'|\.[^.]+\.(?:' + '|'.join(COMPRESSION_EXTENSIONS) + r')'
+    + r'|\.[^.]*)$',
+    re.IGNORECASE)
+
+# extensions that Bio-Formats (and so the OMERO import) can read, without the generic text/table formats
+BIOFORMATS_EXTENSIONS = frozenset([
+    '.1sc', '.2fl', '.acff', '.afi', '.afm', '.aim', '.al3d', '.ali', '.am', '.amiramesh', '.apl', '.arf', '.avi',
+    '.bif', '.bip', '.bmp', '.btf', '.c01', '.ch5', '.cif', '.cr2', '.crw', '.cxd', '.czi', '.dcm', '.dib', '.dicom',
+    '.dm2', '.dm3', '.dm4', '.dti', '.dv', '.eps', '.epsi', '.exp', '.fdf', '.fff', '.ffr', '.fits', '.flex', '.fli',
+    '.frm', '.gel', '.gif', '.grey', '.hdr', '.hed', '.his', '.htd', '.hx', '.i2i', '.ics', '.ids', '.im3', '.img',
+    '.ims', '.inr', '.ipl', '.ipm', '.ipw', '.j2k', '.jp2', '.jpeg', '.jpf', '.jpg', '.jpk', '.jpx', '.klb', '.l2d',
+    '.lei', '.lif', '.liff', '.lim', '.lms', '.lsm', '.mnc', '.mng', '.mod', '.mov', '.mrc', '.mrcs', '.mrw', '.mrxs',
+    '.msr', '.mtb', '.mvd2', '.naf', '.nd', '.nd2', '.ndpi', '.ndpis', '.nef', '.nhdr', '.nii', '.nii.gz', '.nrrd',
+    '.obf', '.obsep', '.oib', '.oif', '.oir', '.ome', '.ome.btf', '.ome.tf2', '.ome.tf8', '.ome.tif', '.ome.tiff',
+    '.ome.xml', '.ome.zarr', '.par', '.pbm', '.pcoraw', '.pcx', '.pds', '.pgm', '.pic', '.pict', '.png', '.pnl',
+    '.ppm', '.pr3', '.ps', '.psd', '.qptiff', '.r3d', '.rcpnl', '.rec', '.scn', '.sdt', '.seq', '.sif', '.sld',
+    '.sm2', '.sm3', '.spc', '.spe', '.spi', '.stk', '.stp', '.svs', '.sxm', '.tf2', '.tf8', '.tfr', '.tga', '.tif',
+    '.tiff', '.tnb', '.top', '.v', '.vff', '.vms', '.vsi', '.vws', '.wat', '.wlz', '.wpi', '.xdce', '.xqd', '.xqf',
+    '.xv', '.xys', '.zfp', '.zfr', '.zvi',
+])
+
+# modality class of the (lower case) extensions, every other extension is 'other'
+MODALITY_EXTENSIONS = {
+    'microscopy': ['.czi', '.lif', '.lei', '.nd2', '.nd', '.oib', '.oif', '.oir', '.lsm', '.ims', '.vsi', '.zvi',
+                   '.ics', '.ids', '.dv', '.r3d', '.stk', '.svs', '.ndpi', '.ndpis', '.scn', '.mrxs', '.sld', '.lms',
+                   '.flex', '.obf', '.msr', '.ome', '.ome.tif', '.ome.tiff', '.ome.btf', '.ome.tf2', '.ome.tf8',
+                   '.ome.zarr', '.qptiff', '.klb', '.xdce', '.c01', '.htd'],
+    'medical': ['.nii', '.nii.gz', '.hdr', '.img', '.mnc', '.dcm', '.dicom', '.nrrd', '.nhdr', '.mha', '.mhd',
+                '.par', '.rec', '.fdf'],
+    'electron': ['.mrc', '.mrcs', '.dm2', '.dm3', '.dm4', '.emd', '.ser', '.st'],
+    'image': ['.tif', '.tiff', '.btf', '.png', '.jpg', '.jpeg', '.bmp', '.gif', '.jp2', '.j2k', '.psd', '.tga',
+              '.pgm', '.ppm', '.pbm', '.eps', '.svg'],
+    'video': ['.avi', '.mov', '.mp4', '.mkv', '.mpg', '.mpeg', '.wmv'],
+    'table': ['.csv', '.tsv', '.xls', '.xlsx', '.ods', '.parquet', '.feather', '.h5', '.hdf5', '.mat', '.npy',
+              '.npz'],
+    'document': ['.pdf', '.doc', '.docx', '.odt', '.rtf', '.txt', '.md', '.ppt', '.pptx', '.odp', '.html', '.htm'],
+    'metadata': ['.xml', '.ome.xml', '.json', '.yaml', '.yml', '.ini', '.cfg', '.log', '.toml'],
+    'code': ['.py', '.ipynb', '.m', '.ijm', '.r', '.sh', '.java', '.js', '.c', '.cpp', '.h', '.groovy', '.bsh'],
+    'archive': ['.zip', '.tar', '.tar.gz', '.tgz', '.tar.xz', '.tar.bz2', '.tar.zst', '.7z', '.rar', '.gz', '.xz',
+                '.bz2', '.zst'],
+}
+MODALITY_BY_EXTENSION: Dict[str, str] = {extension: modality
+                                         for modality, extensions in MODALITY_EXTENSIONS.items()
+                                         for extension in extensions}
+MODALITY_CATEGORIES = pd.CategoricalDtype(list(MODALITY_EXTENSIONS) + ['other'])
+
+# the suffix of a compressed extension, removed to classify e.g. '.csv.gz' like '.csv'
+_COMPRESSION_SUFFIX = r'\.(?:' + '|'.join(COMPRESSION_EXTENSIONS) + r')$'
+
+
+def get_file_extension(file_path: str) -> str:
+    """
+    This function returns the extension of a file, compound extensions (e.g. '.ome.tif', '.nii.gz') and
+    compressed extensions (e.g. '.csv.gz') included. The case of the name is kept.
+
+    Parameters:
+    file_path (str): The path or name of the file.
+
+    Returns:
+    str: The extension of the file (an empty string if it has none).
+    """
+    match = EXTENSION_PATTERN.search(os.path.basename(file_path))
+    return match.group(0) if match else ""
+
+
+def _as_series(paths: Union[Iterable[str], np.ndarray, pd.Series]) -> pd.Series:
+    """
+    This function returns a batch of paths as a pandas Series of strings (a Series is kept with its index).
+    """
+    if isinstance(paths, pd.Series):
+        return paths.astype(str)
+    if not isinstance(paths, np.ndarray):
+        paths = list(paths)
+    return pd.Series(paths, dtype=object).astype(str)
+
+
+def get_file_extensions(paths: Union[Iterable[str], np.ndarray, pd.Series]) -> pd.Series:
+    """
+    This function returns the extensions of a batch of files (see get_file_extension) as a pandas string array.
+
+    Parameters:
+    paths (Union[Iterable[str], np.ndarray, pd.Series]): The paths or names of the files.
+
+    Returns:
+    pd.Series: The extensions, in the order (and with the index) of the paths.
+    """
+    names = _as_series(paths).str.rsplit('/', n=1).str[-1]
+    return names.str.extract(EXTENSION_PATTERN, expand=False).fillna("")
+
+
+def classify_paths(paths: Union[Iterable[str], np.ndarray, pd.Series]) -> pd.DataFrame:
+    """
+    This function classifies a batch of files by their names with one vector operation per column, so filters
+    (e.g. the files the OMERO import can read) are boolean masks instead of a check per file.
+
+    Parameters:
+    paths (Union[Iterable[str], np.ndarray, pd.Series]): The paths or names of the files.
+
+    Returns:
+    pd.DataFrame: One row per path with the columns 'path', 'extension' (see get_file_extension),
+    'bioformats' (True if Bio-Formats can read the file) and 'modality' (a categorical, see MODALITY_EXTENSIONS).
+    """
+    paths = _as_series(paths)
+    extensions = get_file_extensions(paths)
+    lower = extensions.str.lower()
+    # a compressed file without a class of its own is classified by the extension in front of the compression
+    modality = lower.map(MODALITY_BY_EXTENSION)
+    modality = modality.fillna(lower.str.replace(_COMPRESSION_SUFFIX, '', regex=True).map(MODALITY_BY_EXTENSION))
+    return pd.DataFrame({
+        'path': paths,
+        'extension': extensions,
+        'bioformats': lower.isin(BIOFORMATS_EXTENSIONS),
+        'modality': modality.fillna('other').astype(MODALITY_CATEGORIES),
+    })
@@ -0,0 +1,954 @@
+# Standard library imports
+import abc
+import collections
+import concurrent.futures
+import errno
+import fnmatch
+import hashlib
+import itertools
+import json
+import os
+import queue
+import re
+import threading
+import time
+from typing import (Any, Callable, Container, Dict, Iterable, Iterator, List, NamedTuple, Optional, Pattern, Set, Tuple,
+                    Union)
+
+# Local imports
+from src.io_database import DEFAULT_DB_NAME, get_sync_database
+
+# number of directories that are listed at the same time; raise it to saturate a NAS, lower it to spare it
+CRAWL_WORKERS = 8
+# size of the head, middle and tail block hashed by get_fingerprint
+FINGERPRINT_BLOCK_SIZE = 64 * 1024
+# the include/exclude rules of the crawler (see CrawlRules)
+CRAWL_RULES_FILE = "crawl_rules.json"
+
+
+class FileRecord(NamedTuple):
+    """
+    A file found by the crawler, with the stat values taken from its directory entry.
+    """
+    path: str
+    size: int
+    ctime: float
+    mtime: float
+
+    @property
+    def dirname(self) -> str:
+        return os.path.dirname(self.path)
+
+    @property
+    def name(self) -> str:
+        return os.path.basename(self.path)
+
+
+def get_file_record(file: Union[str, FileRecord]) -> FileRecord:
+    """
+    This function returns the FileRecord of a file. A record from the crawler is returned as is,
+    only for a plain path the file is stat'ed.
+
+    Parameters:
+    file (Union[str, FileRecord]): The file path or the record of the file.
+
+    Returns:
+    FileRecord: The record of the file.
+    """
+    if isinstance(file, FileRecord):
+        return file
+    file_stats = os.stat(file)
+    return FileRecord(file, file_stats.st_size, file_stats.st_ctime, file_stats.st_mtime)
+
+
+class CrawlRules:
+    """
+    Include/exclude rules of the crawler, compiled once. The crawler asks them for every directory before it
+    descends (a pruned directory is never listed) and for every file before it is stat'ed.
+
+    A rule is a dictionary with a 'name', a 'type' ('dir' or 'file'), one or more 'glob' patterns and/or a
+    'regex', and an 'action' ('exclude', the default, or 'include'). A glob without '/' matches the name of the
+    entry, a glob with '/' the whole path ('*' also matches '/'); a regex is searched in the whole path.
+    The first matching rule decides, so an include rule before a broader exclude rule keeps an exception.
+    Entries without a matching rule are crawled. The number of entries pruned per rule is kept in counts.
+
+    Parameters:
+    rules (Iterable[Dict[str, Any]]): The rules, e.g. the 'rules' list of crawl_rules.json.
+    """
+
+    def __init__(self, rules: Iterable[Dict[str, Any]]):
+        self.rules: Dict[str, List[Tuple[Optional[str], Optional[Pattern], Optional[Pattern], Optional[Pattern]]]] = \
+            {'dir': [], 'file': []}
+        for rule in rules:
+            kind, action = rule.get('type', 'dir'), rule.get('action', 'exclude')
+            if kind not in self.rules or action not in ('exclude', 'include'):
+                raise ValueError(f"invalid crawl rule: {rule}")
+            globs = rule.get('glob', [])
+            globs = [globs] if isinstance(globs, str) else list(globs)
+            name_globs = [glob for glob in globs if '/' not in glob]
+            path_globs = [glob for glob in globs if '/' in glob]
+            # an include rule has no name, it stops the search without counting
+            self.rules[kind].append((
+                rule['name'] if action == 'exclude' else None,
+                re.compile('|'.join(fnmatch.translate(glob) for glob in name_globs)) if name_globs else None,
+                re.compile('|'.join(fnmatch.translate(glob) for glob in path_globs)) if path_globs else None,
+                re.compile(rule['regex']) if rule.get('regex') else None))
+        self.counts = collections.Counter()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, path: str = CRAWL_RULES_FILE) -> "CrawlRules":
+        """
+        This function loads the rules from a JSON file with a 'rules' list (see crawl_rules.json).
+        """
+        with open(path) as f:
+            return cls(json.load(f)['rules'])
+
+    def _match(self, kind: str, path: str, name: str, count: bool = True) -> bool:
+        for rule_name, name_pattern, path_pattern, regex in self.rules[kind]:
+            if ((name_pattern is not None and name_pattern.match(name))
+                    or (path_pattern is not None and path_pattern.match(path))
+                    or (regex is not None and regex.search(path))):
+                if rule_name is None:
+                    return False
+                if not count:
+                    return True
+                with self._lock:
+                    self.counts[rule_name] += 1
+                return True
+        return False
+
+    def prune_directory(self, path: str, name: Optional[str] = None) -> bool:
+        """
+        This function returns True if the directory (and everything below it) is left out of the crawl.
+        """
+        return bool(self.rules['dir']) and self._match('dir', path, name or os.path.basename(path))
+
+    def exclude_file(self, path: str, name: Optional[str] = None) -> bool:
+        """
+        This function returns True if the file is left out of the crawl.
+        """
+        return bool(self.rules['file']) and self._match('file', path, name or os.path.basename(path))
+
+    def prunes_path(self, path: str, root: str) -> bool:
+        """
+        This function returns True if a directory below root lies in a pruned directory (e.g. an inotify event
+        from a .git folder). The counts are not changed.
+        """
+        current = root
+        for part in os.path.relpath(path, root).split(os.sep):
+            if part in ('.', '..'):
+                continue
+            current = os.path.join(current, part)
+            if self.rules['dir'] and self._match('dir', current, part, count=False):
+                return True
+        return False
+
+
+def get_crawl_rules(path: str = CRAWL_RULES_FILE) -> Optional[CrawlRules]:
+    """
+    This function loads the crawl rules from a JSON file (see CrawlRules), or returns None if there is no such file.
+
+    Parameters:
+    path (str): The path of the rules file. Default is CRAWL_RULES_FILE.
+
+    Returns:
+    Optional[CrawlRules]: The compiled rules.
+    """
+    if not os.path.exists(path):
+        return None
+    return CrawlRules.from_file(path)
+
+
+class ConcurrencyController:
+    """
+    An AIMD (additive increase, multiplicative decrease) controller of the number of directory operations in flight,
+    for crawls of network mounts where the best concurrency depends on the latency of the server.
+    Every finished listing reports its duration per file system operation (the listing and the stat of every file).
+    The controller smooths these latencies and keeps a slowly aging baseline of the lowest smoothed latency.
+    While the latency stays within tolerance times the baseline, the limit grows by one after each round
+    (as many completions as the limit). When the server slows down beyond that, or an operation fails with an I/O
+    error anywhere in the round, the limit is multiplied by decrease, at most once per round.
+
+    Parameters:
+    min_workers (int): The lower bound of the limit. Default is 2.
+    max_workers (int): The upper bound of the limit (and the size of the thread pool). Default is 64.
+    initial (int): The limit at the start. Default is CRAWL_WORKERS.
+    tolerance (float): The ratio of smoothed latency to baseline that counts as congestion. Default is 2.0.
+    decrease (float): The factor applied to the limit on congestion. Default is 0.5.
+    smoothing (float): The weight of a new latency in the moving average. Default is 0.2.
+    """
+
+    def __init__(self, min_workers: int = 2, max_workers: int = 64, initial: int = CRAWL_WORKERS,
+                 tolerance: float = 2.0, decrease: float = 0.5, smoothing: float = 0.2):
+        if not 1 <= min_workers <= max_workers:
+            raise ValueError(f"invalid bounds: {min_workers} - {max_workers}")
+        self.min_workers = min_workers
+        self.max_workers = max_workers
+        self.limit = min(max(initial, min_workers), max_workers)
+        self.tolerance = tolerance
+        self.decrease = decrease
+        self.smoothing = smoothing
+        self.latency: Optional[float] = None
+        self.baseline: Optional[float] = None
+        # completions since the last change of the limit and whether one of them failed
+        self._completed = 0
+        self._failed = False
+        self.increases = 0
+        self.decreases = 0
+        self.peak = self.limit
+
+    def record(self, seconds: float, operations: int = 1, failed: bool = False) -> None:
+        """
+        This function reports a finished directory operation and adapts the limit.
+
+        Parameters:
+        seconds (float): The duration of the operation.
+        operations (int): The number of file system operations it made (e.g. 1 + the files stat'ed). Default is 1.
+        failed (bool): True if it failed with an I/O error (e.g. a timeout of the server). Default is False.
+        """
+        latency = seconds / max(operations, 1)
+        self.latency = latency if self.latency is None else self.latency + self.smoothing * (latency - self.latency)
+        if self.baseline is None or self.latency < self.baseline:
+            self.baseline = self.latency
+        self._completed += 1
+        # a failure in the middle of a round counts at its end
+        self._failed = self._failed or failed
+        if self._completed < self.limit:
+            return
+        self._completed = 0
+        failed, self._failed = self._failed, False
+        # the baseline ages slowly towards the current latency (once per round), so a burst of cached listings
+        # does not pin it forever
+        self.baseline += 0.02 * (self.latency - self.baseline)
+        if failed or self.latency > self.tolerance * self.baseline:
+            limit = max(self.min_workers, int(self.limit * self.decrease))
+            self.decreases += limit < self.limit
+        else:
+            limit = min(self.max_workers, self.limit + 1)
+            self.increases += limit > self.limit
+        self.limit = limit
+        self.peak = max(self.peak, limit)
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        This function returns the state of the controller ('limit', 'peak', 'increases', 'decreases',
+        'latency' and 'baseline' in seconds per operation).
+        """
+        return {'limit': self.limit, 'peak': self.peak, 'increases': self.increases, 'decreases': self.decreases,
+                'latency': self.latency, 'baseline': self.baseline}
+
+
+def scan_directory(path: str, onerror: Optional[Callable[[OSError], None]] = None,
+                   rules: Optional[CrawlRules] = None) -> Tuple[List[FileRecord], List[str]]:
+    """
+    This function lists one directory with os.scandir. The file type comes from the directory listing and the
+    stat values are fetched once per entry (and are free on platforms that return them with the listing),
+    so no file has to be stat'ed again later. Symbolic links are not followed.
+
+    Parameters:
+    path (str): The path of the directory.
+    onerror (Callable[[OSError], None]): Called with the error if the directory cannot be listed
+        (like os.walk, unreadable directories are skipped). Default is None.
+    rules (CrawlRules): Pruned subdirectories and excluded files are left out (the files are not stat'ed).
+        Default is None.
+
+    Returns:
+    Tuple[List[FileRecord], List[str]]: The files and the paths of the subdirectories of the directory.
+    """
+    files, subdirs = [], []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if rules is None or not rules.prune_directory(entry.path, entry.name):
+                            subdirs.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        if rules is not None and rules.exclude_file(entry.path, entry.name):
+                            continue
+                        file_stats = entry.stat(follow_symlinks=False)
+                        files.append(FileRecord(entry.path, file_stats.st_size, file_stats.st_ctime, file_stats.st_mtime))
+                except OSError:
+                    # the entry vanished between the listing and the stat
+                    continue
+    except OSError as error:
+        if onerror is not None:
+            onerror(error)
+    return files, subdirs
+
+
+def _is_io_error(error: OSError) -> bool:
+    """
+    This function returns True for errors that point to an overloaded or unreachable server (not e.g. a missing
+    permission), which make the ConcurrencyController back off.
+    """
+    return error.errno in (errno.EIO, errno.ETIMEDOUT, errno.EAGAIN, errno.EBUSY, errno.ESTALE, errno.ENOLCK)
+
+
+def _timed_scan(path: str, onerror: Optional[Callable[[OSError], None]],
+                rules: Optional[CrawlRules]) -> Tuple[List[FileRecord], List[str], float, bool]:
+    """
+    This function lists a directory with scan_directory (in a worker thread) and also returns the duration
+    of the listing and whether it failed with an I/O error.
+    """
+    errors = []
+    start = time.perf_counter()
+    files, subdirs = scan_directory(path, errors.append, rules)
+    seconds = time.perf_counter() - start
+    if errors and onerror is not None:
+        onerror(errors[0])
+    return files, subdirs, seconds, any(_is_io_error(error) for error in errors)
+
+
+def crawl_directories(folder: str, max_workers: int = CRAWL_WORKERS,
+                      onerror: Optional[Callable[[OSError], None]] = None,
+                      skip: Container[str] = (), rules: Optional[CrawlRules] = None,
+                      autotune: Optional[ConcurrencyController] = None) -> Iterator[Tuple[str, List[FileRecord], List[str]]]:
+    """
+    This function crawls a folder and all of its subfolders in parallel and yields every listed directory.
+    Every directory is one task: a worker lists it, its subdirectories are queued and the next idle worker takes
+    the most recently found one, so the workers stay busy however unbalanced the tree is and at most
+    max_workers directory listings are in flight at any time.
+    The directories are yielded as they are listed, not in the order of os.walk (but always after their parent).
+
+    Parameters:
+    folder (str): The path of the directory to crawl.
+    max_workers (int): The number of directories listed at the same time. Default is CRAWL_WORKERS.
+    onerror (Callable[[OSError], None]): Called for directories that cannot be listed. Default is None.
+    skip (Container[str]): Directories whose subtrees are left out (e.g. completed before a resume). Default is ().
+    rules (CrawlRules): The include/exclude rules applied to every listing (see scan_directory). Default is None.
+    autotune (ConcurrencyController): Adapts the number of listings in flight to the latency of the file system
+        (within its bounds, max_workers is then ignored). Default is None (always max_workers).
+
+    Returns:
+    Iterator[Tuple[str, List[FileRecord], List[str]]]: The path, the files and the subdirectories
+    (without the skipped ones) of every directory.
+    """
+    pending = collections.deque([] if folder in skip else [folder])
+    pool_size = autotune.max_workers if autotune is not None else max_workers
+    with concurrent.futures.ThreadPoolExecutor(max_workers=pool_size) as executor:
+        running = {}
+        while pending or running:
+            limit = autotune.limit if autotune is not None else max_workers
+            # depth first (LIFO) keeps the queue of known but unlisted directories short
+            while pending and len(running) < limit:
+                path = pending.pop()
+                running[executor.submit(_timed_scan, path, onerror, rules)] = path
+            done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                path = running.pop(future)
+                files, subdirs, seconds, failed = future.result()
+                if autotune is not None:
+                    autotune.record(seconds, 1 + len(files), failed)
+                subdirs = [subdir for subdir in subdirs if subdir not in skip]
+                pending.extend(subdirs)
+                yield path, files, subdirs
+
+
+def crawl(folder: str, max_workers: int = CRAWL_WORKERS,
+          onerror: Optional[Callable[[OSError], None]] = None,
+          rules: Optional[CrawlRules] = None,
+          autotune: Optional[ConcurrencyController] = None) -> Iterator[FileRecord]:
+    """
+    This function crawls a folder and all of its subfolders in parallel (see crawl_directories)
+    and yields a FileRecord for every file.
+
+    Parameters:
+    folder (str): The path of the directory to crawl.
+    max_workers (int): The number of directories listed at the same time. Default is CRAWL_WORKERS.
+    onerror (Callable[[OSError], None]): Called for directories that cannot be listed. Default is None.
+    rules (CrawlRules): The include/exclude rules (see CrawlRules). Default is None.
+    autotune (ConcurrencyController): Adapts the concurrency to the latency of the file system. Default is None.
+
+    Returns:
+    Iterator[FileRecord]: The records of all files below the folder.
+    """
+    for path, files, subdirs in crawl_directories(folder, max_workers, onerror, rules=rules, autotune=autotune):
+        yield from files
+
+
+def crawl_projects(folder: str, max_workers: int = CRAWL_WORKERS,
+                   onerror: Optional[Callable[[OSError], None]] = None,
+                   rules: Optional[CrawlRules] = None) -> Iterator[Tuple[str, Iterator[FileRecord]]]:
+    """
+    This function crawls a folder project by project, a project being an entry directly below the folder
+    (a file directly in the folder is a project of its own). The files of a project are crawled in parallel
+    with crawl; the projects follow each other, so every project can be processed as soon as it is crawled.
+
+    Parameters:
+    folder (str): The root folder of the projects.
+    max_workers (int): The number of directories listed at the same time. Default is CRAWL_WORKERS.
+    onerror (Callable[[OSError], None]): Called for directories that cannot be listed. Default is None.
+    rules (CrawlRules): The include/exclude rules (see CrawlRules). Default is None.
+
+    Returns:
+    Iterator[Tuple[str, Iterator[FileRecord]]]: Tuples of the project name and an iterator over its files.
+    """
+    files, subdirs = scan_directory(folder, onerror, rules)
+    for record in files:
+        yield record.name, iter([record])
+    for path in subdirs:
+        yield os.path.basename(path), crawl(path, max_workers, onerror, rules)
+
+
+class FileChange(NamedTuple):
+    """
+    A file that was 'added', 'changed' or 'removed' since the last crawl. The record of a removed file
+    carries the size and timestamps stored in the fs_file table.
+    """
+    status: str
+    record: FileRecord
+
+
+class IncrementalCrawl:
+    """
+    An incremental crawl of a folder against the files stored in the fs_file table.
+
+    The crawl_state table keeps the inode, mtime and number of entries of every directory listed by the last crawl.
+    A directory with the same inode and mtime has no added, removed or renamed entries, so it is only stat'ed and
+    its subdirectories are taken from the directory table instead of listing it again. Changed and new directories
+    are listed and compared with their stored files. Only the differences are yielded by changes().
+
+    A file that is rewritten in place does not change the mtime of its directory; such changes are only found when
+    the directory changes for another reason or by a crawl with full=True (e.g. once a week).
+
+    Usage:
+        crawl = IncrementalCrawl(db_name, folder)
+        for change in crawl.changes():
+            ...  # write the change to fs_file
+        crawl.save_state()  # only after the changes are stored, so an interrupted run is repeated
+
+    Parameters:
+    db_name (str): The name of the SQLite database. Default is 'sync_database.db'.
+    folder (str): The root folder of the crawl.
+    max_workers (int): The number of directories stat'ed or listed at the same time. Default is CRAWL_WORKERS.
+    full (bool): If True, every directory is listed (the stored state is only used to find removed files).
+    onerror (Callable[[OSError], None]): Called for directories that cannot be listed. Default is None.
+    rules (CrawlRules): The include/exclude rules (see CrawlRules). Stored files below a pruned directory are removed
+        with the next crawl; stored files excluded by a new file rule are removed when their directory is listed
+        again (at the latest by a full crawl). Default is None.
+    autotune (ConcurrencyController): Adapts the number of directories stat'ed or listed at the same time to the
+        latency of the file system (max_workers is then ignored). Default is None.
+    """
+
+    def __init__(self, db_name: str = DEFAULT_DB_NAME, folder: str = "/home/omero-import",
+                 max_workers: int = CRAWL_WORKERS, full: bool = False,
+                 onerror: Optional[Callable[[OSError], None]] = None, rules: Optional[CrawlRules] = None,
+                 autotune: Optional[ConcurrencyController] = None):
+        self.db = get_sync_database(db_name)
+        self.folder = os.path.normpath(folder)
+        self.max_workers = max_workers
+        self.full = full
+        self.onerror = onerror
+        self.rules = rules
+        self.autotune = autotune
+        # counts of the last run: listed and skipped directories, added, changed and removed files
+        self.stats = collections.Counter()
+        self._states: Dict[str, Tuple[int, Optional[int], Optional[int]]] = {}
+        self._children: Dict[str, List[str]] = collections.defaultdict(list)
+        self._listed: List[Tuple[str, int, int, int]] = []
+        self._unreadable: List[str] = []
+        self._removed_dirs: List[str] = []
+        self._dirty: Set[str] = set()
+        self._latencies: queue.SimpleQueue = queue.SimpleQueue()
+
+    def _load_state(self, roots: Iterable[str]) -> None:
+        """
+        This function loads the known directories below the roots with their crawl state (if they have one).
+        """
+        self._states.clear()
+        self._children.clear()
+        for root in roots:
+            prefix = root.rstrip('/') + '/'
+            rows = self.db.fetchall("""
+                SELECT d.dir_id, d.path, p.path, s.inode, s.mtime_ns
+                FROM directory d
+                LEFT JOIN directory p ON p.dir_id = d.parent_id
+                LEFT JOIN crawl_state s ON s.dir_id = d.dir_id
+                WHERE d.path = ? OR substr(d.path, 1, ?) = ?""", (root, len(prefix), prefix))
+            for dir_id, path, parent_path, inode, mtime_ns in rows:
+                self._states[path] = (dir_id, inode, mtime_ns)
+                if path != root and parent_path is not None:
+                    self._children[parent_path].append(path)
+
+    def _visit(self, path: str) -> Tuple[str, Optional[os.stat_result], Optional[List[FileRecord]], List[str], bool]:
+        """
+        This function stats a directory and lists it unless its stored state is unchanged (runs in a worker thread).
+        Returns the path, the stat result (None if the directory is gone), the files (None if it was not listed),
+        the subdirectories and whether the listing failed.
+        """
+        start = time.perf_counter()
+        result = self._stat_or_list(path)
+        if self.autotune is not None:
+            files = result[2]
+            # one stat of the directory, plus the listing and the stat of every file if it was listed
+            self._latencies.put((time.perf_counter() - start, 1 + (1 + len(files) if files is not None else 0)))
+        return result
+
+    def _stat_or_list(self, path: str) -> Tuple[str, Optional[os.stat_result], Optional[List[FileRecord]], List[str], bool]:
+        try:
+            dir_stats = os.stat(path, follow_symlinks=False)
+        except FileNotFoundError:
+            return path, None, None, [], False
+        except OSError as error:
+            if self.onerror is not None:
+                self.onerror(error)
+            return path, None, None, [], True
+        state = self._states.get(path)
+        if (not self.full and path not in self._dirty and state is not None
+                and state[1] == dir_stats.st_ino and state[2] == dir_stats.st_mtime_ns):
+            return path, dir_stats, None, self._children.get(path, []), False
+        errors = []
+        files, subdirs = scan_directory(path, errors.append, self.rules)
+        if errors and self.onerror is not None:
+            self.onerror(errors[0])
+        return path, dir_stats, files, subdirs, bool(errors)
+
+    def _stored_files(self, path: str) -> Dict[str, FileRecord]:
+        """
+        This function returns the files of a directory that are stored in the fs_file table, by name.
+        """
+        state = self._states.get(path)
+        if state is None:
+            return {}
+        rows = self.db.fetchall("SELECT name, object_size, created_epoch, modified_epoch FROM fs_file WHERE dir_id = ?",
+                                (state[0],))
+        return {name: FileRecord(os.path.join(path, name), size, created_epoch, modified_epoch)
+                for name, size, created_epoch, modified_epoch in rows}
+
+    def _removed_tree(self, path: str) -> Iterator[FileChange]:
+        """
+        This function yields the stored files of a directory that no longer exists and of all directories below it.
+        """
+        prefix = path.rstrip('/') + '/'
+        for known in [path] + [known for known in self._states if known.startswith(prefix)]:
+            self._removed_dirs.append(known)
+            for record in self._stored_files(known).values():
+                yield FileChange('removed', record)
+
+    def changes(self, dirty: Optional[Iterable[str]] = None) -> Iterator[FileChange]:
+        """
+        This function crawls the folder (stat'ing or listing up to max_workers directories at the same time)
+        and yields the files that were added, changed (size or mtime) or removed since the last crawl.
+
+        Parameters:
+        dirty (Iterable[str]): Directories that are known to have changed (e.g. from file system events). If given,
+            only the subtrees of these directories are crawled and the directories themselves are always listed
+            (which also finds files rewritten in place). Default is None (crawl the whole folder).
+
+        Returns:
+        Iterator[FileChange]: The changes, in the order the directories are visited.
+        """
+        self._dirty = {os.path.normpath(path) for path in dirty} if dirty else set()
+        if self.rules is not None:
+            # events from pruned directories (e.g. a git checkout in a project) do not trigger a crawl
+            self._dirty = {path for path in self._dirty if not self.rules.prunes_path(path, self.folder)}
+        # a dirty directory below another dirty directory is reached from there (sorted, a subtree follows its root)
+        roots = []
+        for path in sorted(self._dirty, key=lambda path: path.split('/')):
+            if not roots or not path.startswith(roots[-1].rstrip('/') + '/'):
+                roots.append(path)
+        roots = roots or ([] if dirty else [self.folder])
+        self._load_state(roots)
+        self.stats.clear()
+        self._listed, self._unreadable, self._removed_dirs = [], [], []
+        pending = collections.deque(roots)
+        pool_size = self.autotune.max_workers if self.autotune is not None else self.max_workers
+        with concurrent.futures.ThreadPoolExecutor(max_workers=pool_size) as executor:
+            running = set()
+            while pending or running:
+                limit = self.autotune.limit if self.autotune is not None else self.max_workers
+                while pending and len(running) < limit:
+                    running.add(executor.submit(self._visit, pending.pop()))
+                done, running = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+                # the controller is only used by this thread, the workers hand over their latencies
+                while self.autotune is not None and not self._latencies.empty():
+                    self.autotune.record(*self._latencies.get())
+                for future in done:
+                    path, dir_stats, files, subdirs, failed = future.result()
+                    if failed:
+                        # keep the stored files, the directory is listed again by the next crawl
+                        self._unreadable.append(path)
+                        continue
+                    if dir_stats is None:
+                        for change in self._removed_tree(path):
+                            self.stats[change.status] += 1
+                            yield change
+                        continue
+                    if files is None and self.rules is not None:
+                        # the stored subdirectories of an unchanged directory that are pruned by a (new) rule
+                        pruned = [child for child in subdirs if self.rules.prune_directory(child)]
+                        subdirs = [child for child in subdirs if child not in pruned]
+                        for child in pruned:
+                            for change in self._removed_tree(child):
+                                self.stats[change.status] += 1
+                                yield change
+                    pending.extend(subdirs)
+                    if files is None:
+                        self.stats['skipped_dirs'] += 1
+                        continue
+                    self.stats['listed_dirs'] += 1
+                    self._listed.append((path, dir_stats.st_ino, dir_stats.st_mtime_ns, len(files) + len(subdirs)))
+                    stored = self._stored_files(path)
+                    for record in files:
+                        previous = stored.pop(record.name, None)
+                        if previous is None:
+                            change = FileChange('added', record)
+                        elif previous.size != record.size or previous.mtime != int(record.mtime):
+                            change = FileChange('changed', record)
+                        else:
+                            continue
+                        self.stats[change.status] += 1
+                        yield change
+                    for record in stored.values():
+                        self.stats['removed'] += 1
+                        yield FileChange('removed', record)
+                    for child in set(self._children.get(path, [])).difference(subdirs):
+                        for change in self._removed_tree(child):
+                            self.stats[change.status] += 1
+                            yield change
+
+    def save_state(self) -> None:
+        """
+        This function stores the state of the directories listed by changes() in the crawl_state table
+        and forgets the directories that no longer exist. Call it after the changes are written.
+        """
+        crawled_epoch = int(time.time())
+        with self.db.transaction():
+            rows = ({'dir_id': self.db.get_directory_id(path),
+                     'inode': inode,
+                     'mtime_ns': mtime_ns,
+                     'child_count': child_count,
+                     'crawled_epoch': crawled_epoch}
+                    for path, inode, mtime_ns, child_count in self._listed)
+            self.db.insert_many('crawl_state', rows)
+            for path in self._unreadable:
+                # known to the directory table, so it is visited again below an unchanged parent
+                self.db.get_directory_id(path)
+            for path in self._removed_dirs:
+                self.db.execute("DELETE FROM crawl_state WHERE dir_id IN (SELECT dir_id FROM directory WHERE path = ?)", (path,))
+                self.db.execute("DELETE FROM directory WHERE path = ? AND NOT EXISTS "
+                                "(SELECT 1 FROM fs_file WHERE fs_file.dir_id = directory.dir_id)", (path,))
+        self.db.directory_ids.clear()
+
+
+def get_fingerprint(path: str, size: int, block_size: int = FINGERPRINT_BLOCK_SIZE) -> Optional[str]:
+    """
+    This function computes a sampled content fingerprint of a file: a BLAKE2b hash of the size and of the
+    first, middle and last block of the file (small files are hashed completely). Reading three blocks
+    is cheap even for very large images, and a moved or renamed file keeps its fingerprint.
+
+    Parameters:
+    path (str): The path of the file.
+    size (int): The size of the file in bytes (from the crawl).
+    block_size (int): The size of the sampled blocks in bytes. Default is FINGERPRINT_BLOCK_SIZE.
+
+    Returns:
+    Optional[str]: The fingerprint as hex string, or None if the file cannot be read.
+    """
+    digest = hashlib.blake2b(str(size).encode(), digest_size=16)
+    try:
+        with open(path, 'rb') as f:
+            if size <= 3 * block_size:
+                digest.update(f.read())
+            else:
+                for offset in (0, (size - block_size) // 2, size - block_size):
+                    f.seek(offset)
+                    digest.update(f.read(block_size))
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+def iter_fingerprints(records: Iterable[FileRecord], max_workers: Optional[int] = None,
+                      batch_size: int = 1000) -> Iterator[Tuple[FileRecord, Optional[str]]]:
+    """
+    This function computes the fingerprints of files in a process pool. The records are consumed in batches,
+    so only one batch of files is in flight and a streamed crawl stays streamed.
+
+    Parameters:
+    records (Iterable[FileRecord]): The files.
+    max_workers (int): The number of processes. Default is None (the number of CPUs).
+    batch_size (int): The number of files handed to the pool at once. Default is 1000.
+
+    Returns:
+    Iterator[Tuple[FileRecord, Optional[str]]]: The records with their fingerprint, in the order of the input.
+    """
+    records = iter(records)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+        for batch in iter(lambda: list(itertools.islice(records, batch_size)), []):
+            fingerprints = executor.map(get_fingerprint, [record.path for record in batch],
+                                        [record.size for record in batch], chunksize=64)
+            yield from zip(batch, fingerprints)
+
+
+def get_printable_path(path: str) -> str:
+    """
+    This function replaces the bytes of a path that are not valid UTF-8 (kept as surrogates by os.scandir),
+    so the path can be written to a UTF-8 text file or a SQLite TEXT column.
+    """
+    return path.encode('utf-8', 'surrogateescape').decode('utf-8', 'replace')
+
+
+class CrawlSink(abc.ABC):
+    """
+    The abstract base class of the sinks of run_crawl. A sink receives the FileRecords in batches (always from the same
+    thread) and is closed when the crawl ends, also after an error.
+    For resumable crawls a sink reports a position after every batch (stored in the CrawlCheckpoint) and
+    can be truncated to it, which drops the batches written after the last checkpoint.
+    Sinks that write idempotently (e.g. upserts) keep the defaults.
+    """
+
+    @abc.abstractmethod
+    def write(self, records: List[FileRecord]) -> None:
+        pass
+
+    def get_position(self) -> Any:
+        return None
+
+    def truncate(self, position: Any) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class ManifestSink(CrawlSink):
+    """
+    A sink that writes the file paths to a text manifest, one path per line.
+
+    Parameters:
+    output_file (str): The path of the manifest.
+    resume (bool): If True, the manifest is continued instead of overwritten. Default is False.
+    """
+
+    def __init__(self, output_file: str, resume: bool = False):
+        self.file = open(output_file, 'a' if resume else 'w', encoding='utf-8')
+
+    def write(self, records: List[FileRecord]) -> None:
+        self.file.writelines(get_printable_path(record.path) + '\n' for record in records)
+
+    def get_position(self) -> int:
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return self.file.tell()
+
+    def truncate(self, position: int) -> None:
+        self.file.flush()
+        self.file.truncate(position)
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class FilesTableSink(CrawlSink):
+    """
+    A sink that writes the path, size and timestamps of the files to a plain 'files' table
+    (one transaction per batch through the SyncDatabase session of the database).
+
+    Parameters:
+    db_name (str): The name or path of the SQLite database.
+    table_name (str): The name of the table. Default is 'files'.
+    """
+
+    def __init__(self, db_name: str, table_name: str = 'files'):
+        self.db = get_sync_database(db_name)
+        self.table_name = table_name
+        self.db.execute(f"CREATE TABLE IF NOT EXISTS {table_name} (path TEXT, size INTEGER, created TEXT, modified TEXT)")
+
+    def write(self, records: List[FileRecord]) -> None:
+        with self.db.transaction():
+            self.db.executemany(f"INSERT INTO {self.table_name} VALUES (?, ?, ?, ?)",
+                                [(get_printable_path(record.path), record.size, record.ctime, record.mtime)
+                                 for record in records])
+
+    def get_position(self) -> int:
+        return self.db.fetchone(f"SELECT COALESCE(MAX(rowid), 0) FROM {self.table_name}")[0]
+
+    def truncate(self, position: int) -> None:
+        with self.db.transaction():
+            self.db.execute(f"DELETE FROM {self.table_name} WHERE rowid > ?", (position,))
+
+
+class CrawlCheckpoint:
+    """
+    The checkpoint of a resumable run_crawl, kept in a small SQLite database.
+    It records the directories whose files were written by all sinks (collapsed into one row per subtree once
+    a directory and everything below it is done) and the positions of the sinks after the last written batch.
+    A resumed crawl skips the completed subtrees, lists the other done directories again only to find their
+    subdirectories, and truncates the sinks to the stored positions, so the result is the same as for an
+    uninterrupted crawl.
+
+    Parameters:
+    path (str): The path of the checkpoint database.
+    folder (str): The root folder of the crawl (a checkpoint of another folder is not resumed).
+    resume (bool): If True, the stored checkpoint is continued, otherwise it is cleared. Default is False.
+    """
+
+    def __init__(self, path: str, folder: str, resume: bool = False):
+        self.db = get_sync_database(path)
+        self.folder = os.path.normpath(folder)
+        folder = self.folder
+        with self.db.transaction():
+            self.db.execute("CREATE TABLE IF NOT EXISTS done_directory (path TEXT PRIMARY KEY, subtree INTEGER NOT NULL)")
+            self.db.execute("CREATE TABLE IF NOT EXISTS checkpoint (key TEXT PRIMARY KEY, value TEXT)")
+            stored_folder = self.db.fetchone("SELECT value FROM checkpoint WHERE key = 'folder'")
+            if not resume or stored_folder is None or json.loads(stored_folder[0]) != folder:
+                self.db.execute("DELETE FROM done_directory")
+                self.db.execute("DELETE FROM checkpoint")
+                self.db.execute("INSERT INTO checkpoint VALUES ('folder', ?)", (json.dumps(folder),))
+        rows = self.db.fetchall("SELECT path, subtree FROM done_directory")
+        self.subtrees = {path for path, subtree in rows if subtree}
+        self.directories = {path for path, subtree in rows if not subtree}
+        positions = self.db.fetchone("SELECT value FROM checkpoint WHERE key = 'positions'")
+        self.positions = json.loads(positions[0]) if positions else None
+        # directories with outstanding subdirectories: path -> number of subtrees not done yet
+        self._open: Dict[str, int] = {}
+
+    def commit(self, directories: List[Tuple[str, int]], positions: List[Any]) -> None:
+        """
+        This function records directories whose files are written, with the number of their subdirectories,
+        and the positions of the sinks. A directory without outstanding subdirectories completes its subtree,
+        which may complete the subtree of its parent, and so on.
+        """
+        with self.db.transaction():
+            for path, subdir_count in directories:
+                self._open[path] = subdir_count
+                self.db.execute("INSERT OR IGNORE INTO done_directory VALUES (?, 0)", (path,))
+                # complete the subtrees that are done now, bottom up
+                while self._open.get(path) == 0:
+                    del self._open[path]
+                    prefix = path.rstrip('/') + '/'
+                    # '0' follows '/', so the range holds exactly the paths below the directory
+                    self.db.execute("DELETE FROM done_directory WHERE path >= ? AND path < ?", (prefix, prefix[:-1] + '0'))
+                    self.db.execute("INSERT OR REPLACE INTO done_directory VALUES (?, 1)", (path,))
+                    if path == self.folder:
+                        break
+                    path = os.path.dirname(path)
+                    if path in self._open:
+                        self._open[path] -= 1
+            self.db.execute("INSERT OR REPLACE INTO checkpoint VALUES ('positions', ?)", (json.dumps(positions),))
+
+
+def run_crawl(folder: str, sinks: Union[CrawlSink, List[CrawlSink]], max_workers: int = CRAWL_WORKERS,
+              batch_size: int = 1000, queue_size: int = 8, checkpoint: Optional[str] = None, resume: bool = False,
+              rules: Optional[CrawlRules] = None, autotune: Optional[ConcurrencyController] = None,
+              verbose: int = 0) -> Dict[str, Any]:
+    """
+    This function crawls a folder (see crawl_directories) in a background thread and writes the FileRecords in
+    batches to the sinks. The batches go through a bounded queue: when the sinks fall behind, the crawler stops
+    listing new directories until there is room again, so the memory use stays bounded however large the folder is.
+    With a checkpoint, the progress is stored after every written batch (see CrawlCheckpoint) and a run with
+    resume continues an interrupted crawl. The sinks are closed at the end.
+
+    Parameters:
+    folder (str): The path of the directory to crawl.
+    sinks (Union[CrawlSink, List[CrawlSink]]): The sink or sinks the records are written to.
+    max_workers (int): The number of directories listed at the same time. Default is CRAWL_WORKERS.
+    batch_size (int): The number of records per batch (with a checkpoint, a batch is extended to the end of
+        the directory it is in). Default is 1000.
+    queue_size (int): The maximum number of batches waiting for the sinks. Default is 8.
+    checkpoint (str): The path of the checkpoint database. Default is None (no checkpoint).
+    resume (bool): If True, the crawl continues from the checkpoint. Default is False.
+    rules (CrawlRules): The include/exclude rules (see CrawlRules). Default is None.
+    autotune (ConcurrencyController): Adapts the number of listings in flight to the latency of the file system
+        (max_workers is then ignored). Default is None.
+    verbose (int): If set to 1, prints the progress after every 100 batches and the summary.
+
+    Returns:
+    Dict[str, Any]: The summary (of this run) with the keys 'files', 'bytes', 'seconds', 'files_per_second',
+    'pruned' (the entries left out per rule) and 'autotune' (see ConcurrencyController.summary, or None).
+    """
+    sinks = sinks if isinstance(sinks, list) else [sinks]
+    folder = os.path.normpath(folder)
+    state = CrawlCheckpoint(checkpoint, folder, resume) if checkpoint else None
+    skip_subtrees, skip_files = (state.subtrees, state.directories) if state else (set(), set())
+    if state and state.positions:
+        for sink, position in zip(sinks, state.positions):
+            sink.truncate(position)
+    elif state:
+        # the positions before the first batch, a crash before the first checkpoint resumes from here
+        state.commit([], [sink.get_position() for sink in sinks])
+    batches = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    errors = []
+
+    def put(batch):
+        while not stop.is_set():
+            try:
+                batches.put(batch, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        # a batch is a list of records and the directories whose last record it holds
+        records, directories = [], []
+        try:
+            # unreadable directories are reported and skipped (like os.walk), an uninterrupted crawl does the same
+            listing = crawl_directories(folder, max_workers, onerror=lambda error: print(f"{type(error).__name__}: {error}"),
+                                        skip=skip_subtrees, rules=rules, autotune=autotune)
+            for path, files, subdirs in listing:
+                for record in [] if path in skip_files else files:
+                    records.append(record)
+                    # with a checkpoint a batch ends with a directory, a resumed crawl writes whole directories again
+                    if len(records) >= batch_size and state is None:
+                        if not put((records, directories)):
+                            listing.close()
+                            return
+                        records, directories = [], []
+                directories.append((path, len(subdirs)))
+                if len(records) >= batch_size:
+                    if not put((records, directories)):
+                        listing.close()
+                        return
+                    records, directories = [], []
+            if records or directories:
+                put((records, directories))
+        except BaseException as error:
+            errors.append(error)
+        finally:
+            batches.put(None)
+
+    start_time = time.time()
+    summary = {'files': 0, 'bytes': 0}
+    producer = threading.Thread(target=produce, name="crawler", daemon=True)
+    producer.start()
+    try:
+        for number, (batch, directories) in enumerate(iter(batches.get, None), 1):
+            if batch:
+                for sink in sinks:
+                    sink.write(batch)
+            if state:
+                state.commit(directories, [sink.get_position() for sink in sinks])
+            summary['files'] += len(batch)
+            summary['bytes'] += sum(record.size for record in batch)
+            if verbose and number % 100 == 0:
+                print(f"{summary['files']} files, {summary['files'] / (time.time() - start_time):.0f} files/s"
+                      + (f", {autotune.limit} workers" if autotune is not None else ""))
+    finally:
+        stop.set()
+        # unblock the producer if it waits for room in the queue
+        while producer.is_alive():
+            try:
+                batches.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        for sink in sinks:
+            sink.close()
+    if errors:
+        raise errors[0]
+    summary['seconds'] = time.time() - start_time
+    summary['files_per_second'] = summary['files'] / summary['seconds'] if summary['seconds'] else 0.0
+    summary['pruned'] = dict(rules.counts) if rules is not None else {}
+    summary['autotune'] = autotune.summary() if autotune is not None else None
+    if verbose:
+        print(f"{summary['files']} files ({summary['bytes'] / 2**30:.2f} GiB) in {summary['seconds']:.2f} seconds, "
+              f"{summary['files_per_second']:.0f} files/s")
+        if summary['pruned']:
+            print("pruned by rule:", summary['pruned'])
+        if summary['autotune']:
+            print("autotune:", summary['autotune'])
+    return summary
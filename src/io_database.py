@@ -0,0 +1,1109 @@
+# Standard library imports
+import atexit
+import collections
+import configparser
+import contextlib
+import itertools
+import os
+import queue
+import sqlite3
+import threading
+import urllib.request
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+# Third-party library imports
+import numpy as np
+
+DATA_FOLDER = "./data"
+DEFAULT_DB_NAME = "sync_database.db"
+
+# values taken from DataFrames (e.g. iterating a nullable Int64 column) are numpy scalars, bind them as Python numbers
+sqlite3.register_adapter(np.int64, int)
+sqlite3.register_adapter(np.int32, int)
+sqlite3.register_adapter(np.float64, float)
+
+# natural keys of the tables that are written with 'INSERT ... ON CONFLICT DO UPDATE' (see db_create_sql.json)
+NATURAL_KEYS: Dict[str, Tuple[str, ...]] = {
+    'object': ('source', 'object_type', 'specific_id'),
+    # OMERO tags store the OMERO id in object_id, projects, datasets and images have separate id spaces
+    'tag': ('object_id', 'object_type', 'source', 'translated_tag_name'),
+    'link': ('src_id', 'src_table', 'tar_id', 'tar_source'),
+    'fs_file': ('object_id', 'dir_id', 'name'),
+    'crawl_state': ('dir_id',),
+}
+# columns that refer to the rows of a table with a natural key (table, column, condition); they are pointed at the
+# kept row when ensure_natural_keys removes duplicates
+NATURAL_KEY_REFERENCES: Dict[str, List[Tuple[str, str, Optional[str]]]] = {
+    'object': [('tag', 'object_id', None),
+               ('fs_storage', 'object_id', None),
+               ('fs_file', 'object_id', None),
+               ('link', 'src_id', "src_table = 'object'"),
+               ('link', 'tar_id', "tar_table = 'object'")],
+}
+# primary key column of every table, returned by the inserts that need the id of the new row
+PRIMARY_KEYS: Dict[str, str] = {
+    'project_registration': 'project_id',
+    'project_schedule': 'schedule_id',
+    'object': 'object_id',
+    'tag': 'tag_id',
+    'fs_storage': 'fs_id',
+    'fs_file': 'fs_id',
+    'directory': 'dir_id',
+    'crawl_state': 'dir_id',
+    'link': 'link_id',
+}
+# columns that keep the value of the first insert when a row is updated on its natural key
+PRESERVED_COLUMNS = ('created_timestamp', 'manual_validated')
+
+
+def get_database_path(db_name: str = DEFAULT_DB_NAME) -> str:
+    """
+    This function resolves a database name to the path of the SQLite file.
+    A bare file name (e.g. 'sync_database.db') is looked up in the ./data folder,
+    a name that already contains a folder (e.g. './data/sync_database.db') is used as is.
+
+    Parameters:
+    db_name (str): The name or path of the SQLite database. Default is 'sync_database.db'.
+
+    Returns:
+    str: The path to the SQLite database file.
+    """
+    if os.path.dirname(db_name):
+        return db_name
+    return os.path.join(DATA_FOLDER, db_name)
+
+
+def get_upsert_clause(table_name: str, columns: Sequence[str]) -> str:
+    """
+    This function builds the 'ON CONFLICT ... DO UPDATE' clause for an INSERT into a table with a natural key.
+    A row that already exists with the same natural key is updated instead of being written a second time.
+    The created_timestamp and manual_validated columns keep the values of the existing row.
+
+    Parameters:
+    table_name (str): The name of the table.
+    columns (Sequence[str]): The columns of the INSERT statement.
+
+    Returns:
+    str: The clause (with a leading space), or an empty string if the table has no natural key or the columns do not cover it.
+    """
+    key = NATURAL_KEYS.get(table_name)
+    if key is None or not set(key).issubset(columns):
+        return ""
+    updates = [f"{column} = excluded.{column}" for column in columns
+               if column not in key and column not in PRESERVED_COLUMNS]
+    if not updates:
+        return f" ON CONFLICT({', '.join(key)}) DO NOTHING"
+    return f" ON CONFLICT({', '.join(key)}) DO UPDATE SET {', '.join(updates)}"
+
+
+def get_database_settings(source: str = "init.ini") -> Dict[str, Any]:
+    """
+    This function reads the tuning parameters of the sync database from the configuration file.
+    Missing sections or keys fall back to the SyncDatabase defaults.
+
+    Parameters:
+    source (str): The path to the configuration file. Default is 'init.ini'.
+
+    Returns:
+    Dict[str, Any]: A dictionary with the keys 'synchronous', 'cache_size' and 'mmap_size' (only those that are set).
+    """
+    config = configparser.ConfigParser()
+    config.read(source)
+    if not config.has_section('sync database'):
+        return {}
+    section = config['sync database']
+    settings = {}
+    if 'synchronous' in section:
+        settings['synchronous'] = section['synchronous'].strip('"')
+    for key in ['cache_size', 'mmap_size']:
+        if key in section:
+            settings[key] = section.getint(key)
+    return settings
+
+
+class IdMap:
+    """
+    This class is a bounded in-process map from a natural key to a row id (least recently used entries are dropped).
+    The SyncDatabase session keeps one for the object table, keyed by ('specific_id', source, specific_id)
+    and ('object_name', source, object_name), so child rows can be attached to their object without a query.
+    Ids written inside a transaction are stored right away; the session clears its maps when a transaction
+    is rolled back.
+
+    Parameters:
+    maxsize (int): The maximum number of entries. Default is 65536.
+    """
+
+    def __init__(self, maxsize: int = 65536):
+        self.maxsize = maxsize
+        self._ids = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple) -> Optional[int]:
+        """
+        This function returns the id stored for a key, or None if it is not in the map.
+        """
+        with self._lock:
+            if key not in self._ids:
+                return None
+            self._ids.move_to_end(key)
+            return self._ids[key]
+
+    def put(self, key: Tuple, row_id: Optional[int]) -> None:
+        """
+        This function stores the id of a key (None is ignored).
+        """
+        if row_id is None:
+            return
+        with self._lock:
+            self._ids[key] = row_id
+            self._ids.move_to_end(key)
+            while len(self._ids) > self.maxsize:
+                self._ids.popitem(last=False)
+
+    def clear(self) -> None:
+        """
+        This function removes all entries, e.g. after rows were deleted.
+        """
+        with self._lock:
+            self._ids.clear()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+
+class SyncDatabase:
+    """
+    This class holds one long-lived writer connection to the sync database that all ingest paths share,
+    and a pool of read-only connections.
+
+    The connections run in WAL mode with tunable 'synchronous', 'cache_size' and 'mmap_size' pragmas
+    and keep a cache of prepared statements (sqlite3 caches them by their SQL text, so queries have to
+    use '?' placeholders instead of formatted values to hit the cache).
+    Statements executed outside of a transaction are committed immediately; wrap a batch of statements
+    in 'with db.transaction():' to commit them together on an explicit boundary.
+    Queries (fetchone, fetchall, reader) run on a pooled read-only connection, so they neither wait for nor block
+    the writer; inside a write transaction of the same thread they run on the writer to see its uncommitted rows.
+    Wrap a sequence of queries in 'with db.reader():' to read them all from one consistent snapshot.
+
+    Parameters:
+    db_path (str): The path to the SQLite database file.
+    synchronous (str): The 'PRAGMA synchronous' level. Default is 'NORMAL' (safe in WAL mode).
+    cache_size (int): The 'PRAGMA cache_size'; negative values are KiB. Default is -65536 (64 MiB).
+    mmap_size (int): The 'PRAGMA mmap_size' in bytes. Default is 268435456 (256 MiB).
+    cached_statements (int): The number of prepared statements to keep per connection. Default is 512.
+    id_map_size (int): The number of object ids kept in the object_ids map. Default is 65536.
+    read_pool_size (int): The number of idle read-only connections kept open. Default is 4.
+    """
+
+    def __init__(self, db_path: str, synchronous: str = "NORMAL", cache_size: int = -65536,
+                 mmap_size: int = 268435456, cached_statements: int = 512, id_map_size: int = 65536,
+                 read_pool_size: int = 4):
+        self.db_path = db_path
+        self.synchronous = synchronous
+        self.cache_size = cache_size
+        self.mmap_size = mmap_size
+        self.cached_statements = cached_statements
+        self._conn = None
+        self._lock = threading.RLock()
+        # thread that opened the current write transaction (its queries have to see the uncommitted rows)
+        self._transaction_thread = None
+        self._readers = queue.LifoQueue(maxsize=read_pool_size)
+        self._local = threading.local()
+        self._schema_version = None
+        self.object_ids = IdMap(id_map_size)
+        self.directory_ids = IdMap(id_map_size)
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """
+        The open sqlite3 connection; it is created and configured on first use.
+        """
+        if self._conn is None:
+            folder = os.path.dirname(self.db_path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            # isolation_level=None: no implicit BEGIN, transactions are opened by transaction() only
+            conn = sqlite3.connect(self.db_path,
+                                   isolation_level=None,
+                                   check_same_thread=False,
+                                   cached_statements=self.cached_statements)
+            # only takes effect on a new database (before the first table); see run_maintenance for existing ones
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA synchronous={self.synchronous}")
+            conn.execute(f"PRAGMA cache_size={int(self.cache_size)}")
+            conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+            conn.execute("PRAGMA temp_store=MEMORY")
+            self._conn = conn
+        return self._conn
+
+    def _connect_reader(self) -> sqlite3.Connection:
+        """
+        This function opens a new read-only connection (the writer connection is opened first,
+        so the database file exists and is in WAL mode).
+        """
+        if self._conn is None:
+            with self._lock:
+                self.connection
+        uri = f"file:{urllib.request.pathname2url(self.db_path)}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True,
+                               isolation_level=None,
+                               check_same_thread=False,
+                               cached_statements=self.cached_statements)
+        conn.execute(f"PRAGMA cache_size={int(self.cache_size)}")
+        conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    @contextlib.contextmanager
+    def reader(self) -> Iterator[sqlite3.Connection]:
+        """
+        This function yields a connection for queries. Outside of a write transaction of the calling thread it is a
+        pooled read-only connection with an open read transaction, so all queries of the block see the same
+        consistent snapshot while other threads or processes keep writing. Nested calls of the same thread
+        share the snapshot of the outermost block.
+
+        Yields:
+        sqlite3.Connection: The connection to run the queries on.
+        """
+        if self._transaction_thread == threading.get_ident():
+            with self._lock:
+                yield self.connection
+            return
+        conn = getattr(self._local, 'reader', None)
+        if conn is not None:
+            yield conn
+            return
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            conn = self._connect_reader()
+        self._local.reader = conn
+        conn.execute("BEGIN")
+        try:
+            yield conn
+        finally:
+            self._local.reader = None
+            if conn.in_transaction:
+                conn.execute("COMMIT")
+            try:
+                self._readers.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    def execute(self, sql: str, values: Sequence[Any] = ()) -> sqlite3.Cursor:
+        """
+        This function executes a single SQL statement on the shared connection.
+
+        Parameters:
+        sql (str): The SQL statement, using '?' placeholders.
+        values (Sequence[Any]): The values for the placeholders.
+
+        Returns:
+        sqlite3.Cursor: The cursor of the executed statement.
+        """
+        with self._lock:
+            return self.connection.execute(sql, values)
+
+    def executemany(self, sql: str, rows) -> sqlite3.Cursor:
+        """
+        This function executes a SQL statement once for every row of values.
+
+        Parameters:
+        sql (str): The SQL statement, using '?' placeholders.
+        rows (Iterable[Sequence[Any]]): The rows of values.
+
+        Returns:
+        sqlite3.Cursor: The cursor of the executed statement.
+        """
+        with self._lock:
+            return self.connection.executemany(sql, rows)
+
+    def fetchone(self, sql: str, values: Sequence[Any] = ()) -> Optional[Tuple]:
+        """
+        This function executes a query (see reader) and returns its first row, or None if there is no row.
+        """
+        with self.reader() as conn:
+            return conn.execute(sql, values).fetchone()
+
+    def fetchall(self, sql: str, values: Sequence[Any] = ()) -> list:
+        """
+        This function executes a query (see reader) and returns all rows as a list of tuples.
+        """
+        with self.reader() as conn:
+            return conn.execute(sql, values).fetchall()
+
+    @property
+    def in_transaction(self) -> bool:
+        """
+        True if a transaction is currently open on the connection.
+        """
+        return self._conn is not None and self._conn.in_transaction
+
+    @contextlib.contextmanager
+    def transaction(self) -> Iterator["SyncDatabase"]:
+        """
+        This function opens a transaction that is committed when the block ends and rolled back on an exception.
+        Nested calls join the already open transaction, so only the outermost block commits.
+        A rollback clears the object_ids and directory_ids maps, as they may hold ids of the rolled back rows.
+
+        Yields:
+        SyncDatabase: The session itself.
+        """
+        with self._lock:
+            if self.in_transaction:
+                yield self
+                return
+            self.connection.execute("BEGIN")
+            self._transaction_thread = threading.get_ident()
+            try:
+                yield self
+            except BaseException:
+                if self.in_transaction:
+                    self.connection.execute("ROLLBACK")
+                self.object_ids.clear()
+                self.directory_ids.clear()
+                raise
+            finally:
+                self._transaction_thread = None
+            if self.in_transaction:
+                self.connection.execute("COMMIT")
+
+    def insert_many(self, table_name: str, rows: Iterable[Dict[str, Any]], chunk_size: int = 5000,
+                    verbose: int = 0) -> List[Dict[str, int]]:
+        """
+        This function streams an iterable of row dictionaries into a table with executemany.
+        The rows are consumed lazily in chunks of chunk_size; every chunk is written in a single transaction
+        (or joins the caller's transaction if one is open). Rows that already exist with the same natural key
+        (see NATURAL_KEYS) are updated; rows that violate another constraint are skipped the same way
+        insert_dict_to_database skips them on an IntegrityError, and are counted per chunk.
+
+        Parameters:
+        table_name (str): The name of the table to insert the rows into.
+        rows (Iterable[Dict[str, Any]]): The rows; the keys are used as column names.
+        chunk_size (int): The number of rows per chunk. Default is 5000.
+        verbose (int): If set to 1, prints the counts of every chunk.
+
+        Returns:
+        List[Dict[str, int]]: One entry per chunk with the keys 'chunk', 'rows', 'inserted' and 'integrity_errors'.
+        'inserted' counts the rows written by the statement, so rows updated on their natural key count as inserted;
+        'integrity_errors' counts the other rows (skipped on a constraint violation, or left alone by a 'DO NOTHING'
+        upsert of a table whose key covers all the given columns).
+        """
+        report = []
+        rows = iter(rows)
+        for chunk_number in itertools.count():
+            chunk = list(itertools.islice(rows, chunk_size))
+            if not chunk:
+                break
+            # rows of one chunk may carry different columns (e.g. tags with and without object_type)
+            groups = {}
+            for row in chunk:
+                groups.setdefault(tuple(row.keys()), []).append(tuple(row.values()))
+            inserted = 0
+            with self.transaction():
+                for columns, values in groups.items():
+                    sql = self._insert_sql(table_name, columns)
+                    # rowcount counts the rows of the statement only, not the rows written by triggers
+                    # (total_changes would also count the project_rollup updates of every fs_file row)
+                    inserted += self.executemany(sql, values).rowcount
+            counts = {'chunk': chunk_number,
+                      'rows': len(chunk),
+                      'inserted': inserted,
+                      'integrity_errors': len(chunk) - inserted}
+            if verbose:
+                print(f"{table_name}: {counts}")
+            report.append(counts)
+        return report
+
+    def insert_returning_id(self, table_name: str, row: Dict[str, Any]) -> Optional[int]:
+        """
+        This function inserts (or, on its natural key, updates) a single row and returns the id of the row.
+        The id comes from 'RETURNING', so it is also returned when an existing row was updated.
+        Rows of the object table are added to the object_ids map.
+
+        Parameters:
+        table_name (str): The name of the table to insert the row into.
+        row (Dict[str, Any]): The row; the keys are used as column names.
+
+        Returns:
+        Optional[int]: The id of the row, or None if an IntegrityError is raised (or the row was left unchanged).
+        """
+        columns = list(row.keys())
+        placeholders = ', '.join(['?' for _ in columns])
+        sql = (f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({placeholders})"
+               + get_upsert_clause(table_name, columns)
+               + f" RETURNING {PRIMARY_KEYS[table_name]}")
+        try:
+            with self._lock:
+                result = self.connection.execute(sql, tuple(row.values())).fetchone()
+        except sqlite3.IntegrityError:
+            return None
+        row_id = result[0] if result is not None else None
+        if table_name == 'object':
+            self.remember_object_id(row, row_id)
+        return row_id
+
+    def remember_object_id(self, row: Dict[str, Any], object_id: Optional[int]) -> None:
+        """
+        This function stores the object_id of an object row in the object_ids map.
+        """
+        if 'specific_id' in row:
+            self.object_ids.put(('specific_id', row.get('source'), row['specific_id']), object_id)
+        if 'object_name' in row:
+            self.object_ids.put(('object_name', row.get('source'), row['object_name']), object_id)
+
+    def load_object_ids(self, source: str, specific_ids: Iterable[Any], chunk_size: int = 500) -> None:
+        """
+        This function loads the object_ids of many objects of a source into the object_ids map
+        with one query per chunk (e.g. after the objects were written with insert_many).
+
+        Parameters:
+        source (str): The source of the objects.
+        specific_ids (Iterable[Any]): The specific ids of the objects.
+        chunk_size (int): The number of ids per query. Default is 500.
+        """
+        specific_ids = iter(specific_ids)
+        while True:
+            chunk = list(itertools.islice(specific_ids, chunk_size))
+            if not chunk:
+                break
+            placeholders = ', '.join(['?' for _ in chunk])
+            rows = self.fetchall(f"SELECT specific_id, object_id FROM object WHERE source = ? "
+                                 f"AND specific_id IN ({placeholders})", (source, *chunk))
+            for specific_id, object_id in rows:
+                self.object_ids.put(('specific_id', source, specific_id), object_id)
+
+    def get_directory_id(self, path: str) -> int:
+        """
+        This function returns the dir_id of a folder in the directory table and adds the folder
+        (and its missing parent folders) if it is not stored yet. The ids are kept in the directory_ids map.
+
+        Parameters:
+        path (str): The path of the folder.
+
+        Returns:
+        int: The dir_id of the folder.
+        """
+        dir_id = self.directory_ids.get((path,))
+        if dir_id is not None:
+            return dir_id
+        result = self.fetchone("SELECT dir_id FROM directory WHERE path = ?", (path,))
+        if result is None:
+            parent = os.path.dirname(path)
+            parent_id = self.get_directory_id(parent) if parent and parent != path else None
+            with self._lock:
+                result = self.connection.execute(
+                    "INSERT INTO directory (parent_id, name, path) VALUES (?, ?, ?) "
+                    "ON CONFLICT(path) DO UPDATE SET name = excluded.name RETURNING dir_id",
+                    (parent_id, os.path.basename(path), path)).fetchone()
+        self.directory_ids.put((path,), result[0])
+        return result[0]
+
+    @staticmethod
+    def _insert_sql(table_name: str, columns: Sequence[str]) -> str:
+        """
+        This function builds the INSERT statement used by insert_many for a set of columns.
+        OR IGNORE turns constraint violations into skipped rows instead of aborting the whole executemany,
+        conflicts on the natural key of the table are resolved by the upsert clause.
+        """
+        placeholders = ', '.join(['?' for _ in columns])
+        return (f"INSERT OR IGNORE INTO {table_name} ({', '.join(columns)}) VALUES ({placeholders})"
+                + get_upsert_clause(table_name, columns))
+
+    def get_schema_version(self) -> int:
+        """
+        This function returns the version of the last migration applied to the database (0 for a new database).
+        """
+        self.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                description TEXT,
+                applied_timestamp DATETIME
+            )""")
+        # read on the writer, a snapshot of the calling thread may predate the schema_version table
+        with self._lock:
+            return self.connection.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+
+    def migrate(self, create_table_sql: Optional[Dict[str, str]] = None) -> int:
+        """
+        This function upgrades the database in place by applying the pending MIGRATIONS in order.
+        Every migration runs in its own transaction together with its row in the schema_version table,
+        so an interrupted upgrade continues with the failed migration on the next run.
+        The check is done once per session; later calls return the cached version.
+
+        Parameters:
+        create_table_sql (Dict[str, str]): The CREATE TABLE statements (see db_create_sql.json). They are executed
+            before the migrations are applied, so every migration can rely on all tables to exist.
+
+        Returns:
+        int: The schema version of the database after the upgrade.
+        """
+        with self._lock:
+            if self._schema_version is not None:
+                return self._schema_version
+            version = self.get_schema_version()
+            pending = [migration for migration in MIGRATIONS if migration[0] > version]
+            if pending and create_table_sql:
+                with self.transaction():
+                    for sql in create_table_sql.values():
+                        self.execute(sql)
+            for number, description, upgrade in pending:
+                with self.transaction():
+                    upgrade(self)
+                    self.execute("INSERT INTO schema_version (version, description, applied_timestamp) "
+                                 "VALUES (?, ?, datetime('now'))", (number, description))
+                version = number
+            self._schema_version = version
+            return version
+
+    def ensure_natural_keys(self) -> None:
+        """
+        This function adds the natural unique keys (NATURAL_KEYS) to the tables of a database that was created
+        before the keys were part of db_create_sql.json. Duplicates that are already stored are removed once
+        (the first row is kept, the one the lookups by name returned and the child rows were attached to), then a
+        unique index is created. Tables that already have the key are skipped.
+        The rows that refer to a removed duplicate (NATURAL_KEY_REFERENCES) are pointed at the kept row first;
+        a referring row that would then duplicate another one is removed as well.
+        """
+        self.object_ids.clear()
+        with self.transaction():
+            for table_name, key in NATURAL_KEYS.items():
+                if self.fetchone("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (table_name,)) is None:
+                    continue
+                if self._has_unique_index(table_name, key):
+                    continue
+                self.execute("DROP TABLE IF EXISTS temp.natural_key_duplicates")
+                self.execute(f"""
+                    CREATE TEMP TABLE natural_key_duplicates AS
+                    SELECT rowid AS duplicate_id, MIN(rowid) OVER (PARTITION BY {', '.join(key)}) AS kept_id
+                    FROM {table_name}""")
+                self.execute("DELETE FROM temp.natural_key_duplicates WHERE duplicate_id = kept_id")
+                for child_table, column, condition in NATURAL_KEY_REFERENCES.get(table_name, []):
+                    if _get_object_type(self, child_table) != 'table':
+                        continue
+                    where = (f"{column} IN (SELECT duplicate_id FROM temp.natural_key_duplicates)"
+                             + (f" AND {condition}" if condition else ""))
+                    self.execute(f"""
+                        UPDATE OR IGNORE {child_table}
+                        SET {column} = (SELECT kept_id FROM temp.natural_key_duplicates
+                                        WHERE duplicate_id = {child_table}.{column})
+                        WHERE {where}""")
+                    # left over: rows that already exist for the kept row (ignored by a unique constraint)
+                    self.execute(f"DELETE FROM {child_table} WHERE {where}")
+                self.execute(f"DELETE FROM {table_name} WHERE rowid IN (SELECT duplicate_id FROM temp.natural_key_duplicates)")
+                self.execute("DROP TABLE temp.natural_key_duplicates")
+                self.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS ux_{table_name}_natural_key "
+                             f"ON {table_name} ({', '.join(key)})")
+
+    def _has_unique_index(self, table_name: str, columns: Sequence[str]) -> bool:
+        """
+        This function checks if a table has a unique index over exactly the given columns
+        (an INTEGER PRIMARY KEY is the rowid and has no index of its own).
+        """
+        # table_info rows: (cid, name, type, notnull, dflt_value, pk)
+        primary_key = [row[1] for row in self.fetchall(f"PRAGMA table_info({table_name})") if row[5]]
+        if set(primary_key) == set(columns):
+            return True
+        for index in self.fetchall(f"PRAGMA index_list({table_name})"):
+            # index_list rows: (seq, name, unique, origin, partial)
+            if not index[2]:
+                continue
+            index_columns = [row[2] for row in self.fetchall(f"PRAGMA index_info({index[1]})")]
+            if set(index_columns) == set(columns):
+                return True
+        return False
+
+    def commit(self) -> None:
+        """
+        This function commits the currently open transaction (if any).
+        """
+        with self._lock:
+            if self.in_transaction:
+                self.connection.execute("COMMIT")
+
+    def close(self) -> None:
+        """
+        This function commits pending changes and closes the connections.
+        The session can be used again afterwards, it reconnects on the next statement.
+        """
+        with self._lock:
+            while not self._readers.empty():
+                self._readers.get_nowait().close()
+            if self._conn is not None:
+                self.commit()
+                self._conn.close()
+                self._conn = None
+                self._schema_version = None
+
+
+def _migration_index_plan(db: SyncDatabase) -> None:
+    """
+    Migration 1: secondary indexes for the lookups of the ingest and link code.
+    tag(object_id, source) is covered by the natural key of the tag table (migration 2).
+    """
+    db.execute("CREATE INDEX IF NOT EXISTS ix_object_source_name ON object (source, object_name)")
+    db.execute("CREATE INDEX IF NOT EXISTS ix_object_specific_id ON object (specific_id)")
+    if _get_object_type(db, 'fs_storage') == 'table':
+        # databases created with the compact layout (migration 3) have a view instead
+        db.execute("CREATE INDEX IF NOT EXISTS ix_fs_storage_object_id ON fs_storage (object_id)")
+    db.execute("CREATE INDEX IF NOT EXISTS ix_link_target ON link (tar_source, tar_id)")
+
+
+def _migration_natural_keys(db: SyncDatabase) -> None:
+    """
+    Migration 2: unique natural keys for databases created before they were part of db_create_sql.json.
+    """
+    db.ensure_natural_keys()
+
+
+# tables of the compact fs_storage layout (see db_create_sql.json)
+FS_STORAGE_TABLES_SQL = [
+    """CREATE TABLE IF NOT EXISTS directory (
+    dir_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    parent_id INTEGER,
+    name TEXT NOT NULL,
+    path TEXT NOT NULL UNIQUE
+)""",
+    """CREATE TABLE IF NOT EXISTS fs_file (
+    fs_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    object_id INTEGER NOT NULL,
+    dir_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    object_type TEXT NOT NULL,
+    object_size INTEGER NOT NULL,
+    created_epoch INTEGER,
+    modified_epoch INTEGER,
+    source TEXT,
+    UNIQUE(object_id, dir_id, name)
+)""",
+]
+# compatibility view with the column shape of the former fs_storage table (see db_create_sql.json)
+FS_STORAGE_VIEW_SQL = """CREATE VIEW IF NOT EXISTS fs_storage AS
+    SELECT f.fs_id,
+           f.object_id,
+           rtrim(d.path, '/') || '/' || f.name AS object_name,
+           f.object_type,
+           CAST(f.object_size AS TEXT) AS object_size,
+           datetime(f.created_epoch, 'unixepoch', 'localtime') AS created_timestamp,
+           datetime(f.modified_epoch, 'unixepoch', 'localtime') AS modified_timestamp,
+           f.source
+    FROM fs_file f
+    JOIN directory d ON d.dir_id = f.dir_id"""
+
+
+def _get_object_type(db: SyncDatabase, name: str) -> Optional[str]:
+    """
+    This function returns the type ('table', 'view', ...) of a schema object, or None if it does not exist.
+    """
+    result = db.fetchone("SELECT type FROM sqlite_master WHERE name = ?", (name,))
+    return result[0] if result is not None else None
+
+
+def _migration_compact_fs_storage(db: SyncDatabase, chunk_size: int = 5000) -> None:
+    """
+    Migration 3: moves the rows of the fs_storage table into the compact directory/fs_file layout
+    (folder paths stored once, INTEGER sizes and epoch timestamps) and replaces the table by the fs_storage view.
+    The formatted timestamps were written in local time, so they are converted back with the 'utc' modifier.
+    """
+    if _get_object_type(db, 'fs_storage') != 'table':
+        return
+    for sql in FS_STORAGE_TABLES_SQL:
+        db.execute(sql)
+    cursor = db.connection.execute("""
+        SELECT object_id, object_name, object_type, CAST(object_size AS INTEGER),
+               CAST(strftime('%s', created_timestamp, 'utc') AS INTEGER),
+               CAST(strftime('%s', modified_timestamp, 'utc') AS INTEGER),
+               source
+        FROM fs_storage
+        ORDER BY fs_id""")
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        # resolve the folders before the next executemany, the cursor on fs_storage stays open
+        file_rows = [(object_id, db.get_directory_id(os.path.dirname(object_name)), os.path.basename(object_name),
+                      object_type, object_size, created_epoch, modified_epoch, source)
+                     for object_id, object_name, object_type, object_size, created_epoch, modified_epoch, source in rows]
+        db.executemany("""
+            INSERT INTO fs_file (object_id, dir_id, name, object_type, object_size, created_epoch, modified_epoch, source)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(object_id, dir_id, name) DO UPDATE SET
+                object_type = excluded.object_type,
+                object_size = excluded.object_size,
+                created_epoch = excluded.created_epoch,
+                modified_epoch = excluded.modified_epoch,
+                source = excluded.source""", file_rows)
+    db.execute("DROP TABLE fs_storage")
+    db.execute(FS_STORAGE_VIEW_SQL)
+
+
+CRAWL_STATE_TABLE_SQL = """CREATE TABLE IF NOT EXISTS crawl_state (
+    dir_id INTEGER PRIMARY KEY,
+    inode INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    child_count INTEGER NOT NULL,
+    crawled_epoch INTEGER
+)"""
+
+
+def _migration_crawl_state(db: SyncDatabase) -> None:
+    """
+    Migration 4: the crawl_state table of the incremental crawl (see src.io_crawler.IncrementalCrawl)
+    and an index for the lookup of the stored files of a folder.
+    """
+    db.execute(CRAWL_STATE_TABLE_SQL)
+    db.execute("CREATE INDEX IF NOT EXISTS ix_fs_file_dir_id ON fs_file (dir_id, name)")
+
+
+def _migration_fingerprints(db: SyncDatabase) -> None:
+    """
+    Migration 5: the content fingerprint of the files (see src.io_crawler.get_fingerprint), indexed for the
+    detection of moved and renamed files.
+    """
+    # table_info rows: (cid, name, type, notnull, dflt_value, pk)
+    if 'fingerprint' not in [row[1] for row in db.fetchall("PRAGMA table_info(fs_file)")]:
+        db.execute("ALTER TABLE fs_file ADD COLUMN fingerprint TEXT")
+    db.execute("CREATE INDEX IF NOT EXISTS ix_fs_file_fingerprint ON fs_file (fingerprint, object_size) "
+               "WHERE fingerprint IS NOT NULL")
+
+
+# per-project rollups of the fs_file table (see db_create_sql.json), kept up to date by the triggers below
+PROJECT_ROLLUP_TABLES_SQL = [
+    """CREATE TABLE IF NOT EXISTS project_rollup (
+    object_id INTEGER PRIMARY KEY,
+    file_count INTEGER NOT NULL,
+    total_bytes INTEGER NOT NULL,
+    min_created_epoch INTEGER,
+    max_modified_epoch INTEGER,
+    stale INTEGER NOT NULL DEFAULT 0
+)""",
+    """CREATE TABLE IF NOT EXISTS project_type_rollup (
+    object_id INTEGER NOT NULL,
+    object_type TEXT NOT NULL,
+    file_count INTEGER NOT NULL,
+    total_bytes INTEGER NOT NULL,
+    PRIMARY KEY (object_id, object_type)
+) WITHOUT ROWID""",
+]
+
+# the latest timestamp of a file (created or modified, either may be NULL after the fs_storage migration)
+_LATEST_EPOCH_SQL = "max(COALESCE({0}.created_epoch, {0}.modified_epoch), COALESCE({0}.modified_epoch, {0}.created_epoch))"
+
+# statements that add a file (NEW) to the rollups of its project
+_ROLLUP_ADD_SQL = f"""
+    INSERT INTO project_rollup (object_id, file_count, total_bytes, min_created_epoch, max_modified_epoch)
+    VALUES (NEW.object_id, 1, NEW.object_size, NEW.created_epoch, {_LATEST_EPOCH_SQL.format('NEW')})
+    ON CONFLICT(object_id) DO UPDATE SET
+        file_count = file_count + 1,
+        total_bytes = total_bytes + excluded.total_bytes,
+        min_created_epoch = min(COALESCE(min_created_epoch, excluded.min_created_epoch),
+                                COALESCE(excluded.min_created_epoch, min_created_epoch)),
+        max_modified_epoch = max(COALESCE(max_modified_epoch, excluded.max_modified_epoch),
+                                 COALESCE(excluded.max_modified_epoch, max_modified_epoch));
+    INSERT INTO project_type_rollup (object_id, object_type, file_count, total_bytes)
+    VALUES (NEW.object_id, NEW.object_type, 1, NEW.object_size)
+    ON CONFLICT(object_id, object_type) DO UPDATE SET
+        file_count = file_count + 1,
+        total_bytes = total_bytes + excluded.total_bytes;"""
+
+# statements that remove a file (OLD) from the rollups of its project; the time span can not be shrunk by a delta,
+# so removing a file on its border only marks the rollup as stale (see refresh_project_rollups); a NULL epoch (of the
+# file or of a rollup without timestamps) is not on the border, the comparisons are NULL then and stale is NOT NULL
+_ROLLUP_REMOVE_SQL = f"""
+    UPDATE project_rollup SET
+        file_count = file_count - 1,
+        total_bytes = total_bytes - OLD.object_size,
+        stale = stale OR COALESCE(OLD.created_epoch <= min_created_epoch, 0)
+            OR COALESCE({_LATEST_EPOCH_SQL.format('OLD')} >= max_modified_epoch, 0)
+    WHERE object_id = OLD.object_id;
+    UPDATE project_type_rollup SET
+        file_count = file_count - 1,
+        total_bytes = total_bytes - OLD.object_size
+    WHERE object_id = OLD.object_id AND object_type = OLD.object_type;
+    DELETE FROM project_type_rollup
+    WHERE object_id = OLD.object_id AND object_type = OLD.object_type AND file_count <= 0;"""
+
+PROJECT_ROLLUP_TRIGGERS_SQL = [
+    f"""CREATE TRIGGER IF NOT EXISTS tr_fs_file_rollup_insert AFTER INSERT ON fs_file
+BEGIN{_ROLLUP_ADD_SQL}
+END""",
+    f"""CREATE TRIGGER IF NOT EXISTS tr_fs_file_rollup_delete AFTER DELETE ON fs_file
+BEGIN{_ROLLUP_REMOVE_SQL}
+END""",
+    # an upsert of an unchanged file (or a new fingerprint) leaves the rollups alone
+    f"""CREATE TRIGGER IF NOT EXISTS tr_fs_file_rollup_update
+AFTER UPDATE OF object_id, object_type, object_size, created_epoch, modified_epoch ON fs_file
+WHEN OLD.object_id IS NOT NEW.object_id OR OLD.object_type IS NOT NEW.object_type
+    OR OLD.object_size IS NOT NEW.object_size OR OLD.created_epoch IS NOT NEW.created_epoch
+    OR OLD.modified_epoch IS NOT NEW.modified_epoch
+BEGIN{_ROLLUP_REMOVE_SQL}{_ROLLUP_ADD_SQL}
+END""",
+]
+
+
+def _migration_project_rollups(db: SyncDatabase) -> None:
+    """
+    Migration 6: the per-project rollups of the fs_file table (file count, bytes, time span and a histogram of the
+    file types), maintained by triggers on every insert, update and delete of a file. The rollups are rebuilt once
+    from the stored files.
+    """
+    for sql in PROJECT_ROLLUP_TABLES_SQL + PROJECT_ROLLUP_TRIGGERS_SQL:
+        db.execute(sql)
+    db.execute("DELETE FROM project_rollup")
+    db.execute("DELETE FROM project_type_rollup")
+    db.execute(f"""
+        INSERT INTO project_rollup (object_id, file_count, total_bytes, min_created_epoch, max_modified_epoch)
+        SELECT object_id, count(*), sum(object_size), min(created_epoch), max({_LATEST_EPOCH_SQL.format('fs_file')})
+        FROM fs_file
+        GROUP BY object_id""")
+    db.execute("""
+        INSERT INTO project_type_rollup (object_id, object_type, file_count, total_bytes)
+        SELECT object_id, object_type, count(*), sum(object_size)
+        FROM fs_file
+        GROUP BY object_id, object_type""")
+    refresh_project_rollups(db)
+
+
+def refresh_project_rollups(db: Union[SyncDatabase, str] = DEFAULT_DB_NAME) -> int:
+    """
+    This function finishes the rollups after an ingest: the time span of the projects that lost a file on its border
+    is computed again (from the files of the project only), the rollups of empty projects are removed and
+    the created/modified timestamps of the project rows in the object table are set from the rollups.
+
+    Parameters:
+    db (Union[SyncDatabase, str]): The database session or the name of the SQLite database. Default is 'sync_database.db'.
+
+    Returns:
+    int: The number of project rows of the object table that were updated.
+    """
+    if isinstance(db, str):
+        db = get_sync_database(db)
+    with db.transaction():
+        db.execute(f"""
+            UPDATE project_rollup SET
+                min_created_epoch = (SELECT min(created_epoch) FROM fs_file WHERE fs_file.object_id = project_rollup.object_id),
+                max_modified_epoch = (SELECT max({_LATEST_EPOCH_SQL.format('fs_file')}) FROM fs_file
+                                      WHERE fs_file.object_id = project_rollup.object_id),
+                stale = 0
+            WHERE stale""")
+        db.execute("DELETE FROM project_rollup WHERE file_count <= 0")
+        cursor = db.execute("""
+            UPDATE object SET
+                created_timestamp = COALESCE((SELECT datetime(min_created_epoch, 'unixepoch', 'localtime')
+                                              FROM project_rollup r WHERE r.object_id = object.object_id), ''),
+                modified_timestamp = COALESCE((SELECT datetime(max_modified_epoch, 'unixepoch', 'localtime')
+                                               FROM project_rollup r WHERE r.object_id = object.object_id), '')
+            WHERE object_id IN (SELECT object_id FROM project_rollup)
+              AND (created_timestamp IS NOT (SELECT datetime(min_created_epoch, 'unixepoch', 'localtime')
+                                             FROM project_rollup r WHERE r.object_id = object.object_id)
+                   OR modified_timestamp IS NOT (SELECT datetime(max_modified_epoch, 'unixepoch', 'localtime')
+                                                 FROM project_rollup r WHERE r.object_id = object.object_id))""")
+        return cursor.rowcount
+
+
+# the tag table with the natural key that includes object_type (see db_create_sql.json)
+TAG_TABLE_SQL = """CREATE TABLE IF NOT EXISTS {name} (
+    tag_id INTEGER NOT NULL UNIQUE,
+    object_id INTEGER,
+    object_type TEXT,
+    tag_name TEXT NOT NULL,
+    translated_tag_name TEXT,
+    created_timestamp DATETIME,
+    modified_timestamp DATETIME,
+    used INTEGER,
+    description TEXT,
+    source TEXT NOT NULL,
+    PRIMARY KEY(tag_id AUTOINCREMENT),
+    UNIQUE(object_id, object_type, source, translated_tag_name)
+)"""
+TAG_COLUMNS = ('tag_id', 'object_id', 'object_type', 'tag_name', 'translated_tag_name', 'created_timestamp',
+               'modified_timestamp', 'used', 'description', 'source')
+
+
+def _migration_tag_object_type(db: SyncDatabase) -> None:
+    """
+    Migration 7: object_type becomes part of the natural key of the tag table, so the tags of an OMERO project,
+    dataset and image with the same OMERO id are kept apart. Tags without a type (RSpace) get an empty one, like the
+    netstore tags, because NULLs never conflict on a unique key. A table with the former key (in its CREATE statement
+    or as the index of migration 2) is rebuilt, the former key would still make the tags of the same id collide.
+    """
+    # a NULL type that now equals the empty type of an existing tag is a duplicate
+    db.execute("UPDATE OR IGNORE tag SET object_type = '' WHERE object_type IS NULL")
+    db.execute("DELETE FROM tag WHERE object_type IS NULL")
+    if db._has_unique_index('tag', ('object_id', 'source', 'translated_tag_name')):
+        db.execute("DROP TABLE IF EXISTS tag_rebuild")
+        db.execute(TAG_TABLE_SQL.format(name='tag_rebuild'))
+        db.execute(f"INSERT INTO tag_rebuild ({', '.join(TAG_COLUMNS)}) SELECT {', '.join(TAG_COLUMNS)} FROM tag")
+        # the indexes of the former table (e.g. ux_tag_natural_key) are dropped with it
+        db.execute("DROP TABLE tag")
+        db.execute("ALTER TABLE tag_rebuild RENAME TO tag")
+    elif not db._has_unique_index('tag', NATURAL_KEYS['tag']):
+        db.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS ux_tag_natural_key ON tag ({', '.join(NATURAL_KEYS['tag'])})")
+
+
+# numbered schema migrations (version, description, upgrade function); append new ones, never renumber
+MIGRATIONS = [
+    (1, "index plan for object, fs_storage and link lookups", _migration_index_plan),
+    (2, "natural keys for object, tag and link", _migration_natural_keys),
+    (3, "compact fs_storage layout with a directory table", _migration_compact_fs_storage),
+    (4, "crawl_state table for the incremental crawl", _migration_crawl_state),
+    (5, "indexed content fingerprints of the files", _migration_fingerprints),
+    (6, "per-project rollups of the files maintained by triggers", _migration_project_rollups),
+    (7, "object_type in the natural key of the tag table", _migration_tag_object_type),
+]
+
+
+# one session per (process, database file); a forked child opens its own connection
+_sessions: Dict[Tuple[int, str], SyncDatabase] = {}
+_sessions_lock = threading.Lock()
+
+
+def get_sync_database(db_name: str = DEFAULT_DB_NAME, **settings) -> SyncDatabase:
+    """
+    This function returns the shared SyncDatabase session of the current process for a database.
+    The session is created on the first call; its pragmas are taken from the [sync database] section of
+    init.ini and can be overridden by keyword arguments (only on the first call).
+
+    Parameters:
+    db_name (str): The name or path of the SQLite database. Default is 'sync_database.db'.
+    **settings: Optional SyncDatabase parameters (synchronous, cache_size, mmap_size, cached_statements, id_map_size,
+        read_pool_size).
+
+    Returns:
+    SyncDatabase: The shared session.
+    """
+    db_path = os.path.abspath(get_database_path(db_name))
+    key = (os.getpid(), db_path)
+    with _sessions_lock:
+        if key not in _sessions:
+            parameters = get_database_settings()
+            parameters.update(settings)
+            _sessions[key] = SyncDatabase(db_path, **parameters)
+        return _sessions[key]
+
+
+def close_sync_databases() -> None:
+    """
+    This function closes all sessions opened by the current process.
+    """
+    with _sessions_lock:
+        for (pid, _), session in list(_sessions.items()):
+            if pid == os.getpid():
+                session.close()
+
+
+def get_size_report(db_name: str = DEFAULT_DB_NAME) -> List[Dict[str, Any]]:
+    """
+    This function reports the size of every table and index of the database (from the dbstat virtual table).
+    'fill' is the share of the page bytes used by data, 'fragmentation' the share of pages that do not directly
+    follow the previous page of the same b-tree on disk. The report runs on a read-only connection.
+
+    Parameters:
+    db_name (str): The name of the SQLite database. Default is 'sync_database.db'.
+
+    Returns:
+    List[Dict[str, Any]]: One entry per table/index with the keys 'name', 'type', 'table', 'pages', 'bytes',
+    'unused_bytes', 'fill' and 'fragmentation', sorted by size.
+    """
+    db = get_sync_database(db_name)
+    with db.reader() as conn:
+        types = {name: (kind, table) for kind, name, table in conn.execute("SELECT type, name, tbl_name FROM sqlite_master")}
+        report = {}
+        previous = {}
+        # in path order the pages of a b-tree are listed in key order
+        for name, pageno, pgsize, unused in conn.execute("SELECT name, pageno, pgsize, unused FROM dbstat ORDER BY name, path"):
+            entry = report.setdefault(name, {'name': name,
+                                             'type': types.get(name, ('table', name))[0],
+                                             'table': types.get(name, ('table', name))[1],
+                                             'pages': 0, 'bytes': 0, 'unused_bytes': 0, 'jumps': 0})
+            entry['pages'] += 1
+            entry['bytes'] += pgsize
+            entry['unused_bytes'] += unused
+            if name in previous and pageno != previous[name] + 1:
+                entry['jumps'] += 1
+            previous[name] = pageno
+    for entry in report.values():
+        entry['fill'] = round(1 - entry['unused_bytes'] / entry['bytes'], 3) if entry['bytes'] else 0.0
+        entry['fragmentation'] = round(entry.pop('jumps') / max(entry['pages'] - 1, 1), 3)
+    return sorted(report.values(), key=lambda entry: entry['bytes'], reverse=True)
+
+
+def run_maintenance(db_name: str = DEFAULT_DB_NAME, vacuum_pages: int = 10000, batch_pages: int = 500,
+                    convert: bool = False, verbose: int = 0) -> Dict[str, Any]:
+    """
+    This function runs the maintenance of the sync database, e.g. after every nightly ingest:
+    ANALYZE and 'PRAGMA optimize' refresh the statistics of the query planner, an incremental vacuum
+    returns up to vacuum_pages free pages to the file system and a passive checkpoint folds the WAL into the database.
+    The vacuum runs in short transactions of batch_pages pages, so readers (which use the WAL) are never blocked and
+    writers only wait for one batch.
+    A database that was created without auto_vacuum=INCREMENTAL has to be converted once with a full VACUUM, which
+    holds the write lock for the whole rebuild; it is only done if convert is set (db_maintenance.py --convert),
+    otherwise the vacuum is skipped with a message.
+
+    Parameters:
+    db_name (str): The name of the SQLite database. Default is 'sync_database.db'.
+    vacuum_pages (int): The maximum number of free pages to release in this run. Default is 10000.
+    batch_pages (int): The number of pages released per transaction. Default is 500.
+    convert (bool): If True, a database without auto_vacuum=INCREMENTAL is converted with a full VACUUM. Default is False.
+    verbose (int): If set to 1, prints the summary and the size report.
+
+    Returns:
+    Dict[str, Any]: A summary with the keys 'page_size', 'pages_before', 'free_pages_before', 'pages_after',
+    'free_pages_after', 'released_pages', 'converted' and 'tables' (the size report, see get_size_report).
+    """
+    db = get_sync_database(db_name)
+
+    def pragma(name):
+        with db._lock:
+            return db.connection.execute(f"PRAGMA {name}").fetchone()[0]
+
+    summary = {'page_size': pragma('page_size'),
+               'pages_before': pragma('page_count'),
+               'free_pages_before': pragma('freelist_count'),
+               'converted': False}
+
+    with db._lock:
+        db.commit()
+        db.execute("ANALYZE")
+        db.execute("PRAGMA optimize")
+
+        # auto_vacuum: 0 = NONE, 1 = FULL, 2 = INCREMENTAL
+        incremental = pragma('auto_vacuum') == 2
+        if not incremental and convert:
+            db.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            db.execute("VACUUM")
+            summary['converted'] = incremental = True
+        elif not incremental:
+            print(f"{db.db_path} does not use auto_vacuum=INCREMENTAL, the vacuum is skipped "
+                  f"(convert it once with: python db_maintenance.py --convert)")
+
+    released = 0
+    while incremental and released < vacuum_pages:
+        free_pages = pragma('freelist_count')
+        if free_pages == 0:
+            break
+        batch = min(batch_pages, vacuum_pages - released, free_pages)
+        with db._lock:
+            db.commit()
+            # the pragma releases one page per step, Cursor.execute only steps once (executescript runs it to the end)
+            db.connection.executescript(f"BEGIN; PRAGMA incremental_vacuum({int(batch)}); COMMIT;")
+        released += batch
+
+    with db._lock:
+        db.connection.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchall()
+
+    summary['pages_after'] = pragma('page_count')
+    summary['free_pages_after'] = pragma('freelist_count')
+    summary['released_pages'] = summary['pages_before'] - summary['pages_after']
+    summary['tables'] = get_size_report(db_name)
+
+    if verbose:
+        print({key: value for key, value in summary.items() if key != 'tables'})
+        for entry in summary['tables']:
+            print(f"{entry['type']:<6} {entry['name']:<40} {entry['pages']:>10} pages {entry['bytes'] / 2**20:>10.2f} MiB "
+                  f"fill {entry['fill']:.3f} fragmentation {entry['fragmentation']:.3f}")
+    return summary
+
+
+atexit.register(close_sync_databases)
@@ -1,4 +1,5 @@
 # Standard library imports
+import collections
 import datetime
 import getpass
 import importlib
@@ -14,7 +15,7 @@ import subprocess
 import numpy as np
 import pandas as pd
 import requests
-from typing import Dict, Tuple, Optional, List, Union
+from typing import Dict, Tuple, Optional, List, Union, Iterable, Iterator
 
 # OMERO imports
 import omero.clients
@@ -24,6 +25,12 @@ from omero.model import OriginalFileI, ProjectAnnotationLinkI
 
 # Local imports
 from src.io_functions import *
+from src.io_database import SyncDatabase, get_sync_database, get_database_path, get_upsert_clause, refresh_project_rollups
+from src.io_crawler import (CRAWL_WORKERS, CrawlRules, CrawlSink, FileRecord, IncrementalCrawl, crawl, crawl_projects,
+                            get_crawl_rules, get_file_record, iter_fingerprints)
+from src.io_watch import InotifyWatcher, watch_batches
+from src.io_classify import classify_paths, get_file_extension
+from src.io_lexicon import get_abbreviation_expander, get_description_index, get_stopword_lexicon
 from data import *
 
 
@@ -50,48 +57,54 @@ def create_bulk_import_file(id, path, docker_vol_path, filename='./data/image_im
         writer.writerow([f'Dataset:{id}', path])
     return 0
 
-def get_file_list(folder):
+def iter_file_list(folder):
     """
-    Traverse the specified directory and its subdirectories to collect all the file paths.
+    Traverse the specified directory and its subdirectories and yield the file paths one by one.
+    The walk is depth first, so all paths below one subdirectory of the folder are yielded one after the other.
 
     :param folder: The path of the directory to traverse.
-    :return: A list of all the file paths.
+    :return: An iterator over all the file paths.
     """
-    file_list = []
     for root, dirs, files in os.walk(folder):
         for file in files:
-            file_list.append(os.path.join(root, file))
-    return file_list
+            yield os.path.join(root, file)
 
 
-def get_netstore_filelist(folder="/home/omero-import"):
+def get_file_list(folder, max_workers=CRAWL_WORKERS, rules=None):
     """
-    Organize the file paths into a dictionary based on the project names found in the file paths.
+    Traverse the specified directory and its subdirectories (in parallel, see src.io_crawler.crawl) to collect all the file paths.
 
     :param folder: The path of the directory to traverse.
-    :return: A tuple containing a list of project names and a dictionary where each key is a project name and the value is a list of file paths belonging to that project.
+    :param max_workers: The number of directories listed at the same time.
+    :param rules: The include/exclude rules of the crawl (see src.io_crawler.CrawlRules), or None.
+    :return: A list of all the file paths (not in os.walk order).
     """
-    # Get the list of all file paths
-    filelist = get_file_list(folder)
+    return [record.path for record in crawl(folder, max_workers, rules=rules)]
 
-    # Print the first 5 file paths for verification
-    print("First 5 files: ", filelist[0:5])
 
-    # Extract the project names from the file paths
-    cutfilelist = [x[x.find(folder)+len(folder):] for x in filelist]
-    print("First 5 base folders: ", cutfilelist[0:5])
-    projectlist = list(set([x.split("/")[1] for x in cutfilelist]))
-    print("First 5 projects: ", projectlist[0:5])
+def get_project_name(file_path, folder):
+    """
+    Return the project of a file path, i.e. its first path component below the folder.
+
+    :param file_path: The path of the file.
+    :param folder: The root folder of the projects.
+    :return: The project name (the file name itself for a file directly in the folder).
+    """
+    return os.path.relpath(file_path, folder).split(os.sep, 1)[0]
 
-    # Organize the file paths into a dictionary based on the project names
-    fileDict = {}
-    for project in projectlist:
-        fileDict[project] = [x for x in filelist if project in x]
 
-    # Print the project names for verification
-    print("Projects: ", fileDict.keys())
+def get_netstore_filelist(folder="/home/omero-import", max_workers=CRAWL_WORKERS, rules=None):
+    """
+    Crawl the folder project by project (the first path component below the folder, see src.io_crawler.crawl_projects).
 
-    return projectlist, fileDict
+    :param folder: The path of the directory to traverse.
+    :param max_workers: The number of directories listed at the same time.
+    :param rules: The include/exclude rules of the crawl (see src.io_crawler.CrawlRules), or None.
+    :return: An iterator over tuples of the project name and an iterator over the FileRecords (path, size and
+       timestamps) belonging to that project. The file iterator of a project has to be consumed before the next
+       project is requested.
+    """
+    return crawl_projects(folder, max_workers, rules=rules)
 
 
 import os
@@ -158,21 +171,23 @@ def load_json_file(file_path: str) -> dict:
 
 def get_abbreviation_dict() -> dict:
     """
-    This function loads the abbreviations JSON file and returns the data as a dictionary.
+    This function returns the abbreviations JSON file as a dictionary. The file is parsed once and again only
+    when it changes (see src.io_lexicon.AbbreviationExpander).
 
     Returns:
     dict: The abbreviations data as a dictionary.
     """
-    return load_json_file("./abbreviations.json")
+    return get_abbreviation_expander().abbreviations
 
 def get_description_dict() -> dict:
     """
-    This function loads the descriptions JSON file and returns the data as a dictionary.
+    This function returns the descriptions JSON file as a dictionary. The file is parsed once and again only
+    when it changes (see src.io_lexicon.DescriptionIndex).
 
     Returns:
     dict: The descriptions data as a dictionary.
     """
-    return load_json_file("../descriptions.json")
+    return get_description_index().descriptions
 
 def get_create_table_sql() -> dict:
     """
@@ -191,32 +206,33 @@ def check_db_table(db_name: str, table_name: str) -> None:
     """
     This function checks if a table exists in a SQLite database.
     If the table does not exist, it creates the table using the SQL code from the get_create_table_sql() function.
+    Afterwards the database is upgraded in place to the latest schema version (see MIGRATIONS in src.io_database).
 
     Parameters:
     db_name (str): The name of the SQLite database.
     table_name (str): The name of the table to check.
     """
-    conn = sqlite3.connect(os.path.join("./data", db_name))
-    c = conn.cursor()
+    db = get_sync_database(db_name)
 
     # Check if table exists
-    c.execute(
-        f"SELECT name FROM sqlite_master WHERE type='table' AND name='{table_name}'")
-    table_exists = c.fetchone() is not None
+    table_exists = db.fetchone(
+        "SELECT name FROM sqlite_master WHERE type IN ('table', 'view') AND name=?", (table_name,)) is not None
 
+    sql_create_code = get_create_table_sql()
     if not table_exists:
-        sql_create_code = get_create_table_sql()
-        for sql in sql_create_code.keys():
-            c.execute(sql_create_code[sql])
-
-    conn.close()
+        with db.transaction():
+            for sql in sql_create_code.keys():
+                db.execute(sql_create_code[sql])
+    db.migrate(sql_create_code)
 
 def insert_dict_to_database(db_name: str, table_name: str, data_dict: Dict[str, any]) -> int:
     """
     This function inserts a dictionary of data into a SQLite database table.
     It takes the database name, table name, and a dictionary of data as input.
     The keys of the dictionary are used as column names and the values are used as the corresponding row values.
-    If an IntegrityError is raised, the function commits the changes and closes the connection.
+    If a row with the same natural key already exists (object, tag and link tables), it is updated instead.
+    The row is written through the shared SyncDatabase session; it is committed immediately unless the caller
+    has opened a transaction (with get_sync_database(db_name).transaction()).
     The function returns 1 if an IntegrityError is raised and 0 otherwise.
 
     Parameters:
@@ -231,22 +247,54 @@ def insert_dict_to_database(db_name: str, table_name: str, data_dict: Dict[str,
     placeholders = ', '.join(['?' for _ in data_dict])
     values = tuple(data_dict.values())
 
-    sql = f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders})"
+    sql = f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders})" + get_upsert_clause(table_name, data_dict.keys())
 
-    # Connect to the database
-    conn = sqlite3.connect(os.path.join("./data", db_name))
-    cursor = conn.cursor()
+    db = get_sync_database(db_name)
     try:
-        cursor.execute(sql, values)
+        db.execute(sql, values)
     except sqlite3.IntegrityError as e:
-        conn.commit()
-        conn.close()
         return 1
-    conn.commit()
-    conn.close()
 
     return 0
 
+def insert_dict_to_database_returning_id(db_name: str, table_name: str, data_dict: Dict[str, any]) -> Optional[int]:
+    """
+    This function inserts a dictionary of data into a SQLite database table like insert_dict_to_database,
+    but returns the id of the written row (also when an existing row was updated on its natural key).
+    Inserted objects are remembered in the id map of the session, so get_object_id_from_specific_id and
+    get_object_id_from_netstore_name can answer without a query.
+
+    Parameters:
+    db_name (str): The name of the SQLite database.
+    table_name (str): The name of the table to insert data into.
+    data_dict (Dict[str, any]): A dictionary of data to insert into the table.
+
+    Returns:
+    Optional[int]: The id of the row, or None if an IntegrityError is raised.
+    """
+    db = get_sync_database(db_name)
+    return db.insert_returning_id(table_name, data_dict)
+
+def insert_many_to_database(db_name: str, table_name: str, rows: Iterable[Dict[str, any]], chunk_size: int = 5000, verbose: int = 0) -> List[Dict[str, int]]:
+    """
+    This function inserts an iterable of dictionaries into a SQLite database table in batches.
+    The rows can be a generator; they are consumed in chunks of chunk_size and every chunk is written
+    with one executemany inside a single transaction. Rows with an existing natural key are updated and
+    rows raising an IntegrityError are skipped (like in insert_dict_to_database).
+
+    Parameters:
+    db_name (str): The name of the SQLite database.
+    table_name (str): The name of the table to insert data into.
+    rows (Iterable[Dict[str, any]]): The dictionaries of data to insert into the table.
+    chunk_size (int): The number of rows per chunk/transaction. Default is 5000.
+    verbose (int): If set to 1, prints the counts of every chunk.
+
+    Returns:
+    List[Dict[str, int]]: One entry per chunk with the number of 'rows', 'inserted' (or updated) rows and 'integrity_errors'.
+    """
+    db = get_sync_database(db_name)
+    return db.insert_many(table_name, rows, chunk_size=chunk_size, verbose=verbose)
+
 def get_project_user_tuple(pm_title: str) -> Tuple[str, str]:
     """
     This function takes a project title as input and extracts the project name and user information from it.
@@ -355,26 +403,20 @@ def check_if_entry_exists(db_name: str, table_name: str, object_document: Dict[s
     Returns:
     int: 1 if the entry exists, 0 otherwise.
     """
-    # Connect to the database
-    conn = sqlite3.connect(os.path.join("./data", db_name))
-    cursor = conn.cursor()
+    db = get_sync_database(db_name)
 
     # SQL command to check for the specific value
     sql = f"SELECT EXISTS (SELECT 1 FROM {table_name} WHERE specific_id = ?);"
     values = (object_document['specific_id'],)
 
     try:
-        cursor.execute(sql, values)
-        result = cursor.fetchone()
+        result = db.fetchone(sql, values)
         if result[0] == 1:
-            conn.close()
             return 1
         else:
-            conn.close()
             return 0
     except sqlite3.Error as e:
         print("An error occurred:", e.args[0])
-    conn.close()
     return 0
 
 def get_cleaned_tag_string(input_string: str) -> str:
@@ -408,10 +450,7 @@ def remove_stopwords(text: str) -> str:
     Returns:
     str: The string with stopwords removed.
     """
-    stopwords = get_stopwords()
-    words = text.split()
-    filtered_words = [word for word in words if word.lower() not in stopwords]
-    return ' '.join(filtered_words)
+    return get_stopword_lexicon().remove(text)
 
 import json
 import os
@@ -420,7 +459,8 @@ from typing import Dict, List
 
 def get_stopwords(source: str = 'stopwords.json') -> List[str]:
     """
-    This function reads a JSON file containing stopwords and returns a list of stopwords.
+    This function returns the stopwords of a JSON file as a list of case-folded words.
+    The file is parsed once and again only when it changes (see src.io_lexicon.StopwordLexicon).
 
     Parameters:
     source (str): The path to the JSON file containing stopwords. Default is 'stopwords.json'.
@@ -428,10 +468,7 @@ def get_stopwords(source: str = 'stopwords.json') -> List[str]:
     Returns:
     List[str]: A list of stopwords.
     """
-    with open(source) as f:
-        data = json.load(f)
-        return data['stopwords']
-    return []
+    return sorted(get_stopword_lexicon(source).words)
 
 def get_secret_api_parameters(source: str = '../secrets/api_secrets.json', type: str = 'rspace') -> Dict[str, any]:
     """
@@ -460,14 +497,10 @@ def delete_duplicate_tags(db_name: str = os.path.join("./data", "sync_database.d
     Returns:
     int: 0 if the operation is successful.
     """
-    # Connect to the SQLite database
-    conn = sqlite3.connect(db_name)
-
-    # Create a cursor object
-    cursor = conn.cursor()
+    db = get_sync_database(db_name)
 
     # Execute the SQL command to delete duplicates
-    cursor.execute("""
+    db.execute("""
         DELETE FROM tag
         WHERE rowid NOT IN (
             SELECT MIN(rowid)
@@ -476,11 +509,6 @@ def delete_duplicate_tags(db_name: str = os.path.join("./data", "sync_database.d
         );
     """)
 
-    # Commit the changes
-    conn.commit()
-
-    # Close the connection
-    conn.close()
     return 0
 
 import json
@@ -500,14 +528,10 @@ def delete_duplicate_objects(db_name: str = os.path.join("./data", "sync_databas
     Returns:
     int: 0 if the operation is successful.
     """
-    # Connect to the SQLite database
-    conn = sqlite3.connect(db_name)
-
-    # Create a cursor object
-    cursor = conn.cursor()
+    db = get_sync_database(db_name)
 
     # Execute the SQL command to delete duplicates
-    cursor.execute("""
+    db.execute("""
         DELETE FROM object
         WHERE rowid NOT IN (
             SELECT MIN(rowid)
@@ -515,12 +539,9 @@ def delete_duplicate_objects(db_name: str = os.path.join("./data", "sync_databas
             GROUP BY object_name, object_type, specific_id, user, created_timestamp, modified_timestamp, notes, source
         );
     """)
+    # the deleted rows may still be in the id map
+    db.object_ids.clear()
 
-    # Commit the changes
-    conn.commit()
-
-    # Close the connection
-    conn.close()
     return 0
 
 def delete_duplicate_links(db_name=os.path.join("./data", "sync_database.db")):
@@ -531,14 +552,10 @@ def delete_duplicate_links(db_name=os.path.join("./data", "sync_database.db")):
     Parameters:
     db_name (str): The name of the SQLite database. Default is './data/sync_database.db'.
     """
-    # Connect to the SQLite database
-    conn = sqlite3.connect(db_name)
-
-    # Create a cursor object
-    cursor = conn.cursor()
+    db = get_sync_database(db_name)
 
     # Execute the SQL command to delete duplicates
-    cursor.execute("""
+    db.execute("""
         DELETE FROM link
         WHERE rowid NOT IN (
             SELECT MIN(rowid)
@@ -547,12 +564,6 @@ def delete_duplicate_links(db_name=os.path.join("./data", "sync_database.db")):
         );
     """)
 
-    # Commit the changes
-    conn.commit()
-
-    # Close the connection
-    conn.close()
-
 def get_secret_api_parameters(source: str = 'api_secrets.json', type: str = 'rspace') -> Dict[str, any]:
     """
     This function reads a JSON file containing secret API parameters and returns a dictionary of parameters for a specific type.
@@ -594,39 +605,45 @@ def get_sample_data_from_barcode(sampleParameter: str, elnName: str = 'rspace')
         r = r.json()
         return r
 
-def get_object_id_from_specific_id(db_name: str, table_name: str, specific_id: str) -> Optional[int]:
+def get_object_id_from_specific_id(db_name: str, table_name: str, specific_id: str, source: Optional[str] = None) -> Optional[int]:
     """
     This function retrieves the object ID from a specific ID in a SQLite database table.
     It takes the database name, table name, and specific ID as input and returns the object ID if it exists, or None otherwise.
+    If the source is given, the id map of the session is checked first.
 
     Parameters:
     db_name (str): The name of the SQLite database.
     table_name (str): The name of the table to search in.
     specific_id (str): The specific ID to search for.
+    source (str): The source of the object (e.g. 'rspace'). Default is None (any source, no id map).
 
     Returns:
     Optional[int]: The object ID if it exists, or None otherwise.
     """
-    # Connect to the database
-    conn = sqlite3.connect(os.path.join("./data", db_name))
-    cursor = conn.cursor()
+    db = get_sync_database(db_name)
+
+    if source is not None and table_name == 'object':
+        object_id = db.object_ids.get(('specific_id', source, specific_id))
+        if object_id is not None:
+            return object_id
 
     # SQL command to check for the specific value and retrieve the object_id
     sql = f"SELECT object_id FROM {table_name} WHERE specific_id = ?;"
     values = (specific_id,)  # Note the comma to create a tuple
+    if source is not None:
+        sql = f"SELECT object_id FROM {table_name} WHERE specific_id = ? AND source = ?;"
+        values = (specific_id, source)
 
     try:
-        cursor.execute(sql, values)
-        result = cursor.fetchone()
+        result = db.fetchone(sql, values)
         if result is not None:
-            conn.close()
+            if source is not None and table_name == 'object':
+                db.object_ids.put(('specific_id', source, specific_id), result[0])
             return result[0]  # Return the object_id
         else:
-            conn.close()
             return None  # Return None if specific_id is not found
     except sqlite3.Error as e:
         print("An error occurred:", e.args[0])
-        conn.close()
     return None
 
 import sqlite3
@@ -639,6 +656,7 @@ def get_object_id_from_netstore_name(db_name: str, table_name: str, netstore_nam
     """
     This function retrieves the object ID from a NetStore name in a SQLite database table.
     It takes the database name, table name, and NetStore name as input and returns the object ID if it exists, or None otherwise.
+    The id map of the session is checked first.
 
     Parameters:
     db_name (str): The name of the SQLite database.
@@ -648,26 +666,27 @@ def get_object_id_from_netstore_name(db_name: str, table_name: str, netstore_nam
     Returns:
     Optional[int]: The object ID if it exists, or None otherwise.
     """
-    # Connect to the database
-    conn = sqlite3.connect(os.path.join("./data", db_name))
-    cursor = conn.cursor()
+    db = get_sync_database(db_name)
+
+    if table_name == 'object':
+        object_id = db.object_ids.get(('object_name', 'fs_storage', netstore_name))
+        if object_id is not None:
+            return object_id
 
     # SQL command to check for the specific value and retrieve the object_id
     sql = f"SELECT object_id FROM {table_name} WHERE object_name = ? AND source = ?;"
     values = (netstore_name, 'fs_storage')  # Note the comma to create a tuple
 
     try:
-        cursor.execute(sql, values)
-        result = cursor.fetchone()
+        result = db.fetchone(sql, values)
         if result is not None:
-            conn.close()
+            if table_name == 'object':
+                db.object_ids.put(('object_name', 'fs_storage', netstore_name), result[0])
             return result[0]  # Return the object_id
         else:
-            conn.close()
             return None  # Return None if specific_id is not found
     except sqlite3.Error as e:
         print("An error occurred:", e.args[0])
-        conn.close()
     return None
 
 def get_int_from_date(date_str: str) -> int:
@@ -695,6 +714,7 @@ def convert_abbreviations(df: pd.DataFrame, colname: str = "tags") -> pd.DataFra
     """
     This function replaces abbreviations in a DataFrame column with their full forms using a dictionary of abbreviations.
     It takes a DataFrame and a column name as input and returns the updated DataFrame.
+    The column is expanded in one pass, the longest abbreviation wins (see src.io_lexicon.AbbreviationExpander).
 
     Parameters:
     df (pd.DataFrame): The input DataFrame.
@@ -703,9 +723,7 @@ def convert_abbreviations(df: pd.DataFrame, colname: str = "tags") -> pd.DataFra
     Returns:
     pd.DataFrame: The updated DataFrame.
     """
-    abbDict = get_abbreviation_dict()
-    for key, value in abbDict.items():
-        df[colname] = df[colname].str.replace(key, value)
+    df[colname] = get_abbreviation_expander().expand_series(df[colname])
     return process_tags(df, colname=colname)
 
 def convert_abbreviation(og_string: str) -> str:
@@ -719,9 +737,8 @@ def convert_abbreviation(og_string: str) -> str:
     Returns:
     str: The updated string containing the full forms.
     """
-    abbDict = get_abbreviation_dict()
     og_list = list(set(og_string.split(";")))
-    return ";".join([abbDict[key] if key in abbDict else key for key in og_list])
+    return ";".join(get_abbreviation_expander().expand_tokens(og_list))
 
 def process_tags(df: pd.DataFrame, colname: str = "tags") -> pd.DataFrame:
     """
@@ -772,35 +789,139 @@ def get_possible_tags_list(tags: List[str]) -> List[str]:
         re.match(pattern, item) for pattern in patterns)]
     return filtered_lst
 
-def get_dataframe(df_type: str, db_name: str = 'sync_database.db') -> pd.DataFrame:
+def get_netstore_tag_rows(file_list: Iterable[str], object_id: int, folder: str = "/home/omero-import") -> Iterable[Dict[str, any]]:
+    """
+    This function yields the tag rows of a netstore project built from the parts of its file paths.
+    The path parts of all files are collected first and filtered once with get_possible_tags_list,
+    so every tag is translated and inserted only once per project.
+
+    Parameters:
+    file_list (Iterable[str]): The file paths of the project.
+    object_id (int): The object ID of the project in the object table.
+    folder (str): The netstore root folder that is cut from the paths. Default is '/home/omero-import'.
+
+    Returns:
+    Iterable[Dict[str, any]]: The tag rows for the tag table.
+    """
+    sep = r"/|-|_|\.|,"
+    tags = set()
+    for file in file_list:
+        tags.update(re.split(sep, file[file.find(folder)+len(folder):]))
+    created_timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    # try to find the possible relevant tags (TODO: create a dictionary to white/black list tags)
+    for tag in get_possible_tags_list(list(tags)):
+        trans_note = get_cleaned_tag_string(tag)
+        trans_note = convert_abbreviation(trans_note)
+        yield {
+            'object_id': object_id,
+            'object_type': "",
+            'tag_name': tag,
+            'translated_tag_name': trans_note,
+            'created_timestamp': created_timestamp,
+            'modified_timestamp': "",
+            'used': 1,
+            'description': get_tag_description(trans_note),
+            'source': 'fs_storage'
+        }
+
+# table and fixed filters behind every df_type of get_dataframe (any other df_type is an object source)
+DATAFRAME_SOURCES = {
+    'link': ('link', {}),
+    'link-fs_storage': ('link', {'tar_source': 'fs_storage'}),
+    'link-omero': ('link', {'tar_source': 'omero'}),
+    'egroupware': ('project_registration', {}),
+}
+
+# explicit dtypes of the columns loaded by get_dataframe (low-cardinality text columns load as categoricals)
+DATAFRAME_DTYPES = {
+    'object_id': 'Int64',
+    'project_id': 'Int64',
+    'tag_id': 'Int64',
+    'fs_id': 'Int64',
+    'link_id': 'Int64',
+    'src_id': 'Int64',
+    'tar_id': 'Int64',
+    'used': 'Int64',
+    'manual_validated': 'Int64',
+    'overlap_ratio': 'float64',
+    'source': 'category',
+    'object_type': 'category',
+    'user': 'category',
+    'src_table': 'category',
+    'tar_table': 'category',
+    'tar_source': 'category',
+}
+
+def get_dataframe(df_type: str, db_name: str = 'sync_database.db', columns: Optional[List[str]] = None,
+                  filters: Optional[Dict[str, any]] = None, chunksize: Optional[int] = None) -> Union[pd.DataFrame, Iterator[pd.DataFrame]]:
     """
     This function retrieves a DataFrame from a SQLite database based on the specified dataframe type.
-    It takes the dataframe type and the database name as input and returns the DataFrame.
+    The df_type 'link', 'link-fs_storage', 'link-omero' and 'egroupware' select the link and project_registration tables,
+    every other df_type (e.g. 'omero', 'fs_storage', 'rspace') selects the objects of that source.
+    Only the requested columns are loaded; the filters are added to the WHERE clause as parameters.
+    The columns get explicit dtypes (see DATAFRAME_DTYPES), e.g. source, object_type and user load as categoricals.
+    With chunksize the categorical columns load as plain strings instead, because every chunk would get its own
+    categories (and concatenating the chunks would silently turn them into object columns).
 
     Parameters:
     df_type (str): The type of DataFrame to retrieve.
     db_name (str): The name of the SQLite database. Default is 'sync_database.db'.
+    columns (List[str]): The columns to load. Default is None (all columns).
+    filters (Dict[str, any]): Column/value pairs the rows have to match; a list or tuple value matches any of its items.
+        Default is None (no additional filter).
+    chunksize (int): If set, an iterator of DataFrames with chunksize rows each is returned instead of one DataFrame.
 
     Returns:
-    pd.DataFrame: The retrieved DataFrame.
+    Union[pd.DataFrame, Iterator[pd.DataFrame]]: The retrieved DataFrame, or an iterator of DataFrames if chunksize is set.
     """
-    conn = sqlite3.connect(os.path.join("./data", db_name))
-    if df_type == "link":
-        sql = f"SELECT * FROM link;"
-    elif df_type == "egroupware":
-        sql = f"SELECT * FROM project_registration"
-    else:
-        sql = f"SELECT * FROM object WHERE source = '{df_type}';"
+    table_name, where = DATAFRAME_SOURCES.get(df_type, ('object', {'source': df_type}))
+    where = dict(where, **(filters or {}))
 
-    # Begin a transaction
-    conn.execute("BEGIN")
+    conditions = []
+    values = []
+    for column, value in where.items():
+        if isinstance(value, (list, tuple, set)):
+            value = list(value)
+            conditions.append(f"{column} IN ({', '.join(['?' for _ in value])})")
+            values += value
+        else:
+            conditions.append(f"{column} = ?")
+            values.append(value)
 
-    df = pd.read_sql_query(sql, conn)
+    sql = f"SELECT {', '.join(columns) if columns else '*'} FROM {table_name}"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
 
-    # Commit the transaction
-    conn.execute("COMMIT")
-    conn.close()
-    return df
+    dtype = {column: DATAFRAME_DTYPES[column] for column in (columns or DATAFRAME_DTYPES) if column in DATAFRAME_DTYPES}
+    if columns is None:
+        # SELECT *: only set the dtypes of columns the table actually has
+        table_columns = [row[1] for row in get_sync_database(db_name).fetchall(f"PRAGMA table_info({table_name})")]
+        dtype = {column: dtype[column] for column in table_columns if column in dtype}
+
+    db = get_sync_database(db_name)
+    if chunksize is not None:
+        dtype = {column: column_dtype for column, column_dtype in dtype.items() if column_dtype != 'category'}
+        return iter_dataframe_chunks(db_name, sql, values, dtype, chunksize)
+    with db.reader() as conn:
+        return pd.read_sql_query(sql, conn, params=values, dtype=dtype)
+
+def iter_dataframe_chunks(db_name: str, sql: str, values: List[any], dtype: Dict[str, str], chunksize: int) -> Iterator[pd.DataFrame]:
+    """
+    This function yields the result of a query in DataFrames of chunksize rows.
+    All chunks are read from the same snapshot of the database (the read connection stays open until the iterator is exhausted).
+
+    Parameters:
+    db_name (str): The name of the SQLite database.
+    sql (str): The query.
+    values (List[any]): The values for the '?' placeholders of the query.
+    dtype (Dict[str, str]): The dtypes of the columns.
+    chunksize (int): The number of rows per DataFrame.
+
+    Yields:
+    pd.DataFrame: The next chunk of the result.
+    """
+    with get_sync_database(db_name).reader() as conn:
+        yield from pd.read_sql_query(sql, conn, params=values, dtype=dtype, chunksize=chunksize)
 
 def calculate_percentage(str1: str, str2: str) -> float:
     """
@@ -958,20 +1079,24 @@ def get_tags_tuple(conn: object, user: str = 'inplace') -> List[Tuple[str, int]]
             result.append((tag.getValue(), tag.getId()))
     return result
 
-def get_tag_description(tag: str, descriptions: dict = None) -> str:
+def get_tag_description(tag: str, descriptions: dict = None, min_similarity: Optional[float] = None) -> str:
     """
     This function retrieves the description of a tag from a dictionary of descriptions.
     It takes a tag name and a dictionary of descriptions as input and returns the description of the tag if it is present, or an empty string otherwise.
+    Without a dictionary the shared description index is used, which also finds the tag in another case or with
+    other punctuation and whitespace (see src.io_lexicon.DescriptionIndex).
 
     Parameters:
     tag (str): The tag name.
-    descriptions (dict): A dictionary of descriptions. Default is the output of get_description_dict().
+    descriptions (dict): A dictionary of descriptions, looked up by exact tag. Default is the description index.
+    min_similarity (float): The trigram similarity (0-1) a near match of the index needs, or None for no near
+        matches. Default is None.
 
     Returns:
     str: The description of the tag if it is present, or an empty string otherwise.
     """
     if descriptions is None:
-        descriptions = get_description_dict()
+        return get_description_index().lookup(tag, min_similarity)
 
     if tag in descriptions:
         return descriptions[tag]
@@ -1106,66 +1231,79 @@ def add_attachment_to_project(username: str, password: str, host: str, port: int
 
     conn.close()
 
+def get_project_rollup(db_name: str, object_id: int) -> Dict[str, any]:
+    """
+    This function retrieves the rollup of a project from the project_rollup and project_type_rollup tables,
+    which are maintained by the ingest, so no file of the project is read.
+
+    Parameters:
+    db_name (str): The name of the SQLite database.
+    object_id (int): The object ID of the project.
+
+    Returns:
+    Dict[str, any]: A dictionary with the keys 'file_count', 'total_bytes', 'min_created_epoch', 'max_modified_epoch'
+    and 'types' (the file count and bytes per file type, the most frequent type first).
+    An empty rollup is returned for a project without files.
+    """
+    db = get_sync_database(db_name)
+    row = db.fetchone("""
+        SELECT file_count, total_bytes, min_created_epoch, max_modified_epoch
+        FROM project_rollup
+        WHERE object_id = ?
+    """, (object_id,))
+    if row is None:
+        row = (0, 0, None, None)
+    types = db.fetchall("""
+        SELECT object_type, file_count, total_bytes
+        FROM project_type_rollup
+        WHERE object_id = ?
+        ORDER BY file_count DESC, object_type
+    """, (object_id,))
+    return {
+        'file_count': row[0],
+        'total_bytes': row[1],
+        'min_created_epoch': row[2],
+        'max_modified_epoch': row[3],
+        'types': {object_type: {'file_count': file_count, 'total_bytes': total_bytes}
+                  for object_type, file_count, total_bytes in types}
+    }
+
 def get_project_timestamps_from_fs_storage(db_name: str, object_id: int) -> Tuple[int, int]:
     """
     This function retrieves the minimum created timestamp and the maximum timestamp between created and modified timestamps for a specific object ID in the fs_storage table of a SQLite database.
     It takes the database name and object ID as input and returns a tuple containing the minimum created timestamp and the maximum timestamp.
+    Both are read from the project_rollup table (see get_project_rollup).
 
     Parameters:
     db_name (str): The name of the SQLite database.
     object_id (int): The object ID.
 
     Returns:
-    Tuple[int, int]: A tuple containing the minimum created timestamp and the maximum timestamp.
+    Tuple[int, int]: A tuple containing the minimum created timestamp and the maximum timestamp (as epoch seconds).
     """
-    conn = sqlite3.connect(os.path.join("./data", db_name))
-    cursor = conn.cursor()
+    rollup = get_project_rollup(db_name, object_id)
+    return rollup['min_created_epoch'], rollup['max_modified_epoch']
 
-    cursor.execute(f"""
-        SELECT min(created_timestamp)
-        FROM fs_storage
-        WHERE object_id = '{object_id}'
-    """)
-    min_timestamp = cursor.fetchone()[0]
-
-    cursor.execute(f"""
-        SELECT max(
-            CASE
-                WHEN created_timestamp > modified_timestamp THEN created_timestamp
-                ELSE modified_timestamp
-            END
-        )
-        FROM fs_storage
-        WHERE object_id = '{object_id}'
-    """)
-    max_timestamp = cursor.fetchone()[0]
-
-    conn.close()
-
-    return min_timestamp, max_timestamp
-
-def get_file_stats(file_path: str) -> Dict[str, any]:
+def get_file_stats(file_path: Union[str, FileRecord]) -> Dict[str, any]:
     """
     This function retrieves file statistics such as name, extension, size, creation timestamp, and modification timestamp for a given file path.
-    It takes a file path as input and returns a dictionary containing the file statistics.
+    It takes a file path (or a FileRecord of the crawler, which already carries the stat values) as input and returns a dictionary containing the file statistics.
 
     Parameters:
-    file_path (str): The file path.
+    file_path (Union[str, FileRecord]): The file path or the record of the file.
 
     Returns:
     Dict[str, any]: A dictionary containing the file statistics.
     """
-    file_stats = os.stat(file_path)
+    record = get_file_record(file_path)
+    file_path = record.path
     file_name = file_path
-    file_extension = os.path.splitext(os.path.basename(file_path))[1]
-    if file_extension == '.gz':
-        file_extension = "." + \
-            ".".join(os.path.basename(file_path).split(".")[-2:])
-    file_size = file_stats.st_size
+    file_extension = get_file_extension(file_path)
+    file_size = record.size
     created_timestamp = datetime.datetime.fromtimestamp(
-        file_stats.st_ctime).strftime('%Y-%m-%d %H:%M:%S')
+        record.ctime).strftime('%Y-%m-%d %H:%M:%S')
     modified_timestamp = datetime.datetime.fromtimestamp(
-        file_stats.st_mtime).strftime('%Y-%m-%d %H:%M:%S')
+        record.mtime).strftime('%Y-%m-%d %H:%M:%S')
     return {
         'object_name': file_name,
         'object_type': file_extension,
@@ -1175,6 +1313,132 @@ def get_file_stats(file_path: str) -> Dict[str, any]:
         'source': 'netstore'
     }
 
+def get_fs_file_row(db_name: str, file_path: Union[str, FileRecord], object_id: int, source: str = 'fs_storage') -> Dict[str, any]:
+    """
+    This function retrieves the file statistics of a file as a row of the compact fs_file table.
+    The folder of the file is stored once in the directory table and referenced by its dir_id,
+    the size and the timestamps are stored as integers (bytes and epoch seconds).
+
+    Parameters:
+    db_name (str): The name of the SQLite database.
+    file_path (Union[str, FileRecord]): The file path or the record of the file from the crawler
+        (a plain path is stat'ed, a record already carries the stat values).
+    object_id (int): The object ID of the project the file belongs to.
+    source (str): The source of the file. Default is 'fs_storage'.
+
+    Returns:
+    Dict[str, any]: A dictionary containing the row for the fs_file table.
+    """
+    record = get_file_record(file_path)
+    file_path = record.path
+    file_extension = get_file_extension(file_path)
+    return {
+        'object_id': object_id,
+        'dir_id': get_sync_database(db_name).get_directory_id(os.path.dirname(file_path)),
+        'name': os.path.basename(file_path),
+        'object_type': file_extension,
+        'object_size': record.size,
+        'created_epoch': int(record.ctime),
+        'modified_epoch': int(record.mtime),
+        'source': source
+    }
+
+def get_netstore_project_id(db_name: str, folder: str, project: str, source: str = 'fs_storage') -> int:
+    """
+    This function inserts (or updates) the object row of a netstore project and returns its object ID.
+
+    Parameters:
+    db_name (str): The name of the SQLite database.
+    folder (str): The netstore root folder.
+    project (str): The name of the project folder.
+    source (str): The source of the object row. Default is 'fs_storage'.
+
+    Returns:
+    int: The object ID of the project.
+    """
+    object = {
+        'object_name': project,
+        'object_type': 'Project',
+        'specific_id': os.path.join(folder, project),
+        'user': get_current_username(),
+        'created_timestamp': "",
+        'modified_timestamp': "",
+        'notes': "",
+        'source': source
+    }
+    object_id = insert_dict_to_database_returning_id(db_name, "object", object)
+    if object_id is None:
+        object_id = get_object_id_from_netstore_name(db_name, 'object', project)
+    return object_id
+
+def delete_fs_files(db_name: str, files: Iterable[Union[str, FileRecord]]) -> int:
+    """
+    This function deletes files (e.g. the removed files of an incremental crawl) from the fs_file table.
+
+    Parameters:
+    db_name (str): The name of the SQLite database.
+    files (Iterable[Union[str, FileRecord]]): The paths or records of the files.
+
+    Returns:
+    int: The number of deleted rows.
+    """
+    db = get_sync_database(db_name)
+    rows = [(os.path.dirname(path), os.path.basename(path))
+            for path in (file.path if isinstance(file, FileRecord) else file for file in files)]
+    with db.transaction():
+        # rowcount leaves out the rollup rows written by the fs_file triggers
+        cursor = db.executemany("DELETE FROM fs_file WHERE dir_id = (SELECT dir_id FROM directory WHERE path = ?) AND name = ?", rows)
+        return cursor.rowcount
+
+def move_fs_files(db_name: str, removed_files: Iterable[Union[str, FileRecord]], first_new_fs_id: int,
+                  verbose: int = 0) -> List[Union[str, FileRecord]]:
+    """
+    This function recognises moved and renamed files: a removed file whose stored fingerprint and size match a
+    row inserted by the current run (fs_id >= first_new_fs_id) keeps its row, which is moved to the new path
+    (and project); the new duplicate row is deleted. So the fs_id of a moved file stays the same.
+
+    Parameters:
+    db_name (str): The name of the SQLite database.
+    removed_files (Iterable[Union[str, FileRecord]]): The paths or records of the removed files.
+    first_new_fs_id (int): The first fs_id of the rows inserted by the current run.
+    verbose (int): If set to 1, prints the number of moved files.
+
+    Returns:
+    List[Union[str, FileRecord]]: The removed files that were not moved (to be deleted).
+    """
+    db = get_sync_database(db_name)
+    remaining = []
+    moved = 0
+    with db.transaction():
+        for file in removed_files:
+            path = file.path if isinstance(file, FileRecord) else file
+            old = db.fetchone("""
+                SELECT f.fs_id, f.fingerprint, f.object_size
+                FROM fs_file f
+                JOIN directory d ON d.dir_id = f.dir_id
+                WHERE d.path = ? AND f.name = ? AND f.fingerprint IS NOT NULL""",
+                (os.path.dirname(path), os.path.basename(path)))
+            new = None
+            if old is not None:
+                new = db.fetchone("""
+                    SELECT fs_id, object_id, dir_id, name, object_type, created_epoch, modified_epoch, source
+                    FROM fs_file
+                    WHERE fingerprint = ? AND object_size = ? AND fs_id >= ?
+                    ORDER BY fs_id
+                    LIMIT 1""", (old[1], old[2], first_new_fs_id))
+            if new is None:
+                remaining.append(file)
+                continue
+            db.execute("DELETE FROM fs_file WHERE fs_id = ?", (new[0],))
+            db.execute("""
+                UPDATE fs_file
+                SET object_id = ?, dir_id = ?, name = ?, object_type = ?, created_epoch = ?, modified_epoch = ?, source = ?
+                WHERE fs_id = ?""", (*new[1:], old[0]))
+            moved += 1
+    if verbose and moved:
+        print(f"{moved} moved files recognised by their fingerprint")
+    return remaining
+
 def get_current_username() -> str:
     """
     This function retrieves the current username.
@@ -1450,12 +1714,11 @@ def get_egroupware_data(db_name: str, project_id: int) -> pd.DataFrame:
     Returns:
     pd.DataFrame: A DataFrame containing the egroupware data.
     """
-    conn = sqlite3.connect(os.path.join("./data", db_name))
-    project_registration = pd.read_sql_query(
-        f"SELECT * from project_registration WHERE project_id = {project_id}", conn)
-    project_schedule = pd.read_sql_query(
-        f"SELECT * from project_schedule WHERE project_id = {project_id}", conn)
-    conn.close()
+    with get_sync_database(db_name).reader() as conn:
+        project_registration = pd.read_sql_query(
+            "SELECT * from project_registration WHERE project_id = ?", conn, params=(project_id,))
+        project_schedule = pd.read_sql_query(
+            "SELECT * from project_schedule WHERE project_id = ?", conn, params=(project_id,))
     joined_df = pd.merge(project_registration,
                          project_schedule, on='project_id', how='inner')
     return joined_df
@@ -1478,12 +1741,11 @@ def get_netstore_data(db_name: str, object_id: int, source: str = 'fs_storage')
     Returns:
     pd.DataFrame: A DataFrame containing the netstore data for the specified object ID.
     """
-    conn = sqlite3.connect(os.path.join("./data", db_name))
-    object = pd.read_sql_query(
-        f"SELECT * from object WHERE source = '{source}' and object_id = {object_id}", conn)
-    fs_storage = pd.read_sql_query(
-        f"SELECT * from fs_storage WHERE source = '{source}' and object_id = {object_id}", conn)
-    conn.close()
+    with get_sync_database(db_name).reader() as conn:
+        object = pd.read_sql_query(
+            "SELECT * from object WHERE source = ? and object_id = ?", conn, params=(source, object_id))
+        fs_storage = pd.read_sql_query(
+            "SELECT * from fs_storage WHERE source = ? and object_id = ?", conn, params=(source, object_id))
     joined_df = pd.merge(object, fs_storage, on='object_id', how='inner')
     return joined_df
 
@@ -1543,40 +1805,6 @@ def calculate_binary_overlap(df1, col1, df2, col2, epsilon):
 
     return result
 
-def get_dataframe(df_type, db_name='sync_database.db'):
-    """
-    This function retrieves data from a SQLite database based on the specified data type.
-    It takes a data type and a database name as input and returns a DataFrame containing the retrieved data.
-
-    Parameters:
-    df_type (str): The type of data to retrieve.
-    db_name (str, optional): The name of the SQLite database. Defaults to 'sync_database.db'.
-
-    Returns:
-    pd.DataFrame: A DataFrame containing the retrieved data.
-    """
-    conn = sqlite3.connect(os.path.join("./data", db_name))
-    if df_type == "link-fs_storage":
-        sql = f"SELECT * FROM link WHERE tar_source = 'fs_storage';"
-    if df_type == "link-omero":
-        sql = f"SELECT * FROM link WHERE tar_source = 'omero';"
-    if df_type == "link":
-        sql = f"SELECT * FROM link;"
-    if df_type == "egroupware":
-        sql = f"SELECT * FROM project_registration"
-    if df_type in ["rspace", "fs_storage", "omero"]:
-        sql = f"SELECT * FROM object WHERE source = '{df_type}';"
-
-    # Begin a transaction
-    conn.execute("BEGIN")
-
-    df = pd.read_sql_query(sql, conn)
-
-    # Commit the transaction
-    conn.execute("COMMIT")
-    conn.close()
-    return df
-
 def get_filelist_from_database(tar_id, db_name='sync_database.db'):
     """
     This function retrieves a file list from a SQLite database based on the specified target ID.
@@ -1589,17 +1817,18 @@ def get_filelist_from_database(tar_id, db_name='sync_database.db'):
     Returns:
     pd.DataFrame: A DataFrame containing the file list.
     """
-    conn = sqlite3.connect(os.path.join("./data", db_name))
-    fs = pd.read_sql_query(
-        f"SELECT * from fs_storage WHERE object_id = {tar_id}", conn)
-    obj = pd.read_sql_query(
-        f"SELECT tar_id AS object_id, * from link WHERE tar_id = {tar_id}", conn)
+    with get_sync_database(db_name).reader() as conn:
+        fs = pd.read_sql_query(
+            "SELECT * from fs_storage WHERE object_id = ?", conn, params=(tar_id,))
+        obj = pd.read_sql_query(
+            "SELECT tar_id AS object_id, * from link WHERE tar_id = ?", conn, params=(tar_id,))
 
-    joined_df = pd.merge(fs,
-                         obj, on='object_id', how='inner')
+        joined_df = pd.merge(fs,
+                             obj, on='object_id', how='inner')
 
-    pr = pd.read_sql_query(
-        f"SELECT project_id AS src_id, * from project_registration WHERE project_id = {joined_df['src_id'][0]}", conn)
+        pr = pd.read_sql_query(
+            "SELECT project_id AS src_id, * from project_registration WHERE project_id = ?", conn,
+            params=(int(joined_df['src_id'][0]),))
 
     joined_df = pd.merge(joined_df,
                          pr, on='src_id', how='inner')
@@ -1627,18 +1856,14 @@ def get_link_object_from_id(db_name, table_name, id):
     Returns:
     pd.DataFrame: A DataFrame containing the retrieved data.
     """
-    conn = sqlite3.connect(os.path.join("./data", db_name))
-
     if table_name == "project_registration":
-        sql = f"SELECT * FROM {table_name} WHERE project_id = {id};"
+        sql = f"SELECT * FROM {table_name} WHERE project_id = ?;"
 
     if table_name == "object":
-        sql = f"SELECT * FROM {table_name} WHERE object_id = {id} and source = 'fs_storage';"
+        sql = f"SELECT * FROM {table_name} WHERE object_id = ? and source = 'fs_storage';"
 
-    conn.execute("BEGIN")
-    df = pd.read_sql_query(sql, conn)
-    conn.execute("COMMIT")
-    conn.close()
+    with get_sync_database(db_name).reader() as conn:
+        df = pd.read_sql_query(sql, conn, params=(id,))
     return df
 
 def check_for_omero_entries(db_name, omero_name, object_type):
@@ -1654,14 +1879,10 @@ def check_for_omero_entries(db_name, omero_name, object_type):
     Returns:
     pd.DataFrame: A DataFrame containing the retrieved data.
     """
-    conn = sqlite3.connect(os.path.join("./data", db_name))
-
-    sql = f"SELECT * FROM 'object' WHERE object_name = '{omero_name}' and source = 'omero' and object_type = '{object_type}';"
+    sql = "SELECT * FROM 'object' WHERE object_name = ? and source = 'omero' and object_type = ?;"
 
-    conn.execute("BEGIN")
-    df = pd.read_sql_query(sql, conn)
-    conn.execute("COMMIT")
-    conn.close()
+    with get_sync_database(db_name).reader() as conn:
+        df = pd.read_sql_query(sql, conn, params=(omero_name, object_type))
     return df
 
 def get_dataset_fs_storage_name(db_name, base_path):
@@ -1676,165 +1897,25 @@ def get_dataset_fs_storage_name(db_name, base_path):
     Returns:
     pd.DataFrame: A DataFrame containing the retrieved data.
     """
-    conn = sqlite3.connect(os.path.join("./data", db_name))
+    db = get_sync_database(db_name)
 
-    sql = f"SELECT * FROM fs_storage WHERE object_name LIKE '{base_path}%' and source = 'fs_storage';"
+    # Match the folders first, the fs_storage view would have to build the path of every file
+    sql = """
+        SELECT * FROM fs_storage
+        WHERE fs_id IN (
+            SELECT f.fs_id
+            FROM fs_file f
+            JOIN directory d ON d.dir_id = f.dir_id
+            WHERE d.path LIKE ? AND f.source = 'fs_storage'
+        );"""
 
-    conn.execute("BEGIN")
-    df = pd.read_sql_query(sql, conn)
-    conn.execute("COMMIT")
-    conn.close()
+    with db.reader() as conn:
+        df = pd.read_sql_query(sql, conn, params=(f"{base_path}%",))
 
     if df.empty:
         return None
     return df
 
-def convert_omero_timestamp(timestamp):
-    """
-    This function converts an OMERO timestamp to a standard timestamp format.
-    It takes a timestamp as input and returns the converted timestamp.
-
-    Parameters:
-    timestamp (str): The timestamp to convert.
-
-    Returns:
-    str: The converted timestamp.
-    """
-    return datetime.datetime.strptime(timestamp, "%Y-%m-%dT%H:%M:%S").strftime("%Y-%m-%d %H:%M:%S")
-
-def auto_insert_omero_to_database():
-    """
-    This function automatically inserts OMERO data into a SQLite database.
-    It establishes a connection to the OMERO server, extracts data from projects, datasets, and images,
-    and inserts the data into the database. It also handles tags and removes duplicates.
-    """
-    # Establish a connection to the OMERO server
-    conn = BlitzGateway('inplace', 'omero', host='0.0.0.0', port=4064)
-    conn.connect()
-
-    # Define the database and table names
-    db_name = 'sync_database.db'
-    object_table_name = 'object'
-    tag_table_name = 'tag'
-
-    # Check if the database and tables exist, if not, create them
-    check_db_table(db_name, object_table_name)
-    check_db_table(db_name, tag_table_name)
-
-    # Get all projects from OMERO
-    projects = conn.getObjects("Project")
-
-    # Iterate over each project
-    for project in projects:
-        # Extract project data
-        project_data = {
-            'object_name': project.simpleMarshal()['name'],
-            'object_type': project.simpleMarshal()['type'],
-            'specific_id': project.simpleMarshal()['id'],
-            'user': project.getOwnerOmeName(),
-            'created_timestamp': convert_omero_timestamp(project.creationEventDate().isoformat()),
-            'modified_timestamp': convert_omero_timestamp(project.updateEventDate().isoformat()),
-            'notes': "",
-            'source': 'omero'
-        }
-        # Insert project data into the database
-        insert_dict_to_database(db_name, object_table_name, project_data)
-
-        # Iterate over each tag in the project and add it to the database
-        for tag_entry in project.listAnnotations():
-            # Extract and process tag data
-            trans_note = get_cleaned_tag_string(tag_entry.getValue())
-            trans_note = convert_abbreviation(trans_note)
-            tag_data = {
-                'object_id': project.simpleMarshal()['id'],
-                'object_type': project.simpleMarshal()['type'],
-                'tag_name': tag_entry.getValue(),
-                'translated_tag_name': trans_note,
-                'created_timestamp': convert_omero_timestamp(tag_entry.creationEventDate().isoformat()),
-                'modified_timestamp': convert_omero_timestamp(tag_entry.creationEventDate().isoformat()),
-                'used': 1,
-                'description': get_tag_description(trans_note),
-                'source': 'omero'
-            }
-            # Insert tag data into the database
-            insert_dict_to_database(db_name, tag_table_name, tag_data)
-
-        # Iterate over each dataset in the project
-        for dataset in project.listChildren():
-            # Extract dataset data
-            dataset_data = {
-                'object_name': dataset.simpleMarshal()['name'],
-                'object_type': dataset.simpleMarshal()['type'],
-                'specific_id': dataset.simpleMarshal()['id'],
-                'user': dataset.getOwnerOmeName(),
-                'created_timestamp': convert_omero_timestamp(dataset.creationEventDate().isoformat()),
-                'modified_timestamp': convert_omero_timestamp(dataset.updateEventDate().isoformat()),
-                'notes': dataset.simpleMarshal()['description'],
-                'source': 'omero'
-            }
-            # Insert dataset data into the database
-            insert_dict_to_database(db_name, object_table_name, dataset_data)
-
-            # Iterate over each tag in the dataset and add it to the database
-            for tag_entry in dataset.listAnnotations():
-                # Extract and process tag data
-                trans_note = get_cleaned_tag_string(tag_entry.getValue())
-                trans_note = convert_abbreviation(trans_note)
-                tag_data = {
-                    'object_id': dataset.simpleMarshal()['id'],
-                    'object_type': dataset.simpleMarshal()['type'],
-                    'tag_name': tag_entry.getValue(),
-                    'translated_tag_name': trans_note,
-                    'created_timestamp': convert_omero_timestamp(tag_entry.creationEventDate().isoformat()),
-                    'modified_timestamp': convert_omero_timestamp(tag_entry.creationEventDate().isoformat()),
-                    'used': 1,
-                    'description': get_tag_description(trans_note),
-                    'source': 'omero'
-                }
-                # Insert tag data into the database
-                insert_dict_to_database(db_name, tag_table_name, tag_data)
-
-            # Iterate over each image in the dataset
-            for image in dataset.listChildren():
-                # Extract image data
-                image_data = {
-                    'object_name': image.simpleMarshal()['name'],
-                    'object_type': image.simpleMarshal()['type'],
-                    'specific_id': image.simpleMarshal()['id'],
-                    'user': image.getOwnerOmeName(),
-                    'created_timestamp': convert_omero_timestamp(image.creationEventDate().isoformat()),
-                    'modified_timestamp': convert_omero_timestamp(image.updateEventDate().isoformat()),
-                    'notes': image.simpleMarshal()['description'],
-                    'source': 'omero'
-                }
-                # Insert image data into the database
-                insert_dict_to_database(db_name, object_table_name, image_data)
-
-                # Iterate over each tag in the image and add it to the database
-                for tag_entry in image.listAnnotations():
-                    # Extract and process tag data
-                    trans_note = get_cleaned_tag_string(tag_entry.getValue())
-                    trans_note = convert_abbreviation(trans_note)
-                    tag_data = {
-                        'object_id': image.simpleMarshal()['id'],
-                        'object_type': image.simpleMarshal()['type'],
-                        'tag_name': tag_entry.getValue(),
-                        'translated_tag_name': trans_note,
-                        'created_timestamp': convert_omero_timestamp(tag_entry.creationEventDate().isoformat()),
-                        'modified_timestamp': convert_omero_timestamp(tag_entry.creationEventDate().isoformat()),
-                        'used': 1,
-                        'description': get_tag_description(trans_note),
-                        'source': 'omero'
-                    }
-                    # Insert tag data into the database
-                    insert_dict_to_database(db_name, tag_table_name, tag_data)
-    conn.close()
-    # Remove duplicate objects and tags from the database
-    delete_duplicate_objects()
-    delete_duplicate_tags()
-    delete_duplicate_links()
-
-
 import sqlite3
 import os
 import pandas as pd
@@ -1854,17 +1935,10 @@ def get_tags_from_id(db_name, id, df_type='fs_storage'):
     Returns:
     df (DataFrame): A pandas DataFrame containing the tag data.
     """
-    conn = sqlite3.connect(os.path.join("./data", db_name))
-    sql = f"SELECT * FROM tag WHERE object_id = {id} and source = '{df_type}';"
+    sql = "SELECT * FROM tag WHERE object_id = ? and source = ?;"
 
-    # Begin a transaction
-    conn.execute("BEGIN")
-
-    df = pd.read_sql_query(sql, conn)
-
-    # Commit the transaction
-    conn.execute("COMMIT")
-    conn.close()
+    with get_sync_database(db_name).reader() as conn:
+        df = pd.read_sql_query(sql, conn, params=(id, df_type))
     return df
 
 def get_file_stats(file_path):
@@ -1872,25 +1946,23 @@ def get_file_stats(file_path):
     This function retrieves file statistics such as name, extension, size, creation and modification timestamps.
 
     Parameters:
-    file_path (str): The path of the file.
+    file_path (str or FileRecord): The path of the file or its record from the crawler (which already carries the stats).
 
     Returns:
     dict: A dictionary containing the file statistics.
     """
     # Get file stats
-    file_stats = os.stat(file_path)
+    record = get_file_record(file_path)
+    file_path = record.path
 
     # Extract required stats
     file_name = file_path
-    file_extension = os.path.splitext(os.path.basename(file_path))[1]
-    if file_extension == '.gz':
-        file_extension = "." + \
-            ".".join(os.path.basename(file_path).split(".")[-2:])
-    file_size = file_stats.st_size
+    file_extension = get_file_extension(file_path)
+    file_size = record.size
     created_timestamp = datetime.datetime.fromtimestamp(
-        file_stats.st_ctime).strftime('%Y-%m-%d %H:%M:%S')
+        record.ctime).strftime('%Y-%m-%d %H:%M:%S')
     modified_timestamp = datetime.datetime.fromtimestamp(
-        file_stats.st_mtime).strftime('%Y-%m-%d %H:%M:%S')
+        record.mtime).strftime('%Y-%m-%d %H:%M:%S')
 
     # Return stats as a dictionary
     return {
@@ -1911,74 +1983,158 @@ def get_current_username():
     """
     return getpass.getuser()
 
-def auto_insert_fs_storage_to_database():
+def auto_insert_fs_storage_to_database(full=False, fingerprints=False):
     """
     This function automatically inserts file storage data into the database.
-    It retrieves project list and file dictionary from a netstore, then iterates over each project.
-    For each project, it inserts object data into the database and retrieves the object id.
-    Then, it iterates over each file in the project, retrieves file stats, and inserts them into the fs_storage table.
-    It also extracts tags from the file path, cleans and converts them, and inserts them into the tag table.
-    Finally, it removes duplicate objects and tags from the database.
+    It crawls the netstore incrementally (see IncrementalCrawl in src.io_crawler): only directories that changed
+    since the last run are listed, and only the added, changed and removed files are written.
+    For every project with changes, it inserts object data into the database and retrieves the object id.
+    The stats of the added and changed files are written to the fs_file table (read through the fs_storage view),
+    removed files are deleted from it.
+    It also extracts tags from the paths of the added and changed files, cleans and converts them, and inserts them into the tag table.
+    Duplicate objects and tags are not written, the inserts update rows on their natural key.
+
+    Parameters:
+    full (bool): If True, every directory is listed (finds files that were rewritten in place). Default is False.
+    fingerprints (bool): If True, store content fingerprints and move the rows of moved files (see move_fs_files). Default is False.
     """
-    project_list, file_dict = get_netstore_filelist()
     folder = "/home/omero-import"
     db_name = 'sync_database.db'
     check_db_table(db_name, "fs_storage")
     print(get_current_username())
 
-    for proj in project_list:
-        object = {
-            'object_name': proj,
-            'object_type': 'Project',
-            'specific_id': os.path.join(folder, proj),
-            'user': get_current_username(),
-            'created_timestamp': "",
-            'modified_timestamp': "",
-            'notes': "",
-            'source': 'fs_storage'
-        }
+    # Only the directories that changed since the last run are listed (see IncrementalCrawl in src.io_crawler),
+    # junk folders of the rules file (e.g. .git, __pycache__) are pruned before they are listed
+    rules = get_crawl_rules()
+    crawl = IncrementalCrawl(db_name, folder, full=full, rules=rules)
+    insert_crawl_changes(db_name, folder, crawl, source='fs_storage', fingerprints=fingerprints)
+    print("netstore crawl:", dict(crawl.stats))
+    if rules is not None:
+        print("pruned by rule:", dict(rules.counts))
+
+def insert_crawl_changes(db_name: str, folder: str, crawl: IncrementalCrawl, dirty: Optional[Iterable[str]] = None,
+                         source: str = 'fs_storage', fingerprints: bool = False, verbose: int = 0) -> None:
+    """
+    This function writes the changes of an incremental crawl of the netstore into the database:
+    the stats of the added and changed files go to the fs_file table (with the object row of their project),
+    removed files are deleted from it, and the path tags of the added and changed files are inserted per project.
+    With fingerprints, the added and changed files are fingerprinted in a process pool and a removed file whose
+    fingerprint shows up at a new path is moved (see move_fs_files) instead of being deleted and added again.
+    The project rollups are updated by the database on every change; their time spans and the timestamps of the
+    project rows are finished at the end (see refresh_project_rollups).
+    The crawl state is stored last, so an interrupted run lists the same directories again.
+
+    Parameters:
+    db_name (str): The name of the SQLite database.
+    folder (str): The netstore root folder (the projects are the folders directly below it).
+    crawl (IncrementalCrawl): The crawl of the folder.
+    dirty (Iterable[str]): Only crawl these directories (see IncrementalCrawl.changes). Default is None (the whole folder).
+    source (str): The source of the fs_file rows. Default is 'fs_storage'.
+    fingerprints (bool): If True, store content fingerprints and detect moved files. Default is False.
+    verbose (int): If set to 1, prints the number of moved files.
+    """
+    db = get_sync_database(db_name)
+    project_ids = {}
+    # added/changed paths per project for the path tags, and the removed files
+    project_files = collections.defaultdict(list)
+    removed_files = []
+    # rows inserted by this run have a larger fs_id (AUTOINCREMENT), only they can be the new place of a moved file
+    first_new_fs_id = db.fetchone("SELECT COALESCE(MAX(fs_id), 0) + 1 FROM fs_file")[0]
+
+    def file_records():
+        for change in crawl.changes(dirty):
+            if change.status == 'removed':
+                removed_files.append(change.record)
+                continue
+            yield change.record
+
+    def fs_rows():
+        records = file_records()
+        for record, fingerprint in iter_fingerprints(records) if fingerprints else ((record, None) for record in records):
+            proj = get_project_name(record.path, folder)
+            if proj not in project_ids:
+                project_ids[proj] = get_netstore_project_id(db_name, folder, proj, source='fs_storage')
+            project_files[proj].append(record.path)
+            row = get_fs_file_row(db_name, record, project_ids[proj], source=source)
+            if fingerprint is not None:
+                row['fingerprint'] = fingerprint
+            yield row
+
+    # Stream the file stats of the changed files into the database (one transaction per chunk)
+    insert_many_to_database(db_name, "fs_file", fs_rows())
+    if fingerprints:
+        removed_files = move_fs_files(db_name, removed_files, first_new_fs_id, verbose=verbose)
+    delete_fs_files(db_name, removed_files)
+    for proj, files in project_files.items():
+        insert_many_to_database(db_name, "tag", get_netstore_tag_rows(files, project_ids[proj], folder))
+    refresh_project_rollups(db)
+    crawl.save_state()
+
+class FsStorageSink(CrawlSink):
+    """
+    A sink for run_crawl (see src.io_crawler) that writes the files to the fs_file table (fs_storage view)
+    with the object row of their project and the path tags of every batch, like the netstore ingest.
+
+    Parameters:
+    db_name (str): The name of the SQLite database.
+    folder (str): The root folder of the crawl (the projects are the folders directly below it).
+    source (str): The source of the fs_file rows. Default is 'fs_storage'.
+    """
+
+    def __init__(self, db_name: str, folder: str, source: str = 'fs_storage'):
+        check_db_table(db_name, "fs_storage")
+        self.db_name = db_name
+        self.folder = folder
+        self.source = source
+        self.project_ids = {}
+
+    def write(self, records: List[FileRecord]) -> None:
+        project_files = collections.defaultdict(list)
+        for record in records:
+            project_files[get_project_name(record.path, self.folder)].append(record)
+        for proj, files in project_files.items():
+            if proj not in self.project_ids:
+                self.project_ids[proj] = get_netstore_project_id(self.db_name, self.folder, proj, source='fs_storage')
+            object_id = self.project_ids[proj]
+            insert_many_to_database(self.db_name, "fs_file",
+                                    (get_fs_file_row(self.db_name, file, object_id, source=self.source) for file in files))
+            insert_many_to_database(self.db_name, "tag",
+                                    get_netstore_tag_rows((file.path for file in files), object_id, self.folder))
+
+    def close(self) -> None:
+        refresh_project_rollups(self.db_name)
+
+def watch_netstore_to_database(db_name: str = 'sync_database.db', folder: str = "/home/omero-import",
+                               quiet: float = 2.0, max_delay: float = 30.0, source: str = 'fs_storage',
+                               fingerprints: bool = False, rules: Optional[CrawlRules] = None, verbose: int = 1) -> None:
+    """
+    This function keeps the fs_file table in sync with the netstore until it is interrupted.
+    It watches the folder with inotify (see src.io_watch), catches up with an incremental crawl of the whole folder
+    and then crawls only the directories of every debounced batch of events, so new files are in the database
+    (and can be linked) a few seconds after they are written.
 
-        insert_dict_to_database(db_name, "object", object)
-        object_id = get_object_id_from_netstore_name(db_name, 'object', proj)
-
-        # if object_id > 921: break ##testcase
-
-        tags = []
-        for file in file_dict[proj]:
-            tmp = get_file_stats(file)
-            tmp['object_id'] = object_id
-            insert_dict_to_database(db_name, "fs_storage", tmp)
-
-            # get the tags and insert it into the taglist
-            l = file[file.find(folder)+len(folder):]
-            sep = r"/|-|_|\.|,"
-            tags += re.split(sep, l)
-            # try to find the possible relevant tags (TODO: create a dictionary to white/black list tags)
-            tags = get_possible_tags_list(tags)
-            for tag in tags:
-                trans_note = get_cleaned_tag_string(tag)
-                trans_note = convert_abbreviation(trans_note)
-                tag_data = {
-                    'object_id': object_id,
-                    'object_type': "",
-                    'tag_name': tag,
-                    'translated_tag_name': trans_note,
-                    'created_timestamp': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    'modified_timestamp': "",
-                    'used': 1,
-                    'description': get_tag_description(trans_note),
-                    'source': 'fs_storage'
-                }
-                # Insert tag data into the database
-                insert_dict_to_database(db_name, "tag", tag_data)
-
-                ###############
-                # get min/max timestamp for files in fs_storage table
-                # (min_timestamp, max_timestamp) = get_project_timestamps_from_fs_storage(db_name, object_id)
-                ###############
-    # Remove duplicate objects and tags from the database
-    delete_duplicate_objects()
-    delete_duplicate_tags()
+    Parameters:
+    db_name (str): The name of the SQLite database. Default is 'sync_database.db'.
+    folder (str): The netstore root folder. Default is '/home/omero-import'.
+    quiet (float): The seconds without events that close a batch. Default is 2.0.
+    max_delay (float): The maximum age of a batch in seconds. Default is 30.0.
+    source (str): The source of the fs_file rows. Default is 'fs_storage'.
+    fingerprints (bool): If True, store content fingerprints and detect moved files. Default is False.
+    rules (CrawlRules): The include/exclude rules; pruned directories are neither crawled nor watched. Default is None.
+    verbose (int): If set to 1, prints the changes of every batch.
+    """
+    check_db_table(db_name, "fs_storage")
+    crawl = IncrementalCrawl(db_name, folder, rules=rules)
+    # start watching before the catch-up crawl, so no change falls between the two
+    watcher = InotifyWatcher(folder, rules=rules)
+    insert_crawl_changes(db_name, folder, crawl, source=source, fingerprints=fingerprints, verbose=verbose)
+    if verbose:
+        print("netstore catch-up crawl:", dict(crawl.stats))
+    for dirty in watch_batches(folder, quiet, max_delay, watcher=watcher):
+        insert_crawl_changes(db_name, folder, crawl, dirty=dirty, source=source, fingerprints=fingerprints,
+                             verbose=verbose)
+        if verbose:
+            print(f"netstore batch of {len(dirty)} directories:", dict(crawl.stats))
 
 def convert_omero_timestamp(timestamp):
     """
@@ -1992,6 +2148,80 @@ def convert_omero_timestamp(timestamp):
     """
     return datetime.datetime.strptime(timestamp, "%Y-%m-%dT%H:%M:%S").strftime("%Y-%m-%d %H:%M:%S")
 
+def get_omero_object_row(omero_object, notes=None):
+    """
+    This function extracts the object table row of an OMERO project, dataset or image.
+
+    Parameters:
+    omero_object (object): The OMERO object wrapper.
+    notes (str): The notes of the row. Default is the description of the OMERO object.
+
+    Returns:
+    dict: The row for the object table.
+    """
+    marshal = omero_object.simpleMarshal()
+    return {
+        'object_name': marshal['name'],
+        'object_type': marshal['type'],
+        'specific_id': marshal['id'],
+        'user': omero_object.getOwnerOmeName(),
+        'created_timestamp': convert_omero_timestamp(omero_object.creationEventDate().isoformat()),
+        'modified_timestamp': convert_omero_timestamp(omero_object.updateEventDate().isoformat()),
+        'notes': marshal['description'] if notes is None else notes,
+        'source': 'omero'
+    }
+
+def get_omero_tag_rows(omero_object):
+    """
+    This function extracts the tag table rows of all annotations of an OMERO project, dataset or image.
+
+    Parameters:
+    omero_object (object): The OMERO object wrapper.
+
+    Returns:
+    list: The rows for the tag table.
+    """
+    marshal = omero_object.simpleMarshal()
+    tag_rows = []
+    for tag_entry in omero_object.listAnnotations():
+        # Extract and process tag data
+        trans_note = get_cleaned_tag_string(tag_entry.getValue())
+        trans_note = convert_abbreviation(trans_note)
+        tag_rows.append({
+            'object_id': marshal['id'],
+            'object_type': marshal['type'],
+            'tag_name': tag_entry.getValue(),
+            'translated_tag_name': trans_note,
+            'created_timestamp': convert_omero_timestamp(tag_entry.creationEventDate().isoformat()),
+            'modified_timestamp': convert_omero_timestamp(tag_entry.creationEventDate().isoformat()),
+            'used': 1,
+            'description': get_tag_description(trans_note),
+            'source': 'omero'
+        })
+    return tag_rows
+
+def get_omero_project_rows(project):
+    """
+    This function walks an OMERO project with its datasets and images and collects their object and tag rows.
+
+    Parameters:
+    project (object): The OMERO project wrapper.
+
+    Returns:
+    tuple: The rows for the object table and the rows for the tag table.
+    """
+    object_rows = [get_omero_object_row(project, notes="")]
+    tag_rows = get_omero_tag_rows(project)
+    # Iterate over each dataset in the project
+    for dataset in project.listChildren():
+        object_rows.append(get_omero_object_row(dataset))
+        tag_rows += get_omero_tag_rows(dataset)
+        # Iterate over each image in the dataset
+        for image in dataset.listChildren():
+            object_rows.append(get_omero_object_row(image))
+            tag_rows += get_omero_tag_rows(image)
+    return object_rows, tag_rows
+
 def auto_insert_omero_to_database():
     """
     This function automatically inserts OMERO data into the database.
@@ -2002,7 +2232,7 @@ def auto_insert_omero_to_database():
     and iterates over each tag in the dataset, extracting and processing tag data and inserting it into the database.
     It then iterates over each image in the dataset, extracts image data, inserts it into the database,
     and iterates over each tag in the image, extracting and processing tag data and inserting it into the database.
-    Finally, it removes duplicate objects and tags from the database.
+    Duplicate objects and tags are not written, the inserts update rows on their natural key.
     """
     # Establish a connection to the OMERO server
     conn = BlitzGateway('inplace', 'omero', host='0.0.0.0', port=4064)
@@ -2022,112 +2252,12 @@ def auto_insert_omero_to_database():
 
     # Iterate over each project
     for project in projects:
-        # Extract project data
-        project_data = {
-            'object_name': project.simpleMarshal()['name'],
-            'object_type': project.simpleMarshal()['type'],
-            'specific_id': project.simpleMarshal()['id'],
-            'user': project.getOwnerOmeName(),
-            'created_timestamp': convert_omero_timestamp(project.creationEventDate().isoformat()),
-            'modified_timestamp': convert_omero_timestamp(project.updateEventDate().isoformat()),
-            'notes': "",
-            'source': 'omero'
-        }
-        # Insert project data into the database
-        insert_dict_to_database(db_name, object_table_name, project_data)
-
-        # Iterate over each tag in the project and add it to the database
-        for tag_entry in project.listAnnotations():
-            # Extract and process tag data
-            trans_note = get_cleaned_tag_string(tag_entry.getValue())
-            trans_note = convert_abbreviation(trans_note)
-            tag_data = {
-                'object_id': project.simpleMarshal()['id'],
-                'object_type': project.simpleMarshal()['type'],
-                'tag_name': tag_entry.getValue(),
-                'translated_tag_name': trans_note,
-                'created_timestamp': convert_omero_timestamp(tag_entry.creationEventDate().isoformat()),
-                'modified_timestamp': convert_omero_timestamp(tag_entry.creationEventDate().isoformat()),
-                'used': 1,
-                'description': get_tag_description(trans_note),
-                'source': 'omero'
-            }
-            # Insert tag data into the database
-            insert_dict_to_database(db_name, tag_table_name, tag_data)
-
-        # Iterate over each dataset in the project
-        for dataset in project.listChildren():
-            # Extract dataset data
-            dataset_data = {
-                'object_name': dataset.simpleMarshal()['name'],
-                'object_type': dataset.simpleMarshal()['type'],
-                'specific_id': dataset.simpleMarshal()['id'],
-                'user': dataset.getOwnerOmeName(),
-                'created_timestamp': convert_omero_timestamp(dataset.creationEventDate().isoformat()),
-                'modified_timestamp': convert_omero_timestamp(dataset.updateEventDate().isoformat()),
-                'notes': dataset.simpleMarshal()['description'],
-                'source': 'omero'
-            }
-            # Insert dataset data into the database
-            insert_dict_to_database(db_name, object_table_name, dataset_data)
-
-            # Iterate over each tag in the dataset and add it to the database
-            for tag_entry in dataset.listAnnotations():
-                # Extract and process tag data
-                trans_note = get_cleaned_tag_string(tag_entry.getValue())
-                trans_note = convert_abbreviation(trans_note)
-                tag_data = {
-                    'object_id': dataset.simpleMarshal()['id'],
-                    'object_type': dataset.simpleMarshal()['type'],
-                    'tag_name': tag_entry.getValue(),
-                    'translated_tag_name': trans_note,
-                    'created_timestamp': convert_omero_timestamp(tag_entry.creationEventDate().isoformat()),
-                    'modified_timestamp': convert_omero_timestamp(tag_entry.creationEventDate().isoformat()),
-                    'used': 1,
-                    'description': get_tag_description(trans_note),
-                    'source': 'omero'
-                }
-                # Insert tag data into the database
-                insert_dict_to_database(db_name, tag_table_name, tag_data)
-
-            # Iterate over each image in the dataset
-            for image in dataset.listChildren():
-                # Extract image data
-                image_data = {
-                    'object_name': image.simpleMarshal()['name'],
-                    'object_type': image.simpleMarshal()['type'],
-                    'specific_id': image.simpleMarshal()['id'],
-                    'user': image.getOwnerOmeName(),
-                    'created_timestamp': convert_omero_timestamp(image.creationEventDate().isoformat()),
-                    'modified_timestamp': convert_omero_timestamp(image.updateEventDate().isoformat()),
-                    'notes': image.simpleMarshal()['description'],
-                    'source': 'omero'
-                }
-                # Insert image data into the database
-                insert_dict_to_database(db_name, object_table_name, image_data)
-
-                # Iterate over each tag in the image and add it to the database
-                for tag_entry in image.listAnnotations():
-                    # Extract and process tag data
-                    trans_note = get_cleaned_tag_string(tag_entry.getValue())
-                    trans_note = convert_abbreviation(trans_note)
-                    tag_data = {
-                        'object_id': image.simpleMarshal()['id'],
-                        'object_type': image.simpleMarshal()['type'],
-                        'tag_name': tag_entry.getValue(),
-                        'translated_tag_name': trans_note,
-                        'created_timestamp': convert_omero_timestamp(tag_entry.creationEventDate().isoformat()),
-                        'modified_timestamp': convert_omero_timestamp(tag_entry.creationEventDate().isoformat()),
-                        'used': 1,
-                        'description': get_tag_description(trans_note),
-                        'source': 'omero'
-                    }
-                    # Insert tag data into the database
-                    insert_dict_to_database(db_name, tag_table_name, tag_data)
-
-    # Remove duplicate objects and tags from the database
-    delete_duplicate_objects()
-    delete_duplicate_tags()
+        # Collect the project, its datasets, images and all of their tags
+        object_rows, tag_rows = get_omero_project_rows(project)
+        # Insert the rows of the whole project tree in batches
+        insert_many_to_database(db_name, object_table_name, object_rows)
+        insert_many_to_database(db_name, tag_table_name, tag_rows)
+
     conn.close()
     return 0
 
@@ -2154,6 +2284,7 @@ def process_rspace_documents(documents, db_name, table_name):
     """
     check_db_table(db_name, table_name)
 
+    new_documents = []
     for doc in documents['documents']:
         notes = []
         if doc.get('tags'):
@@ -2177,9 +2308,14 @@ def process_rspace_documents(documents, db_name, table_name):
 
         if check_if_entry_exists(db_name, table_name, object_document):
             continue
+        new_documents.append((doc, object_document))
 
-        insert_dict_to_database(db_name, table_name, object_document)
-        process_tags(db_name, table_name, doc, object_document)
+    # Insert the new entries in one batch, then stream their tags
+    insert_many_to_database(db_name, table_name,
+                            [object_document for doc, object_document in new_documents])
+    get_sync_database(db_name).load_object_ids('rspace', [doc['globalId'] for doc, object_document in new_documents])
+    insert_many_to_database(db_name, 'tag', itertools.chain.from_iterable(
+        get_rspace_tag_rows(db_name, table_name, doc, object_document) for doc, object_document in new_documents))
 
 
 def process_rspace_folder(folder, db_name, table_name):
@@ -2193,6 +2329,7 @@ def process_rspace_folder(folder, db_name, table_name):
     """
     check_db_table(db_name, table_name)
 
+    new_documents = []
     for doc in folder['records']:
         notes = []
         if doc.get('tags'):
@@ -2216,23 +2353,30 @@ def process_rspace_folder(folder, db_name, table_name):
 
         if check_if_entry_exists(db_name, table_name, object_document):
             continue
+        new_documents.append((doc, object_document))
 
-        insert_dict_to_database(db_name, table_name, object_document)
-        process_tags(db_name, table_name, doc, object_document)
+    # Insert the new entries in one batch, then stream their tags
+    insert_many_to_database(db_name, table_name,
+                            [object_document for doc, object_document in new_documents])
+    get_sync_database(db_name).load_object_ids('rspace', [doc['globalId'] for doc, object_document in new_documents])
+    insert_many_to_database(db_name, 'tag', itertools.chain.from_iterable(
+        get_rspace_tag_rows(db_name, table_name, doc, object_document) for doc, object_document in new_documents))
 
-def process_tags(db_name, table_name, doc, object_document):
+def get_rspace_tag_rows(db_name, table_name, doc, object_document):
     """
-    Process the tags of an RSpace document and insert them into the database.
+    Yield the tag rows of an RSpace document.
 
     Args:
         db_name (str): The name of the database.
-        table_name (str): The name of the table to insert the tags into.
+        table_name (str): The name of the object table that holds the document.
         doc (dict): The RSpace document.
         object_document (dict): The object document corresponding to the RSpace document.
+
+    Yields:
+        dict: A row for the tag table.
     """
     object_id = get_object_id_from_specific_id(
-        db_name, table_name, doc['globalId'])
-    table_name = 'tag'
+        db_name, table_name, doc['globalId'], source='rspace')
     notes = object_document['notes'].split(";")
 
     for note in notes:
@@ -2244,6 +2388,7 @@ def process_tags(db_name, table_name, doc, object_document):
 
         tag = {
             'object_id': object_id,
+            'object_type': "",
             'tag_name': note,
             'translated_tag_name': trans_note,
             'created_timestamp': convert_rspace_timestamp(doc['created']),
@@ -2253,7 +2398,19 @@ def process_tags(db_name, table_name, doc, object_document):
             'source': 'rspace'
         }
 
-        insert_dict_to_database(db_name, table_name, tag)
+        yield tag
+
+def process_tags(db_name, table_name, doc, object_document):
+    """
+    Process the tags of an RSpace document and insert them into the database.
+
+    Args:
+        db_name (str): The name of the database.
+        table_name (str): The name of the object table that holds the document.
+        doc (dict): The RSpace document.
+        object_document (dict): The object document corresponding to the RSpace document.
+    """
+    insert_many_to_database(db_name, 'tag', get_rspace_tag_rows(db_name, table_name, doc, object_document))
 
 def get_rspace_workspace_folders(sampleParameter, elnName='rspace'):
     """
@@ -2295,13 +2452,13 @@ def insert_egroupware(verbose=0):
     db_name = 'sync_database.db'
     table_name = 'project_registration'
     check_db_table(db_name, table_name)
+    db = get_sync_database(db_name)
     # loop runs over all projects in egroupware
     for c in contents:
         # take only HBI projects TODO: what about the other projects?
         if c['pm_group'] != "HBI":
             continue
-        # insert every project registration into the database
-        table_name = 'project_registration'
+        # collect the project registration
         # split project_name & user from pm_title field
         project_name, user = get_project_user_tuple(c['pm_title'])
         user = user if user else ""
@@ -2321,14 +2478,13 @@ def insert_egroupware(verbose=0):
                                 'resources': resources}
         if verbose:
             print(project_registration)
-        insert_dict_to_database(db_name, table_name, project_registration)
         #####################################################################
-        # insert every schedule for each project into the database
-        table_name = 'project_schedule'
+        # collect every schedule of the project
         # take it from egroupware
         url = f"https://egroupware.lin-magdeburg.de/abrechnung/api/measurements.php?start=NaN&end=NaN&hrstol=48&project={c['pm_id']}"
         response = requests.get(url)
         response = json.loads(response.text)
+        project_schedules = []
         for r in response:
             # take everything from schedule data that could be used as tag (here: description. name, bemerkung)
             # take care that it works even if something is empty
@@ -2348,9 +2504,14 @@ def insert_egroupware(verbose=0):
                                 'start_timestamp': r['human_cal_start'],
                                 'end_timestamp': r['human_cal_end'],
                                 'notes': notes}
-            insert_dict_to_database(db_name, table_name, project_schedule)
+            project_schedules.append(project_schedule)
             if verbose:
                 print(project_schedule)
+        # the requests are made first, so the write lock is only held for the inserts of the project
+        with db.transaction():
+            insert_dict_to_database(db_name, 'project_registration', project_registration)
+            for project_schedule in project_schedules:
+                insert_dict_to_database(db_name, 'project_schedule', project_schedule)
 
 def create_object(project_name: str, type: str) -> object:
     """
@@ -2699,14 +2860,18 @@ def create_rspace_files_table(header, tar_id, db_name='sync_database.db'):
     conn.close()
     return files
 
-def create_rspace_document_header(egroupware_project_name, fs_storage_project_folder, overlap_ratio):
+def create_rspace_document_header(egroupware_project_name, fs_storage_project_folder, overlap_ratio,
+                                  object_id=None, db_name='sync_database.db'):
     """
     This function creates a header for an RSpace document.
+    With the object ID of the netstore folder, the header also summarises its files (from the project rollup).
 
     Parameters:
     egroupware_project_name (str): The name of the egroupware project.
     fs_storage_project_folder (str): The name of the fs_storage project folder.
     overlap_ratio (float): The overlap ratio.
+    object_id (int): The object ID of the netstore folder. Default is None (no file summary).
+    db_name (str): The name of the SQLite database. Default is 'sync_database.db'.
 
     Returns:
     str: The header.
@@ -2714,6 +2879,17 @@ def create_rspace_document_header(egroupware_project_name, fs_storage_project_fo
     header = f"<p>egroupware_project: {egroupware_project_name}\n</p>"
     header += f"<p>netstore_folder: {fs_storage_project_folder}\n</p>"
     header += f"<p>similarity ratio (egroupware_project; netstore_folder): {overlap_ratio}\n</p>"
+    if object_id is not None:
+        rollup = get_project_rollup(db_name, object_id)
+        if rollup['file_count']:
+            header += f"<p>files: {rollup['file_count']} ({rollup['total_bytes'] / 2**30:.2f} GiB)\n</p>"
+            if rollup['min_created_epoch'] is not None and rollup['max_modified_epoch'] is not None:
+                first = datetime.datetime.fromtimestamp(rollup['min_created_epoch']).strftime('%Y-%m-%d')
+                last = datetime.datetime.fromtimestamp(rollup['max_modified_epoch']).strftime('%Y-%m-%d')
+                header += f"<p>time span: {first} - {last}\n</p>"
+            file_types = ", ".join(f"{object_type or '(none)'}: {counts['file_count']}"
+                                   for object_type, counts in itertools.islice(rollup['types'].items(), 10))
+            header += f"<p>file types: {file_types}\n</p>"
     return header
 
 def generate_html_table(files=get_placeholder_files_for_rspace(), header=""):
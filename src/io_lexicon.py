@@ -0,0 +1,342 @@
+# Standard library imports
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Pattern, Set, Tuple
+
+# Third-party library imports
+import pandas as pd
+
+# folder of the repository, the lexicon files (stopwords.json, ...) are looked up there if they are not found
+# relative to the working directory
+REPOSITORY_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# the stopwords removed from the tags (see StopwordLexicon)
+STOPWORDS_FILE = "stopwords.json"
+# the long forms of the abbreviations in the tags (see AbbreviationExpander)
+ABBREVIATIONS_FILE = "abbreviations.json"
+# the descriptions of the tags (see DescriptionIndex)
+DESCRIPTIONS_FILE = "descriptions.json"
+# seconds between two checks of the modification time of a lexicon file
+LEXICON_CHECK_INTERVAL = 2.0
+
+
+def get_lexicon_path(source: str) -> str:
+    """
+    This function resolves the path of a lexicon file. A relative path is taken from the working directory if
+    the file exists there, otherwise from the repository folder, so the scripts also work outside of it.
+
+    Parameters:
+    source (str): The name or path of the file.
+
+    Returns:
+    str: The absolute path of the file.
+    """
+    if os.path.isabs(source) or os.path.exists(source):
+        return os.path.abspath(source)
+    return os.path.join(REPOSITORY_FOLDER, source)
+
+
+class LexiconFile:
+    """
+    A JSON file that is parsed once and kept in memory. The file is parsed again only when its modification time
+    changes, which is checked at most every check_interval seconds, so a lexicon can be edited while an ingest runs.
+    Subclasses turn the JSON data into their lookup structure in build().
+
+    Parameters:
+    source (str): The path of the JSON file (see get_lexicon_path).
+    check_interval (float): The seconds between two checks of the modification time.
+    """
+
+    def __init__(self, source: str, check_interval: float = LEXICON_CHECK_INTERVAL):
+        self.path = get_lexicon_path(source)
+        self.check_interval = check_interval
+        self.loads = 0
+        self._mtime: Optional[float] = None
+        self._checked = 0.0
+        self._value: Any = None
+        self._lock = threading.Lock()
+
+    def build(self, data: Any) -> Any:
+        """
+        This function turns the parsed JSON data into the value returned by get(); the data itself by default.
+        """
+        return data
+
+    def get(self) -> Any:
+        """
+        This function returns the value built from the file, parsing the file again if it changed.
+        """
+        now = time.monotonic()
+        if self._value is not None and now - self._checked < self.check_interval:
+            return self._value
+        with self._lock:
+            mtime = os.stat(self.path).st_mtime
+            if self._value is None or mtime != self._mtime:
+                with open(self.path) as f:
+                    self._value = self.build(json.load(f))
+                self._mtime = mtime
+                self.loads += 1
+            self._checked = now
+            return self._value
+
+
+class StopwordLexicon(LexiconFile):
+    """
+    The stopwords of the 'stopwords' list of a JSON file as a frozenset of case-folded words, so a word is looked
+    up in constant time. The number of lookups and of stopwords found are kept for statistics().
+    """
+
+    def __init__(self, source: str = STOPWORDS_FILE, check_interval: float = LEXICON_CHECK_INTERVAL):
+        super().__init__(source, check_interval)
+        self.lookups = 0
+        self.hits = 0
+
+    def build(self, data: Dict[str, List[str]]) -> FrozenSet[str]:
+        return frozenset(word.casefold() for word in data['stopwords'])
+
+    @property
+    def words(self) -> FrozenSet[str]:
+        return self.get()
+
+    def is_stopword(self, word: str) -> bool:
+        """
+        This function returns True if the word (in any case) is a stopword.
+        """
+        hit = word.casefold() in self.get()
+        self.lookups += 1
+        self.hits += hit
+        return hit
+
+    def filter(self, words: Iterable[str]) -> List[str]:
+        """
+        This function returns the words that are not stopwords, in their order.
+        """
+        stopwords = self.get()
+        words = list(words)
+        kept = [word for word in words if word.casefold() not in stopwords]
+        # the counters are updated once per call, not per word
+        self.lookups += len(words)
+        self.hits += len(words) - len(kept)
+        return kept
+
+    def remove(self, text: str) -> str:
+        """
+        This function removes the stopwords from a text and joins the remaining words with single spaces.
+        """
+        return ' '.join(self.filter(text.split()))
+
+    def statistics(self) -> Dict[str, Any]:
+        """
+        This function returns the number of words, loads of the file, lookups and hits (stopwords found).
+        """
+        return {'words': len(self.words), 'loads': self.loads, 'lookups': self.lookups, 'hits': self.hits,
+                'hit_rate': self.hits / self.lookups if self.lookups else 0.0}
+
+
+class AbbreviationExpander(LexiconFile):
+    """
+    The abbreviations of a JSON file ({"abbreviation": "long form", ...}) compiled into one alternation regex, so a
+    text is expanded in a single pass instead of one replace per abbreviation.
+
+    The alternatives are ordered from the longest to the shortest abbreviation, so at every position the longest
+    abbreviation wins (e.g. '9.4T' before '3T', 'experiment' before 'exp'), and an expansion is never expanded
+    again. Abbreviations match case-sensitively and only as whole words: they may not be preceded or followed by a
+    letter or digit, so 'log' is expanded in 'log;data' but not in 'catalog'.
+    """
+
+    def __init__(self, source: str = ABBREVIATIONS_FILE, check_interval: float = LEXICON_CHECK_INTERVAL):
+        super().__init__(source, check_interval)
+
+    def build(self, data: Dict[str, str]) -> Tuple[Dict[str, str], Optional[Pattern]]:
+        if not data:
+            return data, None
+        keys = sorted(data, key=lambda key: (-len(key), key))
+        pattern = re.compile(r'(?<![^\W_])(?:' + '|'.join(re.escape(key) for key in keys) + r')(?![^\W_])')
+        return data, pattern
+
+    @property
+    def abbreviations(self) -> Dict[str, str]:
+        return self.get()[0]
+
+    def expand(self, text: str) -> str:
+        """
+        This function replaces the abbreviations in a text by their long forms.
+        """
+        abbreviations, pattern = self.get()
+        if pattern is None:
+            return text
+        return pattern.sub(lambda match: abbreviations[match.group(0)], text)
+
+    def expand_tokens(self, tokens: Iterable[str]) -> List[str]:
+        """
+        This function replaces the tokens that are an abbreviation by their long forms, the other tokens are kept.
+        """
+        abbreviations = self.abbreviations
+        return [abbreviations.get(token, token) for token in tokens]
+
+    def expand_series(self, texts: pd.Series) -> pd.Series:
+        """
+        This function replaces the abbreviations in a Series of texts by their long forms, in one pass per text.
+        """
+        abbreviations, pattern = self.get()
+        if pattern is None:
+            return texts
+        return texts.str.replace(pattern, lambda match: abbreviations[match.group(0)], regex=True)
+
+
+# separators of a normalised key: punctuation, underscores and whitespace
+_KEY_SEPARATORS = re.compile(r'[\W_]+')
+
+
+def normalise_key(text: str) -> str:
+    """
+    This function normalises a tag for lookups: case-folded, with punctuation and whitespace runs replaced by a
+    single space (e.g. ' 7 Tesla-MRI ' and '7 tesla mri' both become '7 tesla mri').
+
+    Parameters:
+    text (str): The tag.
+
+    Returns:
+    str: The normalised key.
+    """
+    return _KEY_SEPARATORS.sub(' ', text.casefold()).strip()
+
+
+def get_trigrams(key: str) -> Set[str]:
+    """
+    This function returns the character trigrams of a normalised key, padded so short keys have trigrams too.
+    """
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class DescriptionIndex(LexiconFile):
+    """
+    The tag descriptions of a JSON file ({"tag": "description", ...}) indexed by normalised key (see normalise_key),
+    with a trigram index for near matches. A lookup tries the tag as is, then its normalised key and, if a
+    min_similarity is given, the key with the most similar trigrams (Jaccard similarity). The number of lookups
+    per kind of match is kept for statistics().
+    """
+
+    def __init__(self, source: str = DESCRIPTIONS_FILE, check_interval: float = LEXICON_CHECK_INTERVAL):
+        super().__init__(source, check_interval)
+        self.counts = {'exact': 0, 'normalised': 0, 'similar': 0, 'missing': 0}
+
+    def build(self, data: Dict[str, str]) -> Tuple[Dict[str, str], Dict[str, str], Dict[str, Set[str]]]:
+        normalised: Dict[str, str] = {}
+        trigrams: Dict[str, Set[str]] = {}
+        for tag, description in data.items():
+            key = normalise_key(tag)
+            # the first tag of a normalised key keeps it, as a lookup of the exact tag would find it first
+            if key and key not in normalised:
+                normalised[key] = description
+                for trigram in get_trigrams(key):
+                    trigrams.setdefault(trigram, set()).add(key)
+        return data, normalised, trigrams
+
+    @property
+    def descriptions(self) -> Dict[str, str]:
+        return self.get()[0]
+
+    def get_similar_key(self, tag: str, min_similarity: float) -> Optional[str]:
+        """
+        This function returns the indexed key with the most trigrams in common with a tag (ties go to the first
+        key in sort order), or None if no key reaches min_similarity.
+        """
+        _, normalised, trigrams = self.get()
+        tag_trigrams = get_trigrams(normalise_key(tag))
+        shared: Dict[str, int] = {}
+        for trigram in tag_trigrams:
+            for key in trigrams.get(trigram, ()):
+                shared[key] = shared.get(key, 0) + 1
+        best, best_similarity = None, min_similarity
+        for key in sorted(shared):
+            similarity = shared[key] / (len(tag_trigrams) + len(get_trigrams(key)) - shared[key])
+            if similarity > best_similarity or (best is None and similarity >= min_similarity):
+                best, best_similarity = key, similarity
+        return best
+
+    def lookup(self, tag: str, min_similarity: Optional[float] = None) -> str:
+        """
+        This function returns the description of a tag, or an empty string if it has none.
+        """
+        descriptions, normalised, _ = self.get()
+        if tag in descriptions:
+            kind, description = 'exact', descriptions[tag]
+        elif normalise_key(tag) in normalised:
+            kind, description = 'normalised', normalised[normalise_key(tag)]
+        else:
+            key = self.get_similar_key(tag, min_similarity) if min_similarity is not None else None
+            kind, description = ('similar', normalised[key]) if key is not None else ('missing', "")
+        self.counts[kind] += 1
+        return description
+
+    def statistics(self) -> Dict[str, Any]:
+        """
+        This function returns the number of tags, loads of the file and lookups per kind of match.
+        """
+        return {'tags': len(self.descriptions), 'loads': self.loads, **self.counts}
+
+
+# one lexicon per (class, file) and process
+_lexicons: Dict[Tuple[type, str], LexiconFile] = {}
+_lexicons_lock = threading.Lock()
+
+
+def get_lexicon(cls: type, source: str) -> LexiconFile:
+    """
+    This function returns the shared lexicon of a class for a file; it is created on the first call.
+
+    Parameters:
+    cls (type): The LexiconFile subclass.
+    source (str): The path of the JSON file (see get_lexicon_path).
+
+    Returns:
+    LexiconFile: The shared lexicon.
+    """
+    key = (cls, get_lexicon_path(source))
+    with _lexicons_lock:
+        if key not in _lexicons:
+            _lexicons[key] = cls(source)
+        return _lexicons[key]
+
+
+def get_stopword_lexicon(source: str = STOPWORDS_FILE) -> StopwordLexicon:
+    """
+    This function returns the shared stopword lexicon of a file (see StopwordLexicon).
+
+    Parameters:
+    source (str): The path to the JSON file containing stopwords. Default is 'stopwords.json'.
+
+    Returns:
+    StopwordLexicon: The shared lexicon.
+    """
+    return get_lexicon(StopwordLexicon, source)
+
+
+def get_abbreviation_expander(source: str = ABBREVIATIONS_FILE) -> AbbreviationExpander:
+    """
+    This function returns the shared abbreviation expander of a file (see AbbreviationExpander).
+
+    Parameters:
+    source (str): The path to the JSON file containing the abbreviations. Default is 'abbreviations.json'.
+
+    Returns:
+    AbbreviationExpander: The shared expander.
+    """
+    return get_lexicon(AbbreviationExpander, source)
+
+
+def get_description_index(source: str = DESCRIPTIONS_FILE) -> DescriptionIndex:
+    """
+    This function returns the shared description index of a file (see DescriptionIndex).
+
+    Parameters:
+    source (str): The path to the JSON file containing the tag descriptions. Default is 'descriptions.json'.
+
+    Returns:
+    DescriptionIndex: The shared index.
+    """
+    return get_lexicon(DescriptionIndex, source)
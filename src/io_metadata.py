@@ -21,6 +21,8 @@ import tempfile
 from tqdm import tqdm
 from IPython.display import clear_output
 
+from src.io_classify import classify_paths
+
 def is_tar_archive(file):
     """
     This function checks if a file is a tar archive.
@@ -194,10 +196,16 @@ def process_tar_gz(file_path, outputfolder, tmp=1):
                         tar.extract(member, temp_dir)
                 # Iterate over all files in the temporary directory
                 filelist = get_inputlist(temp_dir)
+                # showinf only runs on the files Bio-Formats can read, the others are reported as not extracted
+                classes = classify_paths(filelist)
+                readable = classes['bioformats'].to_numpy()
                 for i, file in tqdm(enumerate(filelist)):
                     print(f"work on {i}/{len(filelist)} files in the archive ({i/len(filelist)}%)")
                     # Print the file name
-                    results.append(extract_metadata(file, outputfolder, showinfPath, showinfParameter))
+                    if readable[i]:
+                        results.append(extract_metadata(file, outputfolder, showinfPath, showinfParameter))
+                    else:
+                        results.append(['1', file, '', classes['extension'].iat[i] or "unknown", outputfolder])
                     clear_output(wait=True)
     ## save the concat
     concatMetadata = pd.DataFrame(results, columns=resultCols)
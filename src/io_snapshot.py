@@ -0,0 +1,250 @@
+# Standard library imports
+import glob
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+# Third-party library imports
+import pandas as pd
+import pyarrow as pa
+
+# Local imports
+from src.io_database import PRIMARY_KEYS, get_sync_database
+
+SNAPSHOT_FOLDER = "./data/snapshot"
+SNAPSHOT_TABLES = ['object', 'fs_storage', 'tag', 'link', 'project_registration', 'project_schedule']
+# tables whose rows are only ever added, never updated in place; the other tables are upserted on their natural key
+# (and object rows get their timestamps from refresh_project_rollups), so a watermark on the primary key would miss
+# updated rows and they are always exported completely
+APPEND_ONLY_TABLES = ['project_registration', 'project_schedule']
+MANIFEST_NAME = "manifest.json"
+# low-cardinality text columns that get_snapshot_dataframe loads as categoricals
+CATEGORICAL_COLUMNS = ['source', 'object_type', 'user', 'src_table', 'tar_table', 'tar_source']
+
+# SQLite declared types -> Arrow types (everything else, e.g. TEXT, DATETIME or view expressions, is stored as string)
+ARROW_TYPES = {
+    'INTEGER': pa.int64(),
+    'FLOAT': pa.float64(),
+    'REAL': pa.float64(),
+}
+
+
+def get_snapshot_schema(db_name: str, table_name: str) -> pa.Schema:
+    """
+    This function builds the Arrow schema of a table (or view) from its declared column types,
+    so that every part file of a table has the same schema.
+
+    Parameters:
+    db_name (str): The name of the SQLite database.
+    table_name (str): The name of the table or view.
+
+    Returns:
+    pa.Schema: The Arrow schema.
+    """
+    db = get_sync_database(db_name)
+    # table_info rows: (cid, name, type, notnull, dflt_value, pk)
+    return pa.schema([(row[1], ARROW_TYPES.get(row[2].upper(), pa.string()))
+                      for row in db.fetchall(f"PRAGMA table_info({table_name})")])
+
+
+def get_snapshot_manifest(folder: str = SNAPSHOT_FOLDER) -> Dict[str, Dict[str, any]]:
+    """
+    This function loads the manifest of a snapshot, which records the exported part files and
+    the primary key watermark of every table.
+
+    Parameters:
+    folder (str): The folder of the snapshot. Default is './data/snapshot'.
+
+    Returns:
+    Dict[str, Dict[str, any]]: The manifest; an empty dictionary if nothing was exported yet.
+    """
+    path = os.path.join(folder, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_snapshot_manifest(manifest: Dict[str, Dict[str, any]], folder: str = SNAPSHOT_FOLDER) -> None:
+    """
+    This function writes the manifest of a snapshot (via a temporary file, so readers never see a partial manifest).
+
+    Parameters:
+    manifest (Dict[str, Dict[str, any]]): The manifest.
+    folder (str): The folder of the snapshot. Default is './data/snapshot'.
+    """
+    path = os.path.join(folder, MANIFEST_NAME)
+    with open(path + ".tmp", 'w') as f:
+        json.dump(manifest, f, indent=4)
+    os.replace(path + ".tmp", path)
+
+
+def export_table_snapshot(db_name: str, table_name: str, state: Dict[str, any], folder: str = SNAPSHOT_FOLDER,
+                          full: bool = False, chunk_size: int = 100000) -> Tuple[Dict[str, any], int]:
+    """
+    This function exports the rows of a table that were added since the last export to new Arrow IPC part files.
+    Rows are selected by their primary key above the watermark of the last export. If rows below the watermark
+    were deleted (or full is set) the table is exported again, to the part files of a new generation.
+    Only APPEND_ONLY_TABLES are exported incrementally; the other tables are always exported completely,
+    as rows updated in place keep their primary key and would never reach the snapshot.
+    No part file of the manifest is changed or removed, so a crash before the new manifest is saved leaves the
+    last snapshot readable; the replaced part files are removed after the manifest (see remove_unlisted_parts).
+
+    Parameters:
+    db_name (str): The name of the SQLite database.
+    table_name (str): The name of the table or view.
+    state (Dict[str, any]): The manifest entry of the table from the last export (empty for the first export).
+    folder (str): The folder of the snapshot. Default is './data/snapshot'.
+    full (bool): If True, the table is exported completely. Default is False.
+    chunk_size (int): The number of rows per part file. Default is 100000.
+
+    Returns:
+    Tuple[Dict[str, any], int]: The new manifest entry (with the keys 'key', 'watermark', 'rows', 'generation'
+    and 'parts') and the number of rows exported in this run.
+    """
+    db = get_sync_database(db_name)
+    key = PRIMARY_KEYS[table_name]
+    table_folder = os.path.join(folder, table_name)
+    os.makedirs(table_folder, exist_ok=True)
+
+    watermark = state.get('watermark', 0)
+    if table_name not in APPEND_ONLY_TABLES:
+        full = True
+    if not full and state:
+        stored = db.fetchone(f"SELECT count(*) FROM {table_name} WHERE {key} <= ?", (watermark,))[0]
+        full = stored != state.get('rows')
+    # manifests written before the generations were introduced have generation 0 (part files 'part-00000.arrow')
+    generation = state.get('generation', 0)
+    if full or not state:
+        generation += 1
+        state = {'key': key, 'watermark': 0, 'rows': 0, 'parts': []}
+        watermark = 0
+
+    schema = get_snapshot_schema(db_name, table_name)
+    key_index = schema.get_field_index(key)
+    parts = list(state['parts'])
+    exported = 0
+    with db.reader() as conn:
+        cursor = conn.execute(f"SELECT * FROM {table_name} WHERE {key} > ? ORDER BY {key}", (watermark,))
+        while True:
+            chunk = cursor.fetchmany(chunk_size)
+            if not chunk and parts:
+                break
+            # SQLite does not enforce the declared types, text columns may hold numbers (e.g. OMERO specific_id)
+            columns = list(zip(*chunk)) if chunk else [[] for _ in schema]
+            arrays = [pa.array([value if value is None or field.type != pa.string() else str(value) for value in column],
+                               type=field.type)
+                      for field, column in zip(schema, columns)]
+            part = f"part-{generation:05d}-{len(parts):05d}.arrow"
+            # uncompressed IPC files can be memory-mapped by load_snapshot
+            with pa.OSFile(os.path.join(table_folder, part), 'wb') as sink:
+                with pa.ipc.new_file(sink, schema) as writer:
+                    writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            parts.append(part)
+            if not chunk:
+                # an empty table still gets one (empty) part file that carries the schema
+                break
+            exported += len(chunk)
+            watermark = chunk[-1][key_index]
+
+    return {'key': key, 'watermark': watermark, 'rows': state['rows'] + exported, 'generation': generation,
+            'parts': parts}, exported
+
+
+def remove_unlisted_parts(table_name: str, folder: str = SNAPSHOT_FOLDER) -> int:
+    """
+    This function removes the part files of a table that the manifest does not list (replaced by a full export,
+    or left behind by an export that crashed before it saved the manifest).
+
+    Parameters:
+    table_name (str): The name of the table.
+    folder (str): The folder of the snapshot. Default is './data/snapshot'.
+
+    Returns:
+    int: The number of removed part files.
+    """
+    listed = set(get_snapshot_manifest(folder).get(table_name, {}).get('parts', []))
+    removed = 0
+    for part in glob.glob(os.path.join(folder, table_name, "part-*.arrow")):
+        if os.path.basename(part) not in listed:
+            os.remove(part)
+            removed += 1
+    return removed
+
+
+def export_snapshot(db_name: str = 'sync_database.db', tables: Optional[List[str]] = None,
+                    folder: str = SNAPSHOT_FOLDER, full: bool = False, verbose: int = 0) -> Dict[str, int]:
+    """
+    This function exports tables of the sync database to a columnar snapshot (one folder of Arrow IPC files per table).
+    The export is incremental for the append-only tables and complete for the tables that are updated in place
+    (see export_table_snapshot); all tables are read from one read snapshot, so the export is consistent across
+    tables and does not block concurrent ingest.
+
+    Parameters:
+    db_name (str): The name of the SQLite database. Default is 'sync_database.db'.
+    tables (List[str]): The tables to export. Default is None (all SNAPSHOT_TABLES).
+    folder (str): The folder of the snapshot. Default is './data/snapshot'.
+    full (bool): If True, the tables are exported completely. Default is False.
+    verbose (int): If set to 1, prints the number of exported rows per table.
+
+    Returns:
+    Dict[str, int]: The number of rows exported per table in this run.
+    """
+    db = get_sync_database(db_name)
+    os.makedirs(folder, exist_ok=True)
+    manifest = get_snapshot_manifest(folder)
+    exported = {}
+    with db.reader():
+        for table_name in tables or SNAPSHOT_TABLES:
+            state = manifest.get(table_name, {})
+            manifest[table_name], exported[table_name] = export_table_snapshot(db_name, table_name, state, folder, full=full)
+            if verbose:
+                print(f"{table_name}: {exported[table_name]} rows exported, {manifest[table_name]['rows']} rows in the snapshot")
+    save_snapshot_manifest(manifest, folder)
+    for table_name in exported:
+        remove_unlisted_parts(table_name, folder)
+    return exported
+
+
+def load_snapshot(table_name: str, folder: str = SNAPSHOT_FOLDER, columns: Optional[List[str]] = None) -> pa.Table:
+    """
+    This function loads a table of the snapshot as an Arrow table. The part files are memory-mapped,
+    so the data is paged in from disk on access instead of being read and parsed up front.
+
+    Parameters:
+    table_name (str): The name of the table.
+    folder (str): The folder of the snapshot. Default is './data/snapshot'.
+    columns (List[str]): The columns to load. Default is None (all columns).
+
+    Returns:
+    pa.Table: The table.
+    """
+    state = get_snapshot_manifest(folder).get(table_name)
+    if state is None:
+        raise FileNotFoundError(f"no snapshot of the table '{table_name}' in {folder}")
+    tables = []
+    for part in state['parts']:
+        source = pa.memory_map(os.path.join(folder, table_name, part), 'r')
+        table = pa.ipc.open_file(source).read_all()
+        tables.append(table.select(columns) if columns else table)
+    return pa.concat_tables(tables)
+
+
+def get_snapshot_dataframe(table_name: str, folder: str = SNAPSHOT_FOLDER, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    This function loads a table of the snapshot as a DataFrame (the snapshot counterpart of get_dataframe).
+    The low-cardinality text columns (CATEGORICAL_COLUMNS) are loaded as categoricals.
+
+    Parameters:
+    table_name (str): The name of the table.
+    folder (str): The folder of the snapshot. Default is './data/snapshot'.
+    columns (List[str]): The columns to load. Default is None (all columns).
+
+    Returns:
+    pd.DataFrame: The table.
+    """
+    table = load_snapshot(table_name, folder, columns)
+    for index, name in enumerate(table.column_names):
+        if name in CATEGORICAL_COLUMNS and table.column(name).type == pa.string():
+            table = table.set_column(index, name, table.column(name).dictionary_encode())
+    return table.to_pandas()
@@ -0,0 +1,177 @@
+# Standard library imports
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import time
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+# Local imports
+from src.io_crawler import CrawlRules
+
+# inotify event masks (see inotify(7))
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_ISDIR = 0x40000000
+
+# events that change the files of a directory (a file written in place only shows up as IN_CLOSE_WRITE)
+WATCH_MASK = (IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+              | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR | IN_DONT_FOLLOW)
+
+# struct inotify_event { int wd; uint32_t mask; uint32_t cookie; uint32_t len; char name[]; }
+EVENT_HEADER = struct.Struct('iIII')
+
+
+class InotifyWatcher:
+    """
+    Recursive inotify watch of a folder (Linux only, via ctypes on the C library).
+    inotify only reports changes made through the kernel of this host; files written to a network mount
+    by another host are not reported and are only found by the crawl.
+    Every directory needs one watch, see /proc/sys/fs/inotify/max_user_watches.
+
+    Parameters:
+    folder (str): The root folder to watch.
+    rules (CrawlRules): Directories pruned by the rules (and everything below them) are not watched. Default is None.
+    """
+
+    def __init__(self, folder: str, rules: Optional[CrawlRules] = None):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.folder = os.path.normpath(folder)
+        self.rules = rules
+        self.fd = libc.inotify_init1(os.O_CLOEXEC | os.O_NONBLOCK)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.paths: Dict[int, str] = {}
+        self.add_tree(self.folder)
+
+    def add_tree(self, path: str) -> None:
+        """
+        This function watches a directory and all directories below it (a watch that already exists for a
+        directory is updated with its current path, e.g. after a move). Pruned directories are not watched.
+        """
+        pending = [path]
+        while pending:
+            path = pending.pop()
+            if self.rules is not None and self.rules.prunes_path(path, self.folder):
+                continue
+            wd = self._add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+            if wd < 0:
+                error = ctypes.get_errno()
+                if error == errno.ENOSPC:
+                    raise OSError(error, "inotify watch limit reached, raise fs.inotify.max_user_watches", path)
+                # the directory vanished or is not readable, the crawl reports it
+                continue
+            self.paths[wd] = path
+            try:
+                with os.scandir(path) as entries:
+                    pending.extend(entry.path for entry in entries if entry.is_dir(follow_symlinks=False))
+            except OSError:
+                continue
+
+    def read_events(self, timeout: Optional[float] = None) -> List[Tuple[str, int, str]]:
+        """
+        This function waits up to timeout seconds (forever if None) for events and returns all events that are ready.
+
+        Parameters:
+        timeout (float): The maximum time to wait in seconds. Default is None.
+
+        Returns:
+        List[Tuple[str, int, str]]: The events as (path of the watched directory, mask, name of the entry).
+        An IN_Q_OVERFLOW event (events were lost) is returned with the path of the root folder.
+        """
+        events = []
+        while select.select([self.fd], [], [], timeout)[0]:
+            try:
+                buffer = os.read(self.fd, 1 << 16)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(buffer):
+                wd, mask, cookie, length = EVENT_HEADER.unpack_from(buffer, offset)
+                name = buffer[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b'\0')
+                offset += EVENT_HEADER.size + length
+                if mask & IN_Q_OVERFLOW:
+                    events.append((self.folder, mask, ''))
+                    continue
+                path = self.paths.get(wd)
+                if mask & IN_IGNORED:
+                    self.paths.pop(wd, None)
+                    continue
+                if path is not None:
+                    events.append((path, mask, os.fsdecode(name)))
+            # collect what is already queued without waiting again
+            timeout = 0
+        return events
+
+    def close(self) -> None:
+        """
+        This function closes the inotify instance (and removes all watches).
+        """
+        os.close(self.fd)
+
+
+def get_dirty_directory(watcher: InotifyWatcher, path: str, mask: int, name: str) -> str:
+    """
+    This function returns the directory that has to be crawled again for an event and watches new directories.
+    """
+    if mask & (IN_DELETE_SELF | IN_MOVE_SELF) and path != watcher.folder:
+        # the parent reports the removal as well, crawling the parent removes the stored files
+        return os.path.dirname(path)
+    if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+        # files may be created in the new directory before its watch exists, the crawl lists the new directory
+        watcher.add_tree(os.path.join(path, name))
+    return path
+
+
+def watch_batches(folder: str, quiet: float = 2.0, max_delay: float = 30.0,
+                  watcher: Optional[InotifyWatcher] = None) -> Iterator[Set[str]]:
+    """
+    This function watches a folder and yields debounced batches of the directories that changed.
+    A batch is closed when no event arrived for quiet seconds, or at the latest max_delay seconds after its first
+    event, so a burst (e.g. an instrument writing thousands of slices) becomes a few batches instead of one
+    crawl per file, while a steady stream of events is still flushed regularly.
+
+    Parameters:
+    folder (str): The root folder to watch.
+    quiet (float): The seconds without events that close a batch. Default is 2.0.
+    max_delay (float): The maximum age of a batch in seconds. Default is 30.0.
+    watcher (InotifyWatcher): An already running watcher of the folder, e.g. to start watching before a
+        catch-up crawl. Default is None (a new watcher is created).
+
+    Returns:
+    Iterator[Set[str]]: The batches of changed directories (for IncrementalCrawl.changes(dirty=...)).
+    """
+    watcher = watcher or InotifyWatcher(folder)
+    dirty: Set[str] = set()
+    first_event = last_event = 0.0
+    try:
+        while True:
+            timeout = None
+            if dirty:
+                timeout = max(0.0, min(last_event + quiet, first_event + max_delay) - time.monotonic())
+            events = watcher.read_events(timeout)
+            now = time.monotonic()
+            for path, mask, name in events:
+                if not dirty:
+                    first_event = now
+                dirty.add(get_dirty_directory(watcher, path, mask, name))
+                last_event = now
+            if dirty and (now - last_event >= quiet or now - first_event >= max_delay):
+                yield dirty
+                dirty = set()
+    finally:
+        watcher.close()
@@ -0,0 +1,43 @@
+# Standard library imports
+import json
+import os
+
+# Third-party library imports
+import pytest
+
+# Local imports
+from src.io_database import SyncDatabase, get_sync_database
+
+REPOSITORY_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def get_create_table_sql() -> dict:
+    """
+    This function loads the CREATE statements of db_create_sql.json (src.io_functions needs the OMERO client).
+    """
+    with open(os.path.join(REPOSITORY_FOLDER, "db_create_sql.json")) as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def sync_db(tmp_path):
+    """
+    A new sync database with all tables, migrated to the latest schema version (like check_db_table).
+    It is the shared session of its path, so functions that take a database name use it too.
+    """
+    db = get_sync_database(str(tmp_path / "sync_database.db"))
+    create_table_sql = get_create_table_sql()
+    with db.transaction():
+        for sql in create_table_sql.values():
+            db.execute(sql)
+    db.migrate(create_table_sql)
+    yield db
+    db.close()
+
+
+def add_object(db: SyncDatabase, name: str, source: str = 'fs_storage') -> int:
+    """
+    This function adds a project row to the object table and returns its object_id.
+    """
+    return db.insert_returning_id('object', {'object_name': name, 'object_type': 'project', 'specific_id': name,
+                                             'user': 'tester', 'source': source})
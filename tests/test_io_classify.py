@@ -0,0 +1,27 @@
+# Third-party library imports
+import pandas as pd
+
+# Local imports
+from src.io_classify import classify_paths, get_file_extension, get_file_extensions
+
+
+def test_extension_keeps_compound_and_compressed_suffixes():
+    assert get_file_extension('/data/cells.OME.TIF') == '.OME.TIF'
+    assert get_file_extension('brain.nii.gz') == '.nii.gz'
+    assert get_file_extension('table.csv.gz') == '.csv.gz'
+    assert get_file_extension('/data/.hidden') == ''
+    assert get_file_extension('/data.d/README') == ''
+
+
+def test_batch_extensions_match_the_single_file_function():
+    paths = ['/a/cells.ome.tiff', '/a/b.c/scan.nii.gz', '/a/.bashrc', '/a/x.tar.zst', '/a/noext', '/a/UPPER.CZI']
+    assert get_file_extensions(paths).tolist() == [get_file_extension(path) for path in paths]
+
+
+def test_classify_paths_marks_bioformats_and_modality():
+    paths = pd.Series(['/p/cells.czi', '/p/brain.nii.gz', '/p/results.csv.gz', '/p/script.py', '/p/blob.xyz'],
+                      index=[10, 11, 12, 13, 14])
+    classes = classify_paths(paths)
+    assert list(classes.index) == [10, 11, 12, 13, 14]
+    assert classes['bioformats'].tolist() == [True, True, False, False, False]
+    assert classes['modality'].astype(str).tolist() == ['microscopy', 'medical', 'table', 'code', 'other']
@@ -0,0 +1,259 @@
+# Standard library imports
+import os
+import shutil
+import threading
+
+# Third-party library imports
+import pytest
+
+# Local imports
+import src.io_crawler
+from src.io_crawler import (CRAWL_RULES_FILE, ConcurrencyController, CrawlRules, CrawlSink, FilesTableSink,
+                            IncrementalCrawl, crawl, get_crawl_rules, get_fingerprint, run_crawl)
+from tests.conftest import REPOSITORY_FOLDER, add_object
+
+
+def write_file(path, size):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(b'x' * size)
+
+
+def touch_directory(path, seconds):
+    # a listing is repeated when the mtime of its directory changes, tests can not wait for the clock
+    os.utime(path, ns=(seconds * 10**9, seconds * 10**9))
+
+
+def store_changes(db, incremental_crawl, object_id):
+    """
+    This function writes the changes of a crawl to fs_file (like insert_crawl_changes) and returns them by status.
+    """
+    changes = {}
+    for change in incremental_crawl.changes():
+        changes.setdefault(change.status, []).append(os.path.basename(change.record.path))
+        record = change.record
+        if change.status == 'removed':
+            db.execute("DELETE FROM fs_file WHERE dir_id = ? AND name = ?",
+                       (db.get_directory_id(record.dirname), record.name))
+            continue
+        db.insert_many('fs_file', [{'object_id': object_id, 'dir_id': db.get_directory_id(record.dirname),
+                                    'name': record.name, 'object_type': '', 'object_size': record.size,
+                                    'created_epoch': int(record.ctime), 'modified_epoch': int(record.mtime)}])
+    incremental_crawl.save_state()
+    return {status: sorted(names) for status, names in changes.items()}
+
+
+def test_crawl_lists_every_file_with_its_size(tmp_path):
+    write_file(str(tmp_path / "a.txt"), 3)
+    write_file(str(tmp_path / "sub" / "deeper" / "b.txt"), 5)
+    records = sorted(crawl(str(tmp_path), max_workers=2))
+    assert [(os.path.relpath(record.path, tmp_path), record.size) for record in records] == \
+        [('a.txt', 3), (os.path.join('sub', 'deeper', 'b.txt'), 5)]
+
+
+def test_incremental_crawl_yields_only_the_differences(sync_db, tmp_path):
+    root = str(tmp_path / "netstore")
+    write_file(os.path.join(root, "a.txt"), 1)
+    write_file(os.path.join(root, "sub", "b.txt"), 2)
+    write_file(os.path.join(root, "sub", "c.txt"), 3)
+    object_id = add_object(sync_db, 'netstore')
+
+    assert store_changes(sync_db, IncrementalCrawl(sync_db.db_path, root), object_id) == \
+        {'added': ['a.txt', 'b.txt', 'c.txt']}
+
+    unchanged = IncrementalCrawl(sync_db.db_path, root)
+    assert store_changes(sync_db, unchanged, object_id) == {}
+    assert unchanged.stats['skipped_dirs'] == 2 and unchanged.stats['listed_dirs'] == 0
+
+    write_file(os.path.join(root, "a.txt"), 10)
+    os.remove(os.path.join(root, "sub", "c.txt"))
+    touch_directory(root, 1000)
+    touch_directory(os.path.join(root, "sub"), 1000)
+    assert store_changes(sync_db, IncrementalCrawl(sync_db.db_path, root), object_id) == \
+        {'changed': ['a.txt'], 'removed': ['c.txt']}
+
+    shutil.rmtree(os.path.join(root, "sub"))
+    assert store_changes(sync_db, IncrementalCrawl(sync_db.db_path, root), object_id) == {'removed': ['b.txt']}
+    assert sync_db.fetchall("SELECT name, object_size FROM fs_file") == [('a.txt', 10)]
+    assert sync_db.fetchone("SELECT count(*) FROM directory WHERE path = ?", (os.path.join(root, "sub"),)) == (0,)
+
+
+def test_fingerprint_follows_the_content_not_the_path(tmp_path):
+    block_size = 16
+    content = bytes(range(256)) * 4
+    files = {'original': content, 'moved': content,
+             # the middle block starts at (1024 - 16) // 2 = 504, byte 100 is not sampled
+             'edited_middle': content[:510] + b'!' + content[511:],
+             'edited_unsampled': content[:100] + b'!' + content[101:]}
+    fingerprints = {}
+    for name, data in files.items():
+        path = str(tmp_path / name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        fingerprints[name] = get_fingerprint(path, len(data), block_size)
+    assert fingerprints['moved'] == fingerprints['original']
+    assert fingerprints['edited_middle'] != fingerprints['original']
+    assert fingerprints['edited_unsampled'] == fingerprints['original']
+    assert get_fingerprint(str(tmp_path / "missing"), len(content), block_size) is None
+
+
+def test_crawl_rules_prune_directories_and_exclude_files(tmp_path):
+    rules = CrawlRules([
+        {'name': 'keep git config', 'type': 'dir', 'glob': '*/.git/config.d', 'action': 'include'},
+        {'name': 'version control', 'type': 'dir', 'glob': ['.git', '.svn']},
+        {'name': 'scratch', 'type': 'dir', 'regex': r'/scratch_\d+$'},
+        {'name': 'os metadata', 'type': 'file', 'glob': ['.DS_Store', 'Thumbs.db']},
+    ])
+    for path in ("a.txt", ".DS_Store", ".git/HEAD", "scratch_01/tmp.bin", "scratch_x/keep.bin", "sub/Thumbs.db"):
+        write_file(str(tmp_path / path), 1)
+    records = crawl(str(tmp_path), max_workers=2, rules=rules)
+    assert sorted(os.path.relpath(record.path, tmp_path) for record in records) == \
+        ['a.txt', os.path.join('scratch_x', 'keep.bin')]
+    assert rules.counts == {'version control': 1, 'scratch': 1, 'os metadata': 2}
+    assert not rules.prune_directory(str(tmp_path / ".git" / "config.d"))
+    assert rules.prunes_path(str(tmp_path / ".git" / "objects"), str(tmp_path))
+    assert not rules.prunes_path(str(tmp_path / "sub"), str(tmp_path))
+
+
+def test_crawl_rules_reject_unknown_actions():
+    with pytest.raises(ValueError):
+        CrawlRules([{'name': 'typo', 'type': 'dir', 'glob': '.git', 'action': 'exlude'}])
+
+
+def test_repository_crawl_rules_load():
+    assert get_crawl_rules(os.path.join(REPOSITORY_FOLDER, CRAWL_RULES_FILE)).prune_directory('/p/__pycache__')
+    assert get_crawl_rules(os.path.join(REPOSITORY_FOLDER, "missing.json")) is None
+
+
+def record_rounds(controller, rounds, seconds, failed=False):
+    limits = []
+    for _ in range(rounds):
+        for _ in range(controller.limit):
+            controller.record(seconds, failed=failed)
+        limits.append(controller.limit)
+    return limits
+
+
+def test_controller_increases_additively_up_to_the_bound():
+    controller = ConcurrencyController(min_workers=2, max_workers=6, initial=3)
+    assert record_rounds(controller, 5, 0.01) == [4, 5, 6, 6, 6]
+    assert controller.summary()['peak'] == 6 and controller.increases == 3
+
+
+def test_controller_decreases_on_an_error_in_the_middle_of_a_round():
+    controller = ConcurrencyController(min_workers=2, max_workers=64, initial=8)
+    for i in range(8):
+        controller.record(0.01, failed=i == 3)
+    assert controller.limit == 4 and controller.decreases == 1
+    # the failure is reset at the end of the round
+    assert record_rounds(controller, 1, 0.01) == [5]
+
+
+def test_controller_decreases_multiplicatively_on_latency_and_errors():
+    controller = ConcurrencyController(min_workers=2, max_workers=64, initial=16, smoothing=1.0)
+    record_rounds(controller, 1, 0.01)
+    assert controller.limit == 17
+    # the latency per operation triples: congestion
+    assert record_rounds(controller, 1, 0.03) == [8]
+    # per-operation latency: a listing of 100 files in 1 s is as fast as before
+    for _ in range(controller.limit):
+        controller.record(1.0, operations=100)
+    assert controller.limit == 9
+    assert record_rounds(controller, 3, 0.01, failed=True) == [4, 2, 2]
+    assert controller.decreases == 3
+
+
+def test_controller_rejects_invalid_bounds():
+    with pytest.raises(ValueError):
+        ConcurrencyController(min_workers=8, max_workers=4)
+
+
+def test_autotuned_crawl_finds_every_file(tmp_path):
+    for i in range(30):
+        write_file(str(tmp_path / f"dir{i % 5}" / f"sub{i % 3}" / f"file{i}.bin"), i)
+    controller = ConcurrencyController(min_workers=1, max_workers=4, initial=1)
+    records = list(crawl(str(tmp_path), autotune=controller))
+    assert len(records) == 30
+    assert 1 <= controller.limit <= 4 and controller.latency is not None
+
+
+class BlockingSink(CrawlSink):
+    """
+    A sink that keeps the paths it receives and blocks in write until it is released.
+    """
+
+    def __init__(self):
+        self.paths = []
+        self.release = threading.Event()
+
+    def write(self, records):
+        self.release.wait(timeout=10)
+        self.paths.extend(record.path for record in records)
+
+
+def test_crawl_sink_requires_write():
+    with pytest.raises(TypeError):
+        CrawlSink()
+
+
+def test_slow_sink_blocks_the_crawler_and_gets_every_record(tmp_path, monkeypatch):
+    for i in range(40):
+        write_file(str(tmp_path / f"dir{i:02d}" / "file.bin"), 1)
+    listed = []
+    scan_directory = src.io_crawler.scan_directory
+    monkeypatch.setattr(src.io_crawler, 'scan_directory', lambda path, *args: listed.append(path) or
+                        scan_directory(path, *args))
+    sink = BlockingSink()
+    crawl_thread = threading.Thread(target=run_crawl, args=(str(tmp_path), sink),
+                                    kwargs={'max_workers': 1, 'batch_size': 1, 'queue_size': 2})
+    crawl_thread.start()
+    # the first batch blocks the sink, the crawler stops once the queue is full
+    crawl_thread.join(timeout=0.5)
+    assert len(listed) <= 8
+    sink.release.set()
+    crawl_thread.join(timeout=10)
+    assert not crawl_thread.is_alive()
+    assert len(listed) == 41
+    assert sorted(sink.paths) == [str(tmp_path / f"dir{i:02d}" / "file.bin") for i in range(40)]
+
+
+class CrashingSink(FilesTableSink):
+    """
+    A FilesTableSink that crashes after its batch number crash_after is written (before it is checkpointed).
+    """
+
+    def __init__(self, db_name, crash_after):
+        super().__init__(db_name)
+        self.crash_after = crash_after
+        self.batches = 0
+
+    def write(self, records):
+        super().write(records)
+        self.batches += 1
+        if self.batches == self.crash_after:
+            raise KeyboardInterrupt
+
+
+def get_files_rows(db_name):
+    return FilesTableSink(db_name).db.fetchall("SELECT path, size FROM files ORDER BY path")
+
+
+@pytest.mark.parametrize('crash_after', [2, 4, 6])
+def test_resumed_crawl_equals_a_clean_crawl(tmp_path, crash_after):
+    folder = tmp_path / "netstore"
+    for project in ('lern', 'zlern'):
+        for i in range(4):
+            write_file(str(folder / project / f"session{i}" / "raw" / "image.dcm"), 10 + i)
+            write_file(str(folder / project / f"session{i}" / "notes.txt"), 1)
+    run_crawl(str(folder), FilesTableSink(str(tmp_path / "clean.db")), batch_size=2)
+
+    checkpoint = str(tmp_path / "checkpoint.db")
+    with pytest.raises(KeyboardInterrupt):
+        run_crawl(str(folder), CrashingSink(str(tmp_path / "resumed.db"), crash_after), batch_size=2,
+                  checkpoint=checkpoint)
+    # the crashed batch was written but not checkpointed, the resume truncates it and writes it again
+    summary = run_crawl(str(folder), FilesTableSink(str(tmp_path / "resumed.db")), batch_size=2,
+                        checkpoint=checkpoint, resume=True)
+    assert 0 < summary['files'] < 16
+    assert get_files_rows(str(tmp_path / "resumed.db")) == get_files_rows(str(tmp_path / "clean.db"))
+    assert len(get_files_rows(str(tmp_path / "clean.db"))) == 16
@@ -0,0 +1,289 @@
+# Standard library imports
+import sqlite3
+
+# Third-party library imports
+import pytest
+
+# Local imports
+from src.io_database import (MIGRATIONS, TAG_TABLE_SQL, IdMap, SyncDatabase, get_sync_database, refresh_project_rollups,
+                             run_maintenance)
+from tests.conftest import add_object, get_create_table_sql
+
+
+def get_file_rows(db, object_id, count, first=0):
+    return [{'object_id': object_id, 'dir_id': db.get_directory_id('/netstore/project'), 'name': f"file{i}.tif",
+             'object_type': '.tif', 'object_size': 100, 'created_epoch': 1000 + i, 'modified_epoch': 2000 + i,
+             'source': 'fs_storage'}
+            for i in range(first, first + count)]
+
+
+def test_insert_many_counts_fs_file_rows_without_trigger_writes(sync_db):
+    object_id = add_object(sync_db, 'project')
+    report = sync_db.insert_many('fs_file', get_file_rows(sync_db, object_id, 5))
+    assert report == [{'chunk': 0, 'rows': 5, 'inserted': 5, 'integrity_errors': 0}]
+    assert sync_db.fetchone("SELECT file_count, total_bytes FROM project_rollup WHERE object_id = ?",
+                            (object_id,)) == (5, 500)
+
+
+def test_insert_many_counts_skipped_rows_as_integrity_errors(sync_db):
+    object_id = add_object(sync_db, 'project')
+    rows = get_file_rows(sync_db, object_id, 3)
+    rows[1]['object_size'] = None
+    report = sync_db.insert_many('fs_file', rows, chunk_size=2)
+    assert [(counts['inserted'], counts['integrity_errors']) for counts in report] == [(1, 1), (1, 0)]
+
+
+def test_refresh_project_rollups_counts_updated_projects(sync_db):
+    first, second = add_object(sync_db, 'first'), add_object(sync_db, 'second')
+    sync_db.insert_many('fs_file', get_file_rows(sync_db, first, 3) + get_file_rows(sync_db, second, 2, first=3))
+    assert refresh_project_rollups(sync_db) == 2
+    assert refresh_project_rollups(sync_db) == 0
+    sync_db.execute("DELETE FROM fs_file WHERE object_id = ? AND name = 'file0.tif'", (first,))
+    assert refresh_project_rollups(sync_db) == 1
+    assert sync_db.fetchone("SELECT file_count, min_created_epoch FROM project_rollup WHERE object_id = ?",
+                            (first,)) == (2, 1001)
+
+
+# the object, tag, fs_storage and link tables as they were created before the natural keys (see MIGRATIONS)
+BASELINE_TABLES_SQL = [
+    """CREATE TABLE object (
+    object_id INTEGER NOT NULL UNIQUE, object_name TEXT NOT NULL, object_type TEXT NOT NULL,
+    specific_id TEXT NOT NULL, user TEXT NOT NULL, created_timestamp DATETIME, modified_timestamp DATETIME,
+    notes TEXT, source TEXT NOT NULL, PRIMARY KEY(object_id AUTOINCREMENT))""",
+    """CREATE TABLE tag (
+    tag_id INTEGER NOT NULL UNIQUE, object_id INTEGER, object_type TEXT, tag_name TEXT NOT NULL,
+    translated_tag_name TEXT, created_timestamp DATETIME, modified_timestamp DATETIME, used INTEGER,
+    description TEXT, source TEXT NOT NULL, PRIMARY KEY(tag_id AUTOINCREMENT))""",
+    """CREATE TABLE fs_storage (
+    fs_id INTEGER NOT NULL UNIQUE, object_id INTEGER NOT NULL, object_name TEXT NOT NULL, object_type TEXT NOT NULL,
+    object_size TEXT NOT NULL, created_timestamp DATETIME, modified_timestamp DATETIME, source TEXT,
+    PRIMARY KEY(fs_id AUTOINCREMENT)
+    UNIQUE(object_id, object_name, object_type, object_size, created_timestamp, modified_timestamp, source))""",
+    """CREATE TABLE link (
+    link_id INTEGER NOT NULL UNIQUE, src_id INTEGER NOT NULL, src_table TEXT NOT NULL, tar_id INTEGER NOT NULL,
+    tar_table TEXT NOT NULL, tar_source TEXT NOT NULL, overlap_ratio FLOAT, manual_validated INTEGER NOT NULL,
+    created_timestamp DATETIME, modified_timestamp DATETIME, notes TEXT, PRIMARY KEY(link_id AUTOINCREMENT))""",
+]
+
+
+def test_migration_keeps_first_duplicate_and_repoints_children(tmp_path):
+    db = SyncDatabase(str(tmp_path / "baseline.db"))
+    for sql in BASELINE_TABLES_SQL:
+        db.execute(sql)
+    for object_id in (1, 2, 3):
+        db.execute("INSERT INTO object (object_id, object_name, object_type, specific_id, user, source) "
+                   "VALUES (?, 'project', 'project', 'p1', 'tester', 'fs_storage')", (object_id,))
+    # the same tag on the first and a duplicate object, and a tag only on the duplicate
+    db.executemany("INSERT INTO tag (object_id, tag_name, translated_tag_name, source) VALUES (?, ?, ?, 'fs_storage')",
+                   [(1, 'mri', 'MRI'), (2, 'mri', 'MRI'), (3, 'eeg', 'EEG')])
+    db.executemany("INSERT INTO fs_storage (object_id, object_name, object_type, object_size, source) "
+                   "VALUES (?, ?, '.nii', '10', 'fs_storage')", [(1, '/p1/a.nii'), (3, '/p1/b.nii')])
+    db.executemany("INSERT INTO link (src_id, src_table, tar_id, tar_table, tar_source, manual_validated) "
+                   "VALUES (7, 'project_registration', ?, 'object', 'fs_storage', 0)", [(2,), (3,)])
+
+    db.migrate(get_create_table_sql())
+
+    assert db.fetchall("SELECT object_id FROM object") == [(1,)]
+    assert db.fetchall("SELECT object_id, translated_tag_name FROM tag ORDER BY tag_id") == [(1, 'MRI'), (1, 'EEG')]
+    assert db.fetchall("SELECT object_id, object_name FROM fs_storage ORDER BY object_name") == \
+        [(1, '/p1/a.nii'), (1, '/p1/b.nii')]
+    assert db.fetchall("SELECT src_id, tar_id FROM link") == [(7, 1)]
+    db.close()
+
+
+def test_migration_keeps_the_fs_storage_rows_behind_the_view(tmp_path):
+    db = SyncDatabase(str(tmp_path / "baseline.db"))
+    for sql in BASELINE_TABLES_SQL:
+        db.execute(sql)
+    for object_id in (1, 2):
+        db.execute("INSERT INTO object (object_id, object_name, object_type, specific_id, user, source) "
+                   "VALUES (?, ?, 'project', ?, 'tester', 'fs_storage')", (object_id, f"p{object_id}", f"p{object_id}"))
+    db.executemany("INSERT INTO fs_storage (object_id, object_name, object_type, object_size, created_timestamp, "
+                   "modified_timestamp, source) VALUES (?, ?, ?, ?, ?, ?, 'fs_storage')",
+                   [(1, '/netstore/p1/a.nii', '.nii', '10', '2024-03-01 12:34:56', '2024-03-02 08:00:00'),
+                    (1, '/netstore/p1/raw/b.dcm', '.dcm', '3221225472', '2023-12-31 23:59:59', '2024-01-01 00:00:00'),
+                    (2, '/netstore/p2/c.txt', '.txt', '0', None, None)])
+    columns = [row[1] for row in db.fetchall("PRAGMA table_info(fs_storage)")]
+    before = db.fetchall("SELECT * FROM fs_storage ORDER BY fs_id")
+
+    db.migrate(get_create_table_sql())
+
+    assert db.fetchone("SELECT type FROM sqlite_master WHERE name = 'fs_storage'") == ('view',)
+    assert [row[1] for row in db.fetchall("PRAGMA table_info(fs_storage)")] == columns
+    assert db.fetchall("SELECT * FROM fs_storage ORDER BY fs_id") == before
+    assert db.fetchall("SELECT DISTINCT typeof(object_size) FROM fs_storage") == [('text',)]
+    assert db.fetchone("SELECT count(*) FROM fs_file") == (3,)
+    db.close()
+
+
+def test_maintenance_converts_a_database_only_on_request(tmp_path):
+    db_path = str(tmp_path / "legacy.db")
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("CREATE TABLE data (value TEXT)")
+        conn.executemany("INSERT INTO data VALUES (?)", [('x' * 1000,) for _ in range(200)])
+        conn.execute("DELETE FROM data")
+    summary = run_maintenance(db_path)
+    assert not summary['converted']
+    assert summary['released_pages'] == 0
+    assert get_sync_database(db_path).fetchone("PRAGMA auto_vacuum") == (0,)
+
+    summary = run_maintenance(db_path, convert=True)
+    assert summary['converted']
+    assert get_sync_database(db_path).fetchone("PRAGMA auto_vacuum") == (2,)
+    get_sync_database(db_path).close()
+
+
+def test_maintenance_releases_free_pages_incrementally(sync_db):
+    object_id = add_object(sync_db, 'project')
+    rows = get_file_rows(sync_db, object_id, 2000)
+    sync_db.insert_many('fs_file', rows)
+    sync_db.execute("DELETE FROM fs_file")
+    summary = run_maintenance(sync_db.db_path, batch_pages=5)
+    assert not summary['converted']
+    assert summary['free_pages_before'] > 0
+    assert summary['free_pages_after'] == 0
+    assert summary['released_pages'] > 0
+
+
+def test_insert_many_counts_upserted_rows_as_inserted(sync_db):
+    object_id = add_object(sync_db, 'project')
+    tag = {'object_id': object_id, 'object_type': '', 'tag_name': 'mri', 'translated_tag_name': 'MRI', 'used': 1,
+           'source': 'fs_storage'}
+    sync_db.insert_many('tag', [tag])
+    rows = [dict(tag, used=5), dict(tag, translated_tag_name='EEG'), dict(tag, translated_tag_name='CT', tag_name=None)]
+    assert sync_db.insert_many('tag', rows) == [{'chunk': 0, 'rows': 3, 'inserted': 2, 'integrity_errors': 1}]
+    assert sync_db.fetchall("SELECT translated_tag_name, used FROM tag ORDER BY tag_id") == [('MRI', 5), ('EEG', 1)]
+
+
+def test_id_map_drops_the_least_recently_used_id():
+    id_map = IdMap(maxsize=2)
+    id_map.put(('a',), 1)
+    id_map.put(('b',), 2)
+    id_map.put(('none',), None)
+    assert id_map.get(('a',)) == 1
+    id_map.put(('c',), 3)
+    assert (id_map.get(('a',)), id_map.get(('b',)), id_map.get(('c',)), len(id_map)) == (1, None, 3, 2)
+
+
+def test_insert_returning_id_remembers_the_object_id(sync_db):
+    object_id = add_object(sync_db, 'project')
+    assert sync_db.object_ids.get(('specific_id', 'fs_storage', 'project')) == object_id
+    assert sync_db.object_ids.get(('object_name', 'fs_storage', 'project')) == object_id
+    assert add_object(sync_db, 'project') == object_id
+
+
+def test_rollback_clears_the_id_maps(sync_db):
+    kept_id = add_object(sync_db, 'kept')
+    with pytest.raises(RuntimeError):
+        with sync_db.transaction():
+            add_object(sync_db, 'rolled back')
+            sync_db.get_directory_id('/netstore/rolled back')
+            raise RuntimeError
+    assert sync_db.object_ids.get(('specific_id', 'fs_storage', 'rolled back')) is None
+    assert len(sync_db.directory_ids) == 0
+    # the rolled back ids are handed out again and must not be found under the rolled back keys
+    other_id = add_object(sync_db, 'other')
+    assert other_id != kept_id
+    assert sync_db.object_ids.get(('specific_id', 'fs_storage', 'rolled back')) is None
+    dir_id = sync_db.get_directory_id('/netstore/other')
+    assert sync_db.fetchone("SELECT path FROM directory WHERE dir_id = ?", (dir_id,)) == ('/netstore/other',)
+
+
+def test_upsert_updates_a_row_on_its_natural_key(sync_db):
+    row = {'object_name': 'project', 'object_type': 'project', 'specific_id': 'p1', 'user': 'tester',
+           'created_timestamp': '2024-01-01 00:00:00', 'source': 'fs_storage'}
+    object_id = sync_db.insert_returning_id('object', row)
+    updated = dict(row, object_name='renamed', created_timestamp='2025-01-01 00:00:00')
+    assert sync_db.insert_returning_id('object', updated) == object_id
+    assert sync_db.fetchall("SELECT object_id, object_name, created_timestamp FROM object") == \
+        [(object_id, 'renamed', '2024-01-01 00:00:00')]
+
+
+def test_insert_many_upserts_tags(sync_db):
+    object_id = add_object(sync_db, 'project')
+    rows = [{'object_id': object_id, 'object_type': '', 'tag_name': 'mri', 'translated_tag_name': 'MRI',
+             'used': used, 'source': 'fs_storage'} for used in (1, 2)]
+    report = sync_db.insert_many('tag', rows)
+    assert report[0]['integrity_errors'] == 0
+    assert sync_db.fetchall("SELECT object_id, translated_tag_name, used FROM tag") == [(object_id, 'MRI', 2)]
+
+
+def test_migrations_are_applied_once_in_order(sync_db):
+    assert sync_db.migrate() == MIGRATIONS[-1][0]
+    assert sync_db.fetchall("SELECT version FROM schema_version ORDER BY version") == \
+        [(number,) for number, _, _ in MIGRATIONS]
+    # a new session checks the version again and finds nothing to do
+    sync_db.close()
+    assert sync_db.migrate(get_create_table_sql()) == MIGRATIONS[-1][0]
+    assert sync_db.fetchone("SELECT count(*) FROM schema_version") == (len(MIGRATIONS),)
+
+
+def get_rollup(db, object_id):
+    rollup = db.fetchone("SELECT file_count, total_bytes, min_created_epoch, max_modified_epoch, stale "
+                         "FROM project_rollup WHERE object_id = ?", (object_id,))
+    types = db.fetchall("SELECT object_type, file_count, total_bytes FROM project_type_rollup WHERE object_id = ? "
+                        "ORDER BY object_type", (object_id,))
+    return rollup, types
+
+
+def test_rollup_triggers_follow_inserts_updates_and_deletes(sync_db):
+    object_id = add_object(sync_db, 'project')
+    rows = get_file_rows(sync_db, object_id, 3)
+    sync_db.insert_many('fs_file', rows)
+    assert get_rollup(sync_db, object_id) == ((3, 300, 1000, 2002, 0), [('.tif', 3, 300)])
+
+    # an unchanged upsert leaves the rollup alone, a changed size and type are moved between the histogram rows
+    sync_db.insert_many('fs_file', rows[:1] + [dict(rows[1], object_size=50, object_type='.png')])
+    assert get_rollup(sync_db, object_id) == ((3, 250, 1000, 2002, 0), [('.png', 1, 50), ('.tif', 2, 200)])
+
+    # removing the file on the border of the time span marks the span as stale until the refresh
+    sync_db.execute("DELETE FROM fs_file WHERE name = 'file2.tif'")
+    assert get_rollup(sync_db, object_id) == ((2, 150, 1000, 2002, 1), [('.png', 1, 50), ('.tif', 1, 100)])
+    refresh_project_rollups(sync_db)
+    assert get_rollup(sync_db, object_id) == ((2, 150, 1000, 2001, 0), [('.png', 1, 50), ('.tif', 1, 100)])
+
+    sync_db.execute("DELETE FROM fs_file")
+    refresh_project_rollups(sync_db)
+    assert get_rollup(sync_db, object_id) == (None, [])
+
+
+def test_rollup_triggers_accept_files_without_timestamps(sync_db):
+    object_id = add_object(sync_db, 'project')
+    rows = [dict(row, created_epoch=None, modified_epoch=None) for row in get_file_rows(sync_db, object_id, 2)]
+    sync_db.insert_many('fs_file', rows)
+    assert get_rollup(sync_db, object_id) == ((2, 200, None, None, 0), [('.tif', 2, 200)])
+
+    # neither a file nor a rollup without timestamps is on the border of the time span
+    sync_db.insert_many('fs_file', [dict(rows[0], object_size=50)])
+    sync_db.execute("DELETE FROM fs_file WHERE name = 'file1.tif'")
+    assert get_rollup(sync_db, object_id) == ((1, 50, None, None, 0), [('.tif', 1, 50)])
+
+    sync_db.insert_many('fs_file', get_file_rows(sync_db, object_id, 1, first=5))
+    sync_db.execute("DELETE FROM fs_file WHERE name = 'file0.tif'")
+    assert get_rollup(sync_db, object_id) == ((1, 100, 1005, 2005, 0), [('.tif', 1, 100)])
+
+
+def get_omero_tag(object_id, object_type, used=1):
+    return {'object_id': object_id, 'object_type': object_type, 'tag_name': 'mri', 'translated_tag_name': 'MRI',
+            'used': used, 'source': 'omero'}
+
+
+def test_tags_of_omero_objects_with_the_same_id_are_kept_apart(sync_db):
+    # OMERO projects, datasets and images have separate id spaces
+    sync_db.insert_many('tag', [get_omero_tag(1, 'Project'), get_omero_tag(1, 'Image'),
+                                get_omero_tag(1, 'Image', used=2)])
+    assert sync_db.fetchall("SELECT object_id, object_type, used FROM tag ORDER BY tag_id") == \
+        [(1, 'Project', 1), (1, 'Image', 2)]
+
+
+def test_migration_rebuilds_the_tag_table_with_the_former_key(tmp_path):
+    db = SyncDatabase(str(tmp_path / "former_key.db"))
+    db.execute(TAG_TABLE_SQL.format(name='tag').replace("UNIQUE(object_id, object_type,", "UNIQUE(object_id,"))
+    db.executemany("INSERT INTO tag (object_id, object_type, tag_name, translated_tag_name, source) "
+                   "VALUES (?, ?, 'note', 'Note', ?)", [(1, 'Project', 'omero'), (1, None, 'rspace')])
+    db.migrate(get_create_table_sql())
+    assert db.fetchall("SELECT object_id, object_type, source FROM tag ORDER BY tag_id") == \
+        [(1, 'Project', 'omero'), (1, '', 'rspace')]
+    db.insert_many('tag', [get_omero_tag(1, 'Image')])
+    assert db.fetchone("SELECT count(*) FROM tag WHERE source = 'omero'") == (2,)
+    db.close()
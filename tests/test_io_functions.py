@@ -0,0 +1,83 @@
+# Standard library imports
+import os
+
+# Third-party library imports
+import pytest
+
+# src.io_functions needs the OMERO client (and the local data module)
+pytest.importorskip('omero')
+io_functions = pytest.importorskip('src.io_functions')
+
+# Local imports
+from src.io_crawler import IncrementalCrawl
+
+
+def write_file(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def test_moved_file_keeps_its_row(sync_db, tmp_path):
+    root = str(tmp_path / "netstore")
+    write_file(os.path.join(root, "project", "scan.nii"), b'mri' * 1000)
+    write_file(os.path.join(root, "project", "notes.txt"), b'notes')
+    io_functions.insert_crawl_changes(sync_db.db_path, root, IncrementalCrawl(sync_db.db_path, root), fingerprints=True)
+    fs_id = sync_db.fetchone("SELECT fs_id FROM fs_file WHERE name = 'scan.nii'")[0]
+
+    os.makedirs(os.path.join(root, "project", "session1"))
+    os.rename(os.path.join(root, "project", "scan.nii"), os.path.join(root, "project", "session1", "renamed.nii"))
+    io_functions.insert_crawl_changes(sync_db.db_path, root, IncrementalCrawl(sync_db.db_path, root), fingerprints=True)
+
+    assert sync_db.fetchall("SELECT fs_id, object_name FROM fs_storage WHERE object_type = '.nii'") == \
+        [(fs_id, os.path.join(root, "project", "session1", "renamed.nii"))]
+    assert sync_db.fetchone("SELECT count(*) FROM fs_file") == (2,)
+    assert sync_db.fetchone("SELECT file_count FROM project_rollup") == (2,)
+
+
+def test_inserted_object_ids_are_looked_up_without_a_query(sync_db):
+    row = {'object_name': 'document', 'object_type': 'document', 'specific_id': 'SD1', 'user': 'tester',
+           'source': 'rspace'}
+    object_id = io_functions.insert_dict_to_database_returning_id(sync_db.db_path, 'object', row)
+    sync_db.execute("UPDATE object SET specific_id = 'moved' WHERE object_id = ?", (object_id,))
+    # answered from the id map, the query would no longer find the row
+    assert io_functions.get_object_id_from_specific_id(sync_db.db_path, 'object', 'SD1', source='rspace') == object_id
+
+
+def test_rolled_back_object_ids_are_forgotten(sync_db):
+    row = {'object_name': 'document', 'object_type': 'document', 'specific_id': 'SD1', 'user': 'tester',
+           'source': 'rspace'}
+    with pytest.raises(RuntimeError):
+        with sync_db.transaction():
+            io_functions.insert_dict_to_database_returning_id(sync_db.db_path, 'object', row)
+            raise RuntimeError
+    assert io_functions.get_object_id_from_specific_id(sync_db.db_path, 'object', 'SD1', source='rspace') is None
+
+
+def add_objects(db):
+    for name, object_type, source in [('p1', 'project', 'omero'), ('d1', 'dataset', 'omero'),
+                                      ('i1', 'image', 'omero'), ('f1', 'project', 'fs_storage')]:
+        db.insert_returning_id('object', {'object_name': name, 'object_type': object_type, 'specific_id': name,
+                                          'user': 'tester', 'source': source})
+
+
+def test_get_dataframe_loads_the_columns_and_rows_asked_for(sync_db):
+    add_objects(sync_db)
+    df = io_functions.get_dataframe('omero', sync_db.db_path, columns=['object_id', 'object_name', 'object_type'],
+                                    filters={'object_type': ['project', 'image']})
+    assert list(df.columns) == ['object_id', 'object_name', 'object_type']
+    assert sorted(df['object_name']) == ['i1', 'p1']
+    assert str(df['object_id'].dtype) == 'Int64'
+    assert str(df['object_type'].dtype) == 'category'
+
+    df = io_functions.get_dataframe('fs_storage', sync_db.db_path, filters={'object_type': 'project'})
+    assert list(df['object_name']) == ['f1']
+    assert str(df['source'].dtype) == 'category'
+
+
+def test_get_dataframe_chunks_load_categories_as_strings(sync_db):
+    add_objects(sync_db)
+    chunks = list(io_functions.get_dataframe('omero', sync_db.db_path, columns=['object_id', 'object_type'],
+                                             chunksize=2))
+    assert [len(chunk) for chunk in chunks] == [2, 1]
+    assert all(chunk['object_type'].dtype == object and str(chunk['object_id'].dtype) == 'Int64' for chunk in chunks)
@@ -0,0 +1,79 @@
+# Standard library imports
+import json
+import os
+
+# Third-party library imports
+import pandas as pd
+
+# Local imports
+from src.io_lexicon import (AbbreviationExpander, DescriptionIndex, StopwordLexicon, get_description_index,
+                            get_lexicon_path, get_stopword_lexicon, normalise_key)
+
+
+def write_json(path, data, mtime=None):
+    with open(path, 'w') as f:
+        json.dump(data, f)
+    if mtime is not None:
+        # the reload follows the modification time, tests can not wait for the clock
+        os.utime(path, (mtime, mtime))
+    return str(path)
+
+
+def test_stopwords_are_case_folded_and_counted(tmp_path):
+    lexicon = StopwordLexicon(write_json(tmp_path / "stopwords.json", {'stopwords': ['The', 'of']}))
+    assert lexicon.remove('The Brain OF a mouse') == 'Brain a mouse'
+    assert lexicon.is_stopword('THE')
+    assert lexicon.statistics() == {'words': 2, 'loads': 1, 'lookups': 6, 'hits': 3, 'hit_rate': 0.5}
+
+
+def test_stopwords_are_reloaded_only_when_the_file_changes(tmp_path):
+    path = write_json(tmp_path / "stopwords.json", {'stopwords': ['a']}, mtime=1000)
+    lexicon = StopwordLexicon(path, check_interval=0)
+    assert lexicon.words == {'a'}
+    assert lexicon.words == {'a'} and lexicon.loads == 1
+    write_json(path, {'stopwords': ['b']}, mtime=2000)
+    assert lexicon.words == {'b'} and lexicon.loads == 2
+
+
+def test_lexicon_files_are_shared_and_found_outside_the_repository(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert os.path.exists(get_lexicon_path('stopwords.json'))
+    assert get_stopword_lexicon() is get_stopword_lexicon('stopwords.json')
+
+
+def test_abbreviations_expand_longest_match_first_in_one_pass(tmp_path):
+    expander = AbbreviationExpander(write_json(tmp_path / "abbreviations.json", {
+        '3T': '3 Tesla MRI', '9.4T': '9.4 Tesla MRI', 'exp': 'Experiment', 'exp data': 'Experimental Data',
+        'MRI': 'Magnetic Resonance Imaging'}))
+    assert expander.expand('9.4T, 3T; exp data; exp') == '9.4 Tesla MRI, 3 Tesla MRI; Experimental Data; Experiment'
+    # whole words only, and an expansion is not expanded again
+    assert expander.expand('expert catalog_exp') == 'expert catalog_Experiment'
+    assert expander.expand_tokens(['3T', 'unknown']) == ['3 Tesla MRI', 'unknown']
+    texts = pd.Series(['3T', 'no abbreviation', '9.4T MRI'], index=[5, 6, 7])
+    expanded = expander.expand_series(texts)
+    assert expanded.tolist() == ['3 Tesla MRI', 'no abbreviation', '9.4 Tesla MRI Magnetic Resonance Imaging']
+    assert list(expanded.index) == [5, 6, 7]
+
+
+def test_empty_abbreviation_file_leaves_texts_alone(tmp_path):
+    expander = AbbreviationExpander(write_json(tmp_path / "abbreviations.json", {}))
+    assert expander.expand('3T') == '3T'
+    assert expander.expand_series(pd.Series(['3T'])).tolist() == ['3T']
+
+
+def test_descriptions_are_found_by_normalised_key_and_trigrams(tmp_path):
+    index = DescriptionIndex(write_json(tmp_path / "descriptions.json", {
+        '7 Tesla MRI': 'seven', '3 Tesla MRI': 'three', 'Experimental Data': 'data'}))
+    assert normalise_key(' 7-Tesla_MRI ') == '7 tesla mri'
+    assert index.lookup('7 Tesla MRI') == 'seven'
+    assert index.lookup('7 tesla  mri') == 'seven'
+    assert index.lookup('7 Tesla MRT') == ''
+    assert index.lookup('7 Tesla MRT', min_similarity=0.5) == 'seven'
+    assert index.lookup('Expermental data', min_similarity=0.5) == 'data'
+    assert index.lookup('EEG', min_similarity=0.5) == ''
+    assert index.statistics() == {'tags': 3, 'loads': 1, 'exact': 1, 'normalised': 1, 'similar': 2, 'missing': 2}
+
+
+def test_repository_descriptions_are_indexed():
+    index = get_description_index()
+    assert index.lookup('7 tesla mri') == index.descriptions['7 Tesla MRI']
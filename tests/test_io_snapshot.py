@@ -0,0 +1,59 @@
+# Standard library imports
+import os
+
+# Third-party library imports
+import pytest
+
+pytest.importorskip('pyarrow')
+
+# Local imports
+import src.io_snapshot
+from src.io_snapshot import export_snapshot, get_snapshot_dataframe, get_snapshot_manifest
+from tests.conftest import add_object
+
+
+def test_upserted_rows_reach_the_snapshot(sync_db, tmp_path):
+    folder = str(tmp_path / "snapshot")
+    add_object(sync_db, 'project')
+    export_snapshot(sync_db.db_path, tables=['object'], folder=folder)
+    sync_db.insert_returning_id('object', {'object_name': 'renamed', 'object_type': 'project',
+                                           'specific_id': 'project', 'user': 'tester', 'source': 'fs_storage'})
+    add_object(sync_db, 'second')
+    assert export_snapshot(sync_db.db_path, tables=['object'], folder=folder) == {'object': 2}
+    assert sorted(get_snapshot_dataframe('object', folder)['object_name']) == ['renamed', 'second']
+
+
+def test_append_only_tables_are_exported_incrementally(sync_db, tmp_path):
+    folder = str(tmp_path / "snapshot")
+    rows = [{'project_id': i, 'project_name': f"project {i}"} for i in range(1, 4)]
+    sync_db.insert_many('project_registration', rows[:2])
+    assert export_snapshot(sync_db.db_path, tables=['project_registration'], folder=folder) == \
+        {'project_registration': 2}
+    sync_db.insert_many('project_registration', rows[2:])
+    assert export_snapshot(sync_db.db_path, tables=['project_registration'], folder=folder) == \
+        {'project_registration': 1}
+    state = get_snapshot_manifest(folder)['project_registration']
+    assert (state['watermark'], state['rows'], len(state['parts'])) == (3, 3, 2)
+    assert list(get_snapshot_dataframe('project_registration', folder)['project_id']) == [1, 2, 3]
+
+
+def test_full_export_keeps_the_last_snapshot_until_the_manifest_is_saved(sync_db, tmp_path, monkeypatch):
+    folder = str(tmp_path / "snapshot")
+    add_object(sync_db, 'project')
+    export_snapshot(sync_db.db_path, tables=['object'], folder=folder)
+    sync_db.insert_returning_id('object', {'object_name': 'renamed', 'object_type': 'project',
+                                           'specific_id': 'project', 'user': 'tester', 'source': 'fs_storage'})
+
+    def crash(manifest, folder):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(src.io_snapshot, 'save_snapshot_manifest', crash)
+    with pytest.raises(KeyboardInterrupt):
+        export_snapshot(sync_db.db_path, tables=['object'], folder=folder)
+    assert list(get_snapshot_dataframe('object', folder)['object_name']) == ['project']
+
+    monkeypatch.undo()
+    assert export_snapshot(sync_db.db_path, tables=['object'], folder=folder) == {'object': 1}
+    assert list(get_snapshot_dataframe('object', folder)['object_name']) == ['renamed']
+    # the replaced part files and those of the crashed export are removed
+    assert sorted(os.listdir(os.path.join(folder, 'object'))) == get_snapshot_manifest(folder)['object']['parts']
@@ -0,0 +1,95 @@
+# Local imports
+from src import io_watch
+from src.io_watch import IN_CLOSE_WRITE, IN_CREATE, IN_DELETE_SELF, IN_ISDIR, watch_batches
+
+
+class FakeClock:
+    """
+    A monotonic clock that only moves when the FakeWatcher waits.
+    """
+
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+
+class FakeWatcher:
+    """
+    An event source for watch_batches: the events are given as (seconds of waiting before them, events).
+    read_events waits for the next events like InotifyWatcher, or returns nothing when its timeout runs out first
+    (the time waited counts towards the next events).
+    """
+
+    def __init__(self, clock, script, folder='/netstore'):
+        self.clock = clock
+        self.script = list(script)
+        self.folder = folder
+        self.added = []
+        self.closed = False
+
+    def read_events(self, timeout=None):
+        if not self.script:
+            raise KeyboardInterrupt
+        delay, events = self.script[0]
+        if timeout is not None and delay > timeout:
+            self.clock.now += timeout
+            self.script[0] = (delay - timeout, events)
+            return []
+        self.clock.now += delay
+        self.script.pop(0)
+        return events
+
+    def add_tree(self, path):
+        self.added.append(path)
+
+    def close(self):
+        self.closed = True
+
+
+def collect_batches(monkeypatch, script, **kwargs):
+    """
+    This function runs watch_batches on a script of events and returns the batches with the time they were yielded.
+    """
+    clock = FakeClock()
+    monkeypatch.setattr(io_watch, 'time', clock)
+    watcher = FakeWatcher(clock, script)
+    batches = []
+    try:
+        for dirty in watch_batches(watcher.folder, watcher=watcher, **kwargs):
+            batches.append((clock.now, dirty))
+    except KeyboardInterrupt:
+        pass
+    assert watcher.closed
+    return batches, watcher
+
+
+def written(path, name):
+    return path, IN_CLOSE_WRITE, name
+
+
+def test_a_burst_becomes_one_batch_after_the_quiet_window(monkeypatch):
+    script = [(0.0, [written('/netstore/p1', 'a.dcm'), written('/netstore/p1', 'b.dcm')]),
+              (1.0, [written('/netstore/p1', 'c.dcm'), written('/netstore/p2', 'd.dcm')]),
+              (1.5, [written('/netstore/p1', 'e.dcm')]),
+              (10.0, [written('/netstore/p3', 'f.dcm')]),
+              (10.0, [])]
+    batches, _ = collect_batches(monkeypatch, script, quiet=2.0, max_delay=30.0)
+    assert batches == [(4.5, {'/netstore/p1', '/netstore/p2'}), (14.5, {'/netstore/p3'})]
+
+
+def test_a_steady_stream_is_flushed_after_max_delay(monkeypatch):
+    script = [(1.0, [written('/netstore/p1', f"slice{i}.dcm")]) for i in range(12)] + [(10.0, [])]
+    batches, _ = collect_batches(monkeypatch, script, quiet=2.0, max_delay=5.0)
+    assert [when for when, _ in batches] == [6.0, 12.0]
+    assert all(dirty == {'/netstore/p1'} for _, dirty in batches)
+
+
+def test_removed_and_new_directories_mark_their_parent(monkeypatch):
+    script = [(0.0, [('/netstore/p1/session1', IN_DELETE_SELF, ''),
+                     ('/netstore/p2', IN_CREATE | IN_ISDIR, 'session2')]),
+              (10.0, [])]
+    batches, watcher = collect_batches(monkeypatch, script, quiet=2.0)
+    assert batches == [(2.0, {'/netstore/p1', '/netstore/p2'})]
+    assert watcher.added == ['/netstore/p2/session2']
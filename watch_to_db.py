@@ -0,0 +1,30 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+This script keeps the fs_file table (fs_storage view) of the sync database in sync with the netstore.
+It watches the folder with inotify, coalesces bursts of events into debounced batches and writes the added,
+changed and removed files (with their path tags) of every batch, so new acquisitions can be linked within seconds.
+Run it next to the nightly crawl: inotify does not see files written to a network mount by other hosts.
+"""
+
+import argparse
+from src.io_crawler import CRAWL_RULES_FILE, get_crawl_rules
+from src.io_functions import watch_netstore_to_database
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Watch the netstore and write its changes to the sync database.')
+    parser.add_argument('--db', type=str, default='sync_database.db', help='Name of the sync database')
+    parser.add_argument('--folder', type=str, default='/home/omero-import', help='Root folder of the netstore')
+    parser.add_argument('--quiet', type=float, default=2.0, help='Seconds without events that close a batch')
+    parser.add_argument('--max-delay', type=float, default=30.0, help='Maximum age of a batch in seconds')
+    parser.add_argument('--fingerprints', action='store_true', help='Fingerprint files to recognise moved files')
+    parser.add_argument('--rules', type=str, default=CRAWL_RULES_FILE, help='Include/exclude rules file (if it exists)')
+    args = parser.parse_args()
+
+    try:
+        watch_netstore_to_database(args.db, args.folder, quiet=args.quiet, max_delay=args.max_delay,
+                                   fingerprints=args.fingerprints, rules=get_crawl_rules(args.rules))
+    except KeyboardInterrupt:
+        pass